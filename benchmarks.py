@@ -0,0 +1,409 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from models import (best_matches, calculate_match_score, calculate_distance, clinical_fields, compact_row_factory,
+                    ScoringPatient, ScoringDonor)
+from exchange import build_exchange_pool, build_exchange_graph, find_cycles, find_chains, select_exchanges
+from synthetic import SyntheticNetwork, DONOR_COLUMNS, PATIENT_COLUMNS, insert_sql
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(os.path.dirname(BASE_DIR), 'lifelink_benchmarks', 'baseline.json')
+# Donors and patients per pool (each side)
+DEFAULT_SIZES = (1000, 10000, 100000)
+BENCH_HOSPITALS = 20
+# Full matching is O(patients x donors); above this many pairs it is estimated from a patient sample
+FULL_MATCH_MAX_PAIRS = 2_000_000
+FULL_MATCH_SAMPLE_PATIENTS = 40
+PAIR_SAMPLE = 20000
+DELTA_SAMPLE = 20
+REPEATS = 3
+DEFAULT_TOLERANCE = 0.20
+# Peak-RSS comparison of pool representations, each measured in a fresh process
+MEMORY_SIZE = 100000
+MEMORY_VARIANTS = ('rows', 'compact')
+MEMORY_MATCH_PATIENTS = 20
+# Registered kidney pairs per paired-exchange pool, and altruistic donors per pair
+EXCHANGE_SIZES = (500, 2000, 5000)
+EXCHANGE_ALTRUIST_SHARE = 0.1
+# Timings compared against the baseline (lower is better)
+TIMED_METRICS = ('load_seconds', 'full_match_seconds', 'pair_score_us', 'compatible_pair_score_us',
+                 'delta_donor_ms', 'delta_patient_ms')
+
+
+# ====================
+# POOLS
+# ====================
+
+def build_pool(size, seed, path=':memory:'):
+    """SQLite (in memory by default) with size donors and size patients, so rows are real sqlite3.Row objects"""
+    network = SyntheticNetwork(seed)
+    hospital_ids = tuple(range(1, BENCH_HOSPITALS + 1))
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'CREATE TABLE donors (id INTEGER PRIMARY KEY, {", ".join(DONOR_COLUMNS)})')
+    conn.execute(f'CREATE TABLE patients (id INTEGER PRIMARY KEY, {", ".join(PATIENT_COLUMNS)})')
+    conn.execute('CREATE INDEX idx_donors_organ ON donors(organ_type, status)')
+    conn.execute('CREATE INDEX idx_patients_organ ON patients(organ_needed, status)')
+    conn.executemany(insert_sql('donors', DONOR_COLUMNS),
+                     ([row[column] for column in DONOR_COLUMNS] for row in network.donors(size, hospital_ids)))
+    conn.executemany(insert_sql('patients', PATIENT_COLUMNS),
+                     ([row[column] for column in PATIENT_COLUMNS] for row in network.patients(size, hospital_ids)))
+    conn.commit()
+    return conn, network
+
+def load_active(conn):
+    patients = conn.execute('SELECT * FROM patients WHERE status = "active"').fetchall()
+    donors = conn.execute('SELECT * FROM donors WHERE status = "active"').fetchall()
+    return patients, donors
+
+def best_matches_rows(patients, donors):
+    """best_matches as it was before slotted records: full rows, and dict results that keep them alive"""
+    matches = []
+    donor_fields = [clinical_fields(donor) for donor in donors]
+    for patient in patients:
+        best_donor = None
+        best_score = 0
+        best_reasons = []
+        best_distance = None
+        patient_fields = clinical_fields(patient)
+        for donor, fields in zip(donors, donor_fields):
+            score, reasons = calculate_match_score(patient, donor, patient_fields, fields)
+            if score > best_score:
+                best_score = score
+                best_donor = donor
+                best_reasons = reasons
+                best_distance = calculate_distance(patient['location'], donor['location'])
+        if best_donor and best_score > 0:
+            matches.append({'patient': patient, 'donor': best_donor, 'score': best_score,
+                            'reasons': best_reasons, 'distance_km': best_distance})
+    matches.sort(key=lambda x: x['score'], reverse=True)
+    return matches
+
+def load_active_compact(conn):
+    """The pools as get_matches loads them: only the scored columns, as slotted records"""
+    conn.row_factory = compact_row_factory(ScoringPatient)
+    patients = conn.execute(f'SELECT {ScoringPatient.columns()} FROM patients WHERE status = "active"').fetchall()
+    conn.row_factory = compact_row_factory(ScoringDonor)
+    donors = conn.execute(f'SELECT {ScoringDonor.columns()} FROM donors WHERE status = "active"').fetchall()
+    return patients, donors
+
+
+# ====================
+# TIMERS
+# ====================
+
+def timed(fn, repeats=REPEATS):
+    """Median wall time of fn() over repeats, and its last result"""
+    samples = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+def bench_full_match(patients, donors, max_pairs):
+    pairs = len(patients) * len(donors)
+    if pairs <= max_pairs:
+        seconds, _ = timed(lambda: best_matches(patients, donors), repeats=1)
+        return seconds, False
+    # Every patient is scored against every donor, so time per patient extrapolates linearly
+    step = max(1, len(patients) // FULL_MATCH_SAMPLE_PATIENTS)
+    sample = patients[::step][:FULL_MATCH_SAMPLE_PATIENTS]
+    seconds, _ = timed(lambda: best_matches(sample, donors), repeats=1)
+    return seconds * len(patients) / len(sample), True
+
+def bench_pair_scoring(pairs):
+    """Microseconds per calculate_match_score call over a fixed list of pairs"""
+    if not pairs:
+        return None
+    seconds, _ = timed(lambda: [calculate_match_score(patient, donor) for patient, donor in pairs])
+    return seconds / len(pairs) * 1e6
+
+def sample_pairs(network, patients, donors, count, compatible_only=False):
+    """Random pairs; compatible_only keeps same-organ pairs that reach the organ-specific scoring"""
+    rng = network.random
+    if not compatible_only:
+        return [(rng.choice(patients), rng.choice(donors)) for _ in range(count)]
+    by_organ = {}
+    for donor in donors:
+        by_organ.setdefault(donor['organ_type'], []).append(donor)
+    pairs = []
+    attempts = 0
+    while len(pairs) < count and attempts < count * 20:
+        attempts += 1
+        patient = rng.choice(patients)
+        candidates = by_organ.get(patient['organ_needed'])
+        if not candidates:
+            continue
+        donor = rng.choice(candidates)
+        if calculate_match_score(patient, donor)[0] > 0:
+            pairs.append((patient, donor))
+    return pairs
+
+def bench_delta(conn, network, entity_type, count):
+    """Median ms to score one new donor/patient against the same-organ opposite pool"""
+    samples = []
+    for serial in range(count):
+        if entity_type == 'donor':
+            donor = network.donor(900000 + serial)
+            started = time.perf_counter()
+            patients = conn.execute('SELECT * FROM patients WHERE organ_needed = ? AND status = "active"',
+                                    (donor['organ_type'],)).fetchall()
+            for patient in patients:
+                calculate_match_score(patient, donor)
+        else:
+            patient = network.patient(900000 + serial)
+            started = time.perf_counter()
+            donors = conn.execute('SELECT * FROM donors WHERE organ_type = ? AND status = "active"',
+                                  (patient['organ_needed'],)).fetchall()
+            for donor in donors:
+                calculate_match_score(patient, donor)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+def run_size(size, seed, max_pairs, log):
+    log(f'[{size}] building pool')
+    conn, network = build_pool(size, seed)
+    load_seconds, (patients, donors) = timed(lambda: load_active(conn))
+    log(f'[{size}] full match')
+    full_seconds, estimated = bench_full_match(patients, donors, max_pairs)
+    log(f'[{size}] pair scoring')
+    result = {
+        'patients': len(patients),
+        'donors': len(donors),
+        'load_seconds': round(load_seconds, 4),
+        'full_match_seconds': round(full_seconds, 3),
+        'full_match_estimated': estimated,
+        'pair_score_us': round(bench_pair_scoring(sample_pairs(network, patients, donors, PAIR_SAMPLE)), 3),
+        'compatible_pair_score_us': round(bench_pair_scoring(
+            sample_pairs(network, patients, donors, PAIR_SAMPLE // 4, compatible_only=True)) or 0, 3),
+    }
+    log(f'[{size}] delta scoring')
+    result['delta_donor_ms'] = round(bench_delta(conn, network, 'donor', DELTA_SAMPLE), 3)
+    result['delta_patient_ms'] = round(bench_delta(conn, network, 'patient', DELTA_SAMPLE), 3)
+    conn.close()
+    return result
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=42, max_pairs=FULL_MATCH_MAX_PAIRS, log=print):
+    return {
+        'created_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': f'{platform.system()} {platform.machine()}',
+        'seed': seed,
+        'sizes': {str(size): run_size(size, seed, max_pairs, log) for size in sizes}
+    }
+
+
+# ====================
+# MEMORY
+# ====================
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def measure_memory(variant, db_path, match_patients=MEMORY_MATCH_PATIENTS):
+    """Peak RSS of loading the active network in one representation and matching a patient sample against it.
+
+    'rows' is the whole path before slotted records (SELECT *, sqlite3.Row,
+    dict results holding the rows); 'compact' is get_matches' path. Runs in its
+    own process (see run_memory) so one variant's high-water mark cannot hide
+    the other's. Every donor is scored, as in a full-network match;
+    only the patient side is sampled, since each patient's pass is identical in
+    shape and the pools dominate memory.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    patients, donors = load_active_compact(conn) if variant == 'compact' else load_active(conn)
+    load_seconds = time.perf_counter() - started
+    step = max(1, len(patients) // match_patients)
+    match = best_matches if variant == 'compact' else best_matches_rows
+    matches = match(patients[::step][:match_patients], donors)
+    conn.close()
+    return {
+        'variant': variant,
+        'patients': len(patients),
+        'donors': len(donors),
+        'matched_patients': len(matches),
+        'load_seconds': round(load_seconds, 3),
+        'baseline_rss_mb': before,
+        'peak_rss_mb': peak_rss_mb(),
+        'pool_rss_mb': round(peak_rss_mb() - before, 1),
+    }
+
+def run_memory(size=MEMORY_SIZE, seed=42, log=print):
+    """Peak RSS per pool representation at size donors and size patients"""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'pool.db')
+        log(f'[memory {size}] building pool')
+        build_pool(size, seed, db_path)[0].close()
+        results = {}
+        for variant in MEMORY_VARIANTS:
+            log(f'[memory {size}] {variant}')
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--memory-child', variant, db_path],
+                                    check=True, capture_output=True, text=True).stdout
+            results[variant] = json.loads(output)
+    before, after = results['rows']['pool_rss_mb'], results['compact']['pool_rss_mb']
+    results['saved_mb'] = round(before - after, 1)
+    results['saved_ratio'] = round(1 - after / before, 3) if before else None
+    return results
+
+
+# ====================
+# PAIRED EXCHANGE
+# ====================
+
+def bench_exchange(size, seed):
+    """Stage timings of the paired-exchange planner on size registered pairs"""
+    network = SyntheticNetwork(seed)
+    patients, donors = [], []
+    for patient, donor in network.pairs(size, tuple(range(1, BENCH_HOSPITALS + 1))):
+        patients.append(patient)
+        donors.append(donor)
+    for serial in range(int(size * EXCHANGE_ALTRUIST_SHARE)):
+        donors.append(dict(network.donor(size + serial, organ='Kidney'), altruistic=1))
+
+    seconds = {}
+    started = time.perf_counter()
+    pairs, altruists = build_exchange_pool(patients, donors)
+    seconds['pool'] = time.perf_counter() - started
+    started = time.perf_counter()
+    out, _ = build_exchange_graph(pairs, altruists)
+    seconds['graph'] = time.perf_counter() - started
+    started = time.perf_counter()
+    cycles = find_cycles(out, len(pairs))
+    seconds['cycles'] = time.perf_counter() - started
+    started = time.perf_counter()
+    chains = find_chains(out, len(pairs))
+    seconds['chains'] = time.perf_counter() - started
+    started = time.perf_counter()
+    selected, exact = select_exchanges(cycles + chains)
+    seconds['select'] = time.perf_counter() - started
+
+    candidates = cycles + chains
+    return {
+        'registered_pairs': size,
+        'incompatible_pairs': len(pairs),
+        'altruists': len(altruists),
+        'edges': sum(len(edges) for edges in out),
+        'cycle_candidates': len(cycles),
+        'chain_candidates': len(chains),
+        'transplants': sum(len(candidates[index][1]) - (candidates[index][1][0] >= len(pairs))
+                           for index in selected),
+        'exact': exact,
+        'seconds': {stage: round(value, 3) for stage, value in seconds.items()},
+        'total_seconds': round(sum(seconds.values()), 3),
+    }
+
+def run_exchange(sizes=EXCHANGE_SIZES, seed=42, log=print):
+    results = {}
+    for size in sizes:
+        log(f'[exchange {size}] planning')
+        results[str(size)] = bench_exchange(size, seed)
+    return results
+
+
+# ====================
+# BASELINE
+# ====================
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """[(size, metric, baseline, current, ratio, regressed), ...] for sizes present in both runs"""
+    rows = []
+    for size, metrics in current['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if not previous:
+            continue
+        for metric in TIMED_METRICS:
+            before, after = previous.get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            rows.append((size, metric, before, after, round(ratio, 3), ratio > 1 + tolerance))
+    return rows
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+def save_baseline(result, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as handle:
+        json.dump(result, handle, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the LifeLink matching engine on synthetic pools',
+        epilog='Exits with status 1 when a timing is slower than the baseline by more than --tolerance.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='donors and patients per pool (each side)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON to compare with / save to')
+    parser.add_argument('--save', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown before a metric counts as a regression (0.2 = 20%%)')
+    parser.add_argument('--full-match-limit', type=int, default=FULL_MATCH_MAX_PAIRS,
+                        help='largest patients x donors product matched exhaustively')
+    parser.add_argument('--output', help='also write this run to a JSON file')
+    parser.add_argument('--memory', action='store_true',
+                        help='compare peak RSS of sqlite3.Row and compact pools instead of timing')
+    parser.add_argument('--memory-size', type=int, default=MEMORY_SIZE,
+                        help='donors and patients for --memory (each side)')
+    parser.add_argument('--memory-child', nargs=2, metavar=('VARIANT', 'DB'), help=argparse.SUPPRESS)
+    parser.add_argument('--exchange', action='store_true',
+                        help='time the kidney paired-exchange planner instead of the matcher')
+    parser.add_argument('--exchange-sizes', type=int, nargs='+', default=list(EXCHANGE_SIZES),
+                        help='registered pairs per pool for --exchange')
+    args = parser.parse_args(argv)
+
+    if args.memory_child:
+        print(json.dumps(measure_memory(*args.memory_child)))
+        return 0
+    log = lambda message: print(message, file=sys.stderr)
+    if args.memory:
+        print(json.dumps(run_memory(args.memory_size, args.seed, log), indent=2))
+        return 0
+    if args.exchange:
+        print(json.dumps(run_exchange(args.exchange_sizes, args.seed, log), indent=2))
+        return 0
+    result = run_benchmarks(args.sizes, args.seed, args.full_match_limit, log)
+    print(json.dumps(result['sizes'], indent=2))
+    if args.output:
+        save_baseline(result, args.output)
+
+    regressions = []
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get('seed') != args.seed:
+        print(f'Baseline used seed {baseline.get("seed")}; not comparing', file=sys.stderr)
+    elif baseline:
+        print(f'\nCompared with baseline from {baseline.get("created_at")}:')
+        for size, metric, before, after, ratio, regressed in compare(result, baseline, args.tolerance):
+            flag = 'REGRESSION' if regressed else ''
+            print(f'  {size:>7} {metric:<26} {before:>12} -> {after:<12} x{ratio:<6} {flag}')
+            if regressed:
+                regressions.append((size, metric))
+    if args.save:
+        save_baseline(result, args.baseline)
+        print(f'Baseline saved to {args.baseline}', file=sys.stderr)
+    return 1 if regressions and not args.save else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
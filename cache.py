@@ -0,0 +1,159 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class VersionedLRUCache:
+    """Thread-safe LRU cache whose entries are tagged with a data version.
+
+    An entry is only returned for the version it was stored under, so bumping
+    a data_versions counter invalidates it in every worker without any
+    cross-process messaging. ``ttl`` (seconds, optional) bounds staleness for
+    values that also depend on the clock.
+    """
+
+    def __init__(self, max_entries=256, ttl=None, flight=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Optional SingleFlight so concurrent misses for one key build it only once
+        self.flight = flight
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key, version):
+        """Return the cached value for key at version, or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return MISSING
+            entry_version, value, stored_at = entry
+            if entry_version != version or (self.ttl is not None and time.monotonic() - stored_at > self.ttl):
+                del self._entries[key]
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def get_or_build(self, key, version, build):
+        """Cached value for key at version, building and storing it on a miss"""
+        value = self.get(key, version)
+        if value is MISSING:
+            if self.flight is None:
+                value = build()
+                self.set(key, version, value)
+            else:
+                value = self.flight.do((key, version), lambda: self._build_and_set(key, version, build))
+        return value
+
+    def _build_and_set(self, key, version, build):
+        value = build()
+        self.set(key, version, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 3) if lookups else 0.0
+        return counters
+
+
+# ====================
+# SINGLE FLIGHT
+# ====================
+
+class _FlightCall:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key onto one computation.
+
+    The first caller for a key runs it; callers arriving while it is in flight
+    wait and receive the same result (or exception). Nothing is kept once the
+    call finishes, so keys should include the data version the result depends
+    on, and shared results must be treated as read-only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {'leaders': 0, 'coalesced': 0, 'errors': 0}
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _FlightCall()
+                self._counters['leaders'] += 1
+            else:
+                self._counters['coalesced'] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = compute()
+        except Exception as error:
+            call.error = error
+            with self._lock:
+                self._counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._calls))
+
+
+# ====================
+# REQUEST MEMO
+# ====================
+
+_request_memo = contextvars.ContextVar('lifelink_request_memo', default=None)
+
+def begin_request_memo():
+    """Start a per-request dict for values that cannot change mid-request unless we write them"""
+    _request_memo.set({})
+
+def end_request_memo():
+    _request_memo.set(None)
+
+def request_memo():
+    """The current request's memo dict, or None outside a request (CLI, background threads)"""
+    return _request_memo.get()
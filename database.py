@@ -2,21 +2,24 @@ import sqlite3
 import os
 from werkzeug.security import generate_password_hash
 
+from metrics import InstrumentedConnection
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(os.path.dirname(BASE_DIR), 'lifelink.db')
+DB_PATH = os.environ.get('LIFELINK_DB_PATH', os.path.join(os.path.dirname(BASE_DIR), 'lifelink.db'))
 
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=10.0, detect_types=sqlite3.PARSE_DECLTYPES)
+def get_db(db_path=None):
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=10.0, detect_types=sqlite3.PARSE_DECLTYPES,
+                           factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
     conn.execute('PRAGMA journal_mode=WAL')
     conn.execute('PRAGMA foreign_keys=ON')
     return conn
 
 
-def init_db():
+def init_db(db_path=None):
     """Initialize the database with all tables and sample data."""
-    conn = get_db()
+    conn = get_db(db_path)
     cursor = conn.cursor()
 
     # Hospitals table
@@ -56,6 +59,8 @@ def init_db():
             organ_metrics TEXT,
             medical_history TEXT,
             death_date DATE,
+            paired_patient_id TEXT,
+            altruistic INTEGER NOT NULL DEFAULT 0,
             hospital_id INTEGER NOT NULL,
             doctor_assigned TEXT NOT NULL,
             status TEXT DEFAULT 'active',
@@ -64,12 +69,18 @@ def init_db():
         )
     ''')
 
-    # Ensure new death_date column exists for existing databases
+    # Ensure newer donor columns exist for existing databases
     donor_columns = cursor.execute('PRAGMA table_info(donors)').fetchall()
     if donor_columns:
         column_names = {col['name'] for col in donor_columns}
         if 'death_date' not in column_names:
             cursor.execute('ALTER TABLE donors ADD COLUMN death_date DATE')
+        # Living donor registered on behalf of an (incompatible) patient, for paired exchange
+        if 'paired_patient_id' not in column_names:
+            cursor.execute('ALTER TABLE donors ADD COLUMN paired_patient_id TEXT')
+        # Non-directed living kidney donor who starts paired-exchange chains
+        if 'altruistic' not in column_names:
+            cursor.execute('ALTER TABLE donors ADD COLUMN altruistic INTEGER NOT NULL DEFAULT 0')
 
     # Patients table
     cursor.execute('''
@@ -126,11 +137,95 @@ def init_db():
         )
     ''')
 
+    # Data versions table (change counters for conditional GET / cache invalidation)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Notifications table (append-only feed, one row per recipient hospital)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hospital_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            ref_key TEXT NOT NULL,
+            title TEXT NOT NULL,
+            link TEXT,
+            read_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (hospital_id, ref_key),
+            FOREIGN KEY (hospital_id) REFERENCES hospitals(id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Export jobs table (background exports written to disk)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            hospital_id INTEGER NOT NULL,
+            data_type TEXT NOT NULL,
+            export_format TEXT NOT NULL,
+            compress INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'queued',
+            rows_total INTEGER,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            bytes_written INTEGER NOT NULL DEFAULT 0,
+            file_name TEXT,
+            error TEXT,
+            owner TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (hospital_id) REFERENCES hospitals(id) ON DELETE CASCADE
+        )
+    ''')
+    # Process that accepted each export job ("host:pid"), so orphaned jobs can be told from slow ones
+    export_job_columns = {col['name'] for col in cursor.execute('PRAGMA table_info(export_jobs)').fetchall()}
+    if 'owner' not in export_job_columns:
+        cursor.execute('ALTER TABLE export_jobs ADD COLUMN owner TEXT')
+
     # Helpful indexes
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_donors_hospital ON donors(hospital_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_patients_hospital ON patients(hospital_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_score ON matches(score DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_hospital ON audit_logs(hospital_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifications_hospital ON notifications(hospital_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_export_jobs_hospital ON export_jobs(hospital_id, status)')
+    # Donors /matches and match notifications may offer, per (organ, blood group)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_donors_open ON donors(organ_type, blood_group)
+        WHERE status = 'active' AND paired_patient_id IS NULL AND altruistic = 0
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_donors_paired ON donors(paired_patient_id) WHERE paired_patient_id IS NOT NULL
+    ''')
+    # Waitlists: active patients by urgency per (organ, blood group), per hospital and network-wide.
+    # Ties go to the longest-waiting patient; indexes built with the old newest-first order are rebuilt
+    for name, sql in cursor.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND name IN ('idx_patients_waitlist', 'idx_patients_hospital_urgency', 'idx_patients_urgency')
+    ''').fetchall():
+        if 'created_at DESC' in sql:
+            cursor.execute(f'DROP INDEX {name}')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_patients_waitlist
+        ON patients(organ_needed, blood_group, urgency_score DESC, created_at ASC) WHERE status = 'active'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_patients_hospital_urgency
+        ON patients(hospital_id, urgency_score DESC, created_at ASC) WHERE status = 'active'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_patients_urgency
+        ON patients(urgency_score DESC, created_at ASC) WHERE status = 'active'
+    ''')
+
+    create_json_checks(cursor)
+    create_clinical_markers(cursor)
 
     # Seed hospitals once
     existing = cursor.execute('SELECT COUNT(*) as count FROM hospitals').fetchone()['count']
@@ -168,6 +263,132 @@ def init_db():
     conn.close()
     print("✓ Database initialized successfully")
 
+# ====================
+# JSON COLUMNS
+# ====================
+
+# Columns holding JSON text; exports embed them without re-parsing, so writes must be valid JSON
+JSON_TEXT_COLUMNS = {
+    'donors': ('organ_metrics', 'medical_history'),
+    'patients': ('organ_metrics', 'medical_history'),
+    'audit_logs': ('changes', 'user_info'),
+}
+
+
+def create_json_checks(cursor):
+    """Triggers rejecting writes of invalid JSON to JSON_TEXT_COLUMNS.
+
+    On first run, existing invalid values are stored as JSON strings instead,
+    which every reader already treats like the invalid text.
+    """
+    for table, columns in JSON_TEXT_COLUMNS.items():
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                                (f'trg_{table}_json_insert',)).fetchone()
+        if not exists:
+            for column in columns:
+                cursor.execute(f'''
+                    UPDATE {table} SET {column} = json_quote({column})
+                    WHERE {column} IS NOT NULL AND NOT json_valid({column})
+                ''')
+        invalid = ' OR '.join(f'(NEW.{column} IS NOT NULL AND NOT json_valid(NEW.{column}))' for column in columns)
+        message = f"{table}.{' and '.join(columns)} must be valid JSON"
+        for event, timing in (('insert', 'BEFORE INSERT'), ('update', f'BEFORE UPDATE OF {", ".join(columns)}')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_json_{event} {timing} ON {table}
+                WHEN {invalid}
+                BEGIN SELECT RAISE(ABORT, '{message}'); END
+            ''')
+
+# ====================
+# CLINICAL MARKERS
+# ====================
+
+# Typed copies of the JSON fields the matcher and REM filter on: (column, type, JSON path in organ_metrics)
+CLINICAL_MARKER_COLUMNS = [
+    ('hla_a1', 'TEXT', '$.hla_typing.hla_a[0]'),
+    ('hla_a2', 'TEXT', '$.hla_typing.hla_a[1]'),
+    ('hla_b1', 'TEXT', '$.hla_typing.hla_b[0]'),
+    ('hla_b2', 'TEXT', '$.hla_typing.hla_b[1]'),
+    ('hla_dr1', 'TEXT', '$.hla_typing.hla_dr[0]'),
+    ('hla_dr2', 'TEXT', '$.hla_typing.hla_dr[1]'),
+    ('meld_score', 'INTEGER', '$.meld_score'),
+    ('ejection_fraction', 'INTEGER', '$.ejection_fraction'),
+    ('fev1_score', 'INTEGER', '$.fev1_score'),
+    ('c_peptide_level', 'REAL', '$.c_peptide_level'),
+    ('dialysis_duration_months', 'INTEGER', '$.dialysis_duration_months'),
+]
+# Flags derived from medical_history: (column, conditions that set it)
+CLINICAL_MARKER_FLAGS = [
+    ('has_malignancy', ('Active Cancer', 'Malignancy')),
+    ('has_active_infection', ('Active Infection',)),
+]
+# Scalar markers REM can filter on; partial indexes stay small because each applies to one organ
+INDEXED_CLINICAL_MARKERS = ('meld_score', 'ejection_fraction', 'fev1_score', 'c_peptide_level')
+
+
+def clinical_marker_values(alias):
+    """SELECT expressions computing every marker from a donors/patients row named alias"""
+    metrics = f'{alias}.organ_metrics'
+    history = f'{alias}.medical_history'
+    values = [f"CASE WHEN json_valid({metrics}) THEN json_extract({metrics}, '{path}') END"
+              for _, _, path in CLINICAL_MARKER_COLUMNS]
+    for _, conditions in CLINICAL_MARKER_FLAGS:
+        listed = ', '.join(f"'{condition}'" for condition in conditions)
+        values.append(f"CASE WHEN json_valid({history}) THEN EXISTS "
+                      f"(SELECT 1 FROM json_each({history}) WHERE value IN ({listed})) ELSE 0 END")
+    return values
+
+
+def create_clinical_markers(cursor):
+    """clinical_markers side table, kept in sync with donors/patients by triggers.
+
+    A side table keeps SELECT * and backups of the entity tables unchanged, and
+    triggers cover every write path, including bulk seeding.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clinical_markers'").fetchone()
+    columns = [name for name, _, _ in CLINICAL_MARKER_COLUMNS] + [name for name, _ in CLINICAL_MARKER_FLAGS]
+    definitions = [f'{name} {sql_type}' for name, sql_type, _ in CLINICAL_MARKER_COLUMNS]
+    definitions += [f'{name} INTEGER NOT NULL DEFAULT 0' for name, _ in CLINICAL_MARKER_FLAGS]
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS clinical_markers (
+            entity_type TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            {', '.join(definitions)},
+            PRIMARY KEY (entity_type, entity_id)
+        ) WITHOUT ROWID
+    ''')
+    for name in INDEXED_CLINICAL_MARKERS:
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_markers_{name} ON clinical_markers(entity_type, {name})
+            WHERE {name} IS NOT NULL
+        ''')
+
+    column_list = ', '.join(['entity_type', 'entity_id'] + columns)
+    for table, entity_type, id_column in (('donors', 'donor', 'donor_id'), ('patients', 'patient', 'patient_id')):
+        upsert = (f"INSERT OR REPLACE INTO clinical_markers ({column_list}) "
+                  f"VALUES ('{entity_type}', NEW.{id_column}, {', '.join(clinical_marker_values('NEW'))})")
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_markers_insert AFTER INSERT ON {table}
+            BEGIN {upsert}; END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_markers_update
+            AFTER UPDATE OF organ_metrics, medical_history ON {table}
+            BEGIN {upsert}; END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_markers_delete AFTER DELETE ON {table}
+            BEGIN DELETE FROM clinical_markers WHERE entity_type = '{entity_type}' AND entity_id = OLD.{id_column}; END
+        ''')
+        if not exists:
+            # Backfill rows written before the table existed
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO clinical_markers ({column_list})
+                SELECT '{entity_type}', t.{id_column}, {', '.join(clinical_marker_values('t'))} FROM {table} t
+            ''')
+
+
 # Approved hospitals list for signup validation
 APPROVED_HOSPITALS = {
     "MH123456": "Apollo Hospital Mumbai",
@@ -0,0 +1,441 @@
+import heapq
+import time
+from collections import Counter
+
+from cache import VersionedLRUCache
+from metrics import observe_match_batch
+from models import (get_db, get_data_versions, parse_json_field, hla_allele_set, check_blood_compatibility,
+                    RECIPIENT_BLOOD_GROUPS, NETWORK_SCOPE)
+
+# Quality of one transplant: shared HLA alleles (of 6) and recipient urgency (0-100)
+EXCHANGE_HLA_WEIGHT = 5
+EXCHANGE_URGENCY_WEIGHT = 0.1
+MAX_TRANSPLANT_QUALITY = 6 * EXCHANGE_HLA_WEIGHT + 100 * EXCHANGE_URGENCY_WEIGHT
+# Fewest shared HLA alleles (of 6) for a donor to be offered to a patient
+MIN_EXCHANGE_HLA = 2
+MAX_CYCLE_LENGTH = 3
+# Transplants in a chain, counting the altruistic donor's
+MAX_CHAIN_LENGTH = 3
+# Each pair keeps only its strongest outgoing edges, which bounds cycle search at O(pairs x K^2)
+EXCHANGE_MAX_OUT_EDGES = 30
+# Edges followed from each step of a chain
+CHAIN_BRANCHING = 4
+# Exact selection limits per group of conflicting candidates: vertices, and candidate visits
+EXCHANGE_EXACT_VERTICES = 60
+EXCHANGE_EXACT_WORK = 2000000
+# Local search: candidates per vertex tried as replacements, and passes over the plan
+EXCHANGE_SWAP_CANDIDATES = 25
+EXCHANGE_IMPROVE_ROUNDS = 3
+EXCHANGE_CACHE_SIZE = 4
+
+
+# ====================
+# POOL
+# ====================
+
+def load_exchange_pool(conn):
+    """(pairs, altruists) from active kidney donors.
+
+    A pair is a patient with every donor registered on their behalf
+    (donors.paired_patient_id), kept only when none of those donors can give
+    to the patient directly. Donors flagged altruistic (donors.altruistic)
+    start chains; other kidney donors stay with /matches and are never offered
+    here, so no kidney is promised twice.
+    """
+    donors = conn.execute('''
+        SELECT donor_id, name, blood_group, organ_metrics, location, hospital_id, paired_patient_id, altruistic
+        FROM donors
+        WHERE organ_type = 'Kidney' AND status = 'active' AND (paired_patient_id IS NOT NULL OR altruistic = 1)
+    ''').fetchall()
+    patients = conn.execute('''
+        SELECT patient_id, name, blood_group, organ_metrics, location, urgency_score, hospital_id
+        FROM patients
+        WHERE organ_needed = 'Kidney' AND status = 'active'
+          AND patient_id IN (SELECT paired_patient_id FROM donors WHERE paired_patient_id IS NOT NULL)
+    ''').fetchall()
+    return build_exchange_pool(patients, donors)
+
+def build_exchange_pool(patients, donors):
+    """Group donor rows under their paired patients; see load_exchange_pool"""
+    pairs = {patient['patient_id']: {'patient': patient, 'hla': kidney_hla(patient), 'donors': []}
+             for patient in patients}
+    altruists = []
+    for donor in donors:
+        entry = {'donor': donor, 'hla': kidney_hla(donor)}
+        if donor['altruistic']:
+            altruists.append(entry)
+        elif donor['paired_patient_id'] in pairs:
+            pairs[donor['paired_patient_id']]['donors'].append(entry)
+    incompatible = [pair for pair in pairs.values()
+                    if pair['donors'] and not any(exchange_quality(pair['patient'], pair['hla'], entry) is not None
+                                                  for entry in pair['donors'])]
+    return incompatible, altruists
+
+def kidney_hla(row):
+    return hla_allele_set(parse_json_field(row['organ_metrics'], {}).get('hla_typing'))
+
+def exchange_quality(patient, patient_hla, donor_entry):
+    """Transplant quality for donor -> patient, or None when they cannot be matched"""
+    if not check_blood_compatibility(patient['blood_group'], donor_entry['donor']['blood_group']):
+        return None
+    shared = min(len(patient_hla & donor_entry['hla']), 6)
+    if shared < MIN_EXCHANGE_HLA:
+        return None
+    return transplant_quality(shared, patient['urgency_score'])
+
+def transplant_quality(shared_hla, urgency):
+    return shared_hla * EXCHANGE_HLA_WEIGHT + min(max(urgency or 0, 0), 100) * EXCHANGE_URGENCY_WEIGHT
+
+def transplant_weight(pair_count):
+    """Weight every transplant carries on top of its quality.
+
+    A plan has at most one transplant per pair, so this exceeds the quality
+    of any whole plan: totals compare by transplants first, then by quality.
+    """
+    return MAX_TRANSPLANT_QUALITY * pair_count + 1
+
+
+# ====================
+# GRAPH
+# ====================
+
+def build_exchange_graph(pairs, altruists, max_out_edges=EXCHANGE_MAX_OUT_EDGES):
+    """Compatibility digraph over pairs 0..P-1 and altruists P..P+A-1.
+
+    Returns (out, checks): out[vertex] maps a target pair to (weight, donor index,
+    shared HLA), weight being transplant_weight plus the transplant's quality.
+    Each vertex keeps its max_out_edges strongest edges (by any of its donors);
+    checks is the number of donor-patient combinations considered.
+    Shared alleles are counted through an allele -> patients index per blood
+    group rather than by comparing every donor with every patient.
+    """
+    carriers = {}
+    group_sizes = {}
+    for index, pair in enumerate(pairs):
+        blood_group = pair['patient']['blood_group']
+        group_sizes[blood_group] = group_sizes.get(blood_group, 0) + 1
+        alleles = carriers.setdefault(blood_group, {})
+        for allele in pair['hla']:
+            alleles.setdefault(allele, []).append(index)
+    per_transplant = transplant_weight(len(pairs))
+    base_weight = [per_transplant + transplant_quality(0, pair['patient']['urgency_score']) for pair in pairs]
+
+    sources = [pair['donors'] for pair in pairs] + [[entry] for entry in altruists]
+    out = []
+    checks = 0
+    for source, donors in enumerate(sources):
+        edges = []
+        for donor_index, entry in enumerate(donors):
+            shared = Counter()
+            for blood_group in RECIPIENT_BLOOD_GROUPS.get(entry['donor']['blood_group'], ()):
+                alleles = carriers.get(blood_group)
+                if alleles:
+                    checks += group_sizes[blood_group]
+                    for allele in entry['hla']:
+                        shared.update(alleles.get(allele, ()))
+            edges.extend((base_weight[target] + count * EXCHANGE_HLA_WEIGHT, target, donor_index, count)
+                         for target, count in shared.items() if count >= MIN_EXCHANGE_HLA and target != source)
+        best = {}
+        # Strongest first, so chain search can take the head of each list
+        for weight, target, donor_index, count in heapq.nlargest(max_out_edges, edges):
+            best.setdefault(target, (weight, donor_index, count))
+        out.append(best)
+    return out, checks
+
+def find_cycles(out, pair_count, max_length=MAX_CYCLE_LENGTH):
+    """Every directed 2- and 3-cycle among pairs, each listed once from its lowest vertex: [(weight, vertices)]"""
+    cycles = []
+    for u in range(pair_count):
+        for v, (uv, _, _) in out[u].items():
+            if v < u:
+                continue
+            back = out[v].get(u)
+            if back:
+                cycles.append((uv + back[0], (u, v)))
+            if max_length < 3:
+                continue
+            for w, (vw, _, _) in out[v].items():
+                if w <= u:
+                    continue
+                closing = out[w].get(u)
+                if closing:
+                    cycles.append((uv + vw + closing[0], (u, v, w)))
+    return cycles
+
+def find_chains(out, pair_count, max_length=MAX_CHAIN_LENGTH, branching=CHAIN_BRANCHING):
+    """Paths from each altruist through up to max_length pairs: [(weight, (altruist, pair, ...))].
+
+    Every prefix is a chain in its own right; the last pair's donor gives to the
+    deceased-donor waitlist. Each chain uses up at least one pair, so only the
+    pair_count altruists with the strongest first edges start chains.
+    """
+    chains = []
+    starts = sorted((altruist for altruist in range(pair_count, len(out)) if out[altruist]),
+                    key=lambda altruist: next(iter(out[altruist].values()))[0], reverse=True)[:pair_count]
+    for altruist in starts:
+        stack = [((altruist,), 0)]
+        while stack:
+            path, weight = stack.pop()
+            if len(path) > max_length:
+                continue
+            taken = 0
+            for target, (edge, _, _) in out[path[-1]].items():
+                if taken == branching:
+                    break
+                if target in path:
+                    continue
+                taken += 1
+                extended = path + (target,)
+                chains.append((weight + edge, extended))
+                stack.append((extended, weight + edge))
+    return chains
+
+
+# ====================
+# OPTIMIZATION
+# ====================
+
+def select_exchanges(candidates):
+    """Vertex-disjoint candidates with a high total weight: (indexes, exact).
+
+    Candidates only compete when they share a pair or altruist, so each group of
+    conflicting candidates is packed on its own: most constrained vertex first,
+    then improved by swaps. solve_component then searches each group for a
+    better plan; exact is False when any group's search stopped before proving
+    its plan optimal.
+    """
+    chosen = []
+    exact = True
+    for component in conflict_components(candidates):
+        if len(component) == 1:
+            chosen.extend(component)
+            continue
+        packed = improve_by_swaps(candidates, component, pack_constrained_first(candidates, component))
+        solved, proven = solve_component(candidates, component, packed)
+        exact = exact and proven
+        chosen.extend(solved)
+    return sorted(chosen, key=lambda index: candidates[index][0], reverse=True), exact
+
+def conflict_components(candidates):
+    """Candidate indexes grouped by shared vertices, directly or through other candidates"""
+    parent = list(range(len(candidates)))
+
+    def root(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    first_user = {}
+    for index, (_, vertices) in enumerate(candidates):
+        for vertex in vertices:
+            parent[root(index)] = root(first_user.setdefault(vertex, index))
+    components = {}
+    for index in range(len(candidates)):
+        components.setdefault(root(index), []).append(index)
+    return list(components.values())
+
+def candidates_by_vertex(candidates, indexes):
+    """vertex -> its candidates, heaviest first, and the vertices ordered fewest candidates first"""
+    by_vertex = {}
+    for index in sorted(indexes, key=lambda index: candidates[index][0], reverse=True):
+        for vertex in candidates[index][1]:
+            by_vertex.setdefault(vertex, []).append(index)
+    return by_vertex, sorted(by_vertex, key=lambda vertex: len(by_vertex[vertex]))
+
+def pack_constrained_first(candidates, indexes):
+    """Disjoint subset of indexes: each vertex, fewest candidates first, takes its heaviest free candidate.
+
+    Serving the vertices with the fewest options first keeps a long cycle from
+    using up pairs that had nothing else, which taking the heaviest candidates
+    first does not.
+    """
+    by_vertex, order = candidates_by_vertex(candidates, indexes)
+    closed = set()
+    chosen = []
+    for vertex in order:
+        if vertex in closed:
+            continue
+        for option in by_vertex[vertex]:
+            vertices = candidates[option][1]
+            if closed.isdisjoint(vertices):
+                closed.update(vertices)
+                chosen.append(option)
+                break
+        closed.add(vertex)
+    return chosen
+
+def improve_by_swaps(candidates, indexes, chosen):
+    """Repeatedly swap a chosen candidate for two disjoint ones that use its vertices (and free ones) and weigh more"""
+    owner = {}
+    for index in chosen:
+        owner.update(dict.fromkeys(candidates[index][1], index))
+    chosen = set(chosen)
+
+    by_vertex = {}
+    for index in sorted(indexes, key=lambda index: candidates[index][0], reverse=True):
+        for vertex in candidates[index][1]:
+            options = by_vertex.setdefault(vertex, [])
+            if len(options) < EXCHANGE_SWAP_CANDIDATES:
+                options.append(index)
+
+    for _ in range(EXCHANGE_IMPROVE_ROUNDS):
+        improved = False
+        for index in list(chosen):
+            released = candidates[index][1]
+            options = {option for vertex in released for option in by_vertex.get(vertex, ())
+                       if option != index and all(owner.get(other, index) == index
+                                                  for other in candidates[option][1])}
+            options = sorted(options, key=lambda option: candidates[option][0], reverse=True)
+            best, best_weight = None, candidates[index][0]
+            for position, first in enumerate(options):
+                first_weight, first_vertices = candidates[first]
+                if first_weight * 2 <= best_weight:
+                    break
+                for second in options[position + 1:]:
+                    second_weight, second_vertices = candidates[second]
+                    if first_weight + second_weight <= best_weight:
+                        break
+                    if set(first_vertices).isdisjoint(second_vertices):
+                        best, best_weight = (first, second), first_weight + second_weight
+                        break
+            if best:
+                chosen.discard(index)
+                for vertex in released:
+                    del owner[vertex]
+                for option in best:
+                    chosen.add(option)
+                    owner.update(dict.fromkeys(candidates[option][1], option))
+                improved = True
+        if not improved:
+            break
+    return list(chosen)
+
+def solve_component(candidates, indexes, incumbent, work_limit=EXCHANGE_EXACT_WORK):
+    """(best disjoint subset of indexes found by branch and bound, whether it is proven maximal)
+
+    Branches on each vertex in turn (fewest candidates first): cover it with one
+    of its free candidates, or leave it out. Each open vertex can add at most the
+    best per-vertex share (weight / length) among candidates still free, which
+    bounds the branch; incumbent is the plan to beat. Stops unproven past
+    work_limit candidate visits, and does not search groups of more than
+    EXCHANGE_EXACT_VERTICES vertices.
+    """
+    by_vertex, order = candidates_by_vertex(candidates, indexes)
+    if len(order) > EXCHANGE_EXACT_VERTICES:
+        return incumbent, False
+    best = [sum(candidates[index][0] for index in incumbent), list(incumbent)]
+    closed = set()
+    work = 0
+
+    def bound():
+        shares = {}
+        for index in indexes:
+            weight, vertices = candidates[index]
+            if closed.isdisjoint(vertices):
+                share = weight / len(vertices)
+                for vertex in vertices:
+                    if shares.get(vertex, 0) < share:
+                        shares[vertex] = share
+        return sum(shares.values())
+
+    def search(position, weight, chosen):
+        nonlocal work
+        work += len(indexes)
+        if work > work_limit:
+            raise OverflowError
+        while position < len(order) and order[position] in closed:
+            position += 1
+        if weight > best[0] + 1e-9:
+            best[:] = [weight, list(chosen)]
+        if position == len(order) or weight + bound() <= best[0] + 1e-9:
+            return
+        vertex = order[position]
+        for option in by_vertex[vertex]:
+            vertices = candidates[option][1]
+            if closed.isdisjoint(vertices):
+                closed.update(vertices)
+                chosen.append(option)
+                search(position + 1, weight + candidates[option][0], chosen)
+                chosen.pop()
+                closed.difference_update(vertices)
+        closed.add(vertex)
+        search(position + 1, weight, chosen)
+        closed.discard(vertex)
+
+    try:
+        search(0, 0, [])
+    except OverflowError:
+        return best[1], False
+    return best[1], True
+
+
+# ====================
+# PLAN
+# ====================
+
+def plan_exchanges(pairs, altruists):
+    """Best set of exchange cycles and altruistic chains for a pool, with search statistics"""
+    started = time.perf_counter()
+    out, checks = build_exchange_graph(pairs, altruists)
+    cycles = find_cycles(out, len(pairs))
+    chains = find_chains(out, len(pairs))
+    candidates = cycles + chains
+    selected, exact = select_exchanges(candidates)
+    elapsed = time.perf_counter() - started
+    observe_match_batch('exchange', checks, elapsed)
+
+    plan = {'cycles': [], 'chains': []}
+    for index in selected:
+        vertices = candidates[index][1]
+        if vertices[0] >= len(pairs):
+            altruist = altruists[vertices[0] - len(pairs)]
+            steps = [transplant(altruist['donor'], None, pairs[vertices[1]], out[vertices[0]][vertices[1]])]
+            steps += [transplant(pairs[source]['donors'][out[source][target][1]]['donor'], pairs[source],
+                                 pairs[target], out[source][target])
+                      for source, target in zip(vertices[1:], vertices[2:])]
+            plan['chains'].append({'quality': round(sum(step['quality'] for step in steps), 1),
+                                   'altruist': altruist['donor'], 'transplants': steps,
+                                   'bridge_donor': pairs[vertices[-1]]['donors'][0]['donor']})
+        else:
+            steps = [transplant(pairs[source]['donors'][out[source][target][1]]['donor'], pairs[source],
+                                pairs[target], out[source][target])
+                     for source, target in zip(vertices, vertices[1:] + vertices[:1])]
+            plan['cycles'].append({'quality': round(sum(step['quality'] for step in steps), 1), 'transplants': steps})
+
+    plan['stats'] = {
+        'pairs': len(pairs),
+        'altruists': len(altruists),
+        'edges': sum(len(edges) for edges in out),
+        'cycle_candidates': len(cycles),
+        'chain_candidates': len(chains),
+        'transplants': sum(len(item['transplants']) for item in plan['cycles'] + plan['chains']),
+        'exact': exact,
+        'seconds': round(elapsed, 3),
+    }
+    return plan
+
+def transplant(donor, donor_pair, recipient_pair, edge):
+    _, _, shared = edge
+    return {
+        'donor': donor,
+        'donor_patient_id': donor_pair['patient']['patient_id'] if donor_pair else None,
+        'patient': recipient_pair['patient'],
+        'hla_matches': shared,
+        'quality': round(transplant_quality(shared, recipient_pair['patient']['urgency_score']), 1),
+    }
+
+exchange_cache = VersionedLRUCache(EXCHANGE_CACHE_SIZE)
+
+def get_exchange_plan():
+    """Network-wide exchange plan, rebuilt only when donor/patient data changes"""
+    version = get_data_versions([NETWORK_SCOPE])[NETWORK_SCOPE][0]
+
+    def build():
+        conn = get_db()
+        try:
+            return plan_exchanges(*load_exchange_pool(conn))
+        finally:
+            conn.close()
+
+    return exchange_cache.get_or_build('plan', version, build)
@@ -0,0 +1,234 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from exports import build_export_chunks, count_export_rows, export_download_info, stream_export
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.path.join(os.path.dirname(BASE_DIR), 'lifelink_exports')
+
+# Small pool so background exports never compete with interactive requests for long
+EXPORT_WORKERS = 2
+MAX_ACTIVE_JOBS_PER_HOSPITAL = 2
+# Minimum seconds between progress writes to the export_jobs row
+PROGRESS_INTERVAL = 0.5
+# Running jobs owned by another host with no progress for this long belonged to a worker that died
+STALE_JOB_SECONDS = 600
+JOB_RETENTION_SECONDS = 24 * 3600
+# Seconds between background sweeps for orphaned jobs and expired files
+CLEANUP_INTERVAL = 300
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class ExportLimitError(Exception):
+    """Raised when a hospital already has the maximum number of active export jobs"""
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ExportJobQueue:
+    """Runs exports in a bounded thread pool and records state in the export_jobs table.
+
+    Job rows live in SQLite so any worker process can report status or serve the
+    finished file; only the process that accepted a job (its owner) runs it. A
+    background sweep fails jobs whose owner has exited and deletes expired files.
+    The worker pool and the sweep start on first use, not when the queue is built.
+    """
+
+    def __init__(self, connect, export_dir=EXPORT_DIR, max_workers=EXPORT_WORKERS,
+                 per_hospital_limit=MAX_ACTIVE_JOBS_PER_HOSPITAL, cleanup_interval=CLEANUP_INTERVAL):
+        self.connect = connect
+        self.export_dir = export_dir
+        self.per_hospital_limit = per_hospital_limit
+        self.max_workers = max_workers
+        self.executor = None
+        self._executor_pid = None
+        self.host = socket.gethostname()
+        self.cleanup_interval = cleanup_interval
+        self._janitor = None
+        self._janitor_lock = threading.Lock()
+
+    @property
+    def owner(self):
+        # Read per call: gunicorn forks workers after the queue is created
+        return f'{self.host}:{os.getpid()}'
+
+    def submit(self, hospital_id, data_type, export_format, compress=False):
+        """Queue an export; raises ExportLimitError when the hospital is at its cap"""
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.ensure_started()
+        job_id = uuid.uuid4().hex
+        conn = self.connect()
+        try:
+            # IMMEDIATE takes the write lock so concurrent submits cannot both pass the cap check
+            conn.execute('BEGIN IMMEDIATE')
+            self._expire_stale(conn)
+            active = conn.execute(f'''
+                SELECT COUNT(*) as count FROM export_jobs
+                WHERE hospital_id = ? AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})
+            ''', (hospital_id, *ACTIVE_STATUSES)).fetchone()['count']
+            if active >= self.per_hospital_limit:
+                conn.rollback()
+                raise ExportLimitError(
+                    f'At most {self.per_hospital_limit} exports can run at once for a hospital.')
+            conn.execute('''
+                INSERT INTO export_jobs (id, hospital_id, data_type, export_format, compress, owner)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (job_id, hospital_id, data_type, export_format, int(bool(compress)), self.owner))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.executor.submit(self._run, job_id, hospital_id, data_type, export_format, compress)
+        return self.get(job_id, hospital_id)
+
+    def get(self, job_id, hospital_id):
+        conn = self.connect()
+        job = conn.execute(
+            'SELECT * FROM export_jobs WHERE id = ? AND hospital_id = ?', (job_id, hospital_id)
+        ).fetchone()
+        conn.close()
+        return job
+
+    def list(self, hospital_id, limit=20):
+        self.ensure_started()
+        conn = self.connect()
+        jobs = conn.execute('''
+            SELECT * FROM export_jobs WHERE hospital_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        ''', (hospital_id, limit)).fetchall()
+        conn.close()
+        return jobs
+
+    def file_path(self, job):
+        return os.path.join(self.export_dir, f"{job['id']}.{job['file_name'].rsplit('.', 1)[-1]}")
+
+    def _update(self, job_id, expected_status=None, **fields):
+        """Set fields on a job (only while it is in expected_status, when given); True if the row changed"""
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        condition, params = 'id = ?', [job_id]
+        if expected_status is not None:
+            condition += ' AND status = ?'
+            params.append(expected_status)
+        conn = self.connect()
+        changed = conn.execute(
+            f'UPDATE export_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE {condition}',
+            (*fields.values(), *params)
+        ).rowcount
+        conn.commit()
+        conn.close()
+        return changed > 0
+
+    def _run(self, job_id, hospital_id, data_type, export_format, compress):
+        filename, _, compress = export_download_info(
+            data_type, export_format, compress, datetime.now().strftime('%Y%m%d'))
+        final_path = os.path.join(self.export_dir, f"{job_id}.{filename.rsplit('.', 1)[-1]}")
+        temp_path = final_path + '.part'
+        progress = {'rows': 0, 'bytes': 0, 'flushed_at': 0.0}
+
+        def on_rows(count):
+            progress['rows'] += count
+            now = time.monotonic()
+            if now - progress['flushed_at'] >= PROGRESS_INTERVAL:
+                progress['flushed_at'] = now
+                self._update(job_id, rows_done=progress['rows'], bytes_written=progress['bytes'])
+
+        def build_chunks(conn):
+            # Counted inside the export's snapshot so the total matches what gets written
+            self._update(job_id, rows_total=count_export_rows(conn, data_type, export_format, hospital_id))
+            return build_export_chunks(conn, data_type, export_format, hospital_id, on_rows=on_rows)
+
+        # A job failed while it waited in the pool must stay failed
+        if not self._update(job_id, expected_status='queued', status='running', file_name=filename):
+            return
+        try:
+            with open(temp_path, 'wb') as handle:
+                for chunk in stream_export(self.connect, build_chunks, compress):
+                    handle.write(chunk)
+                    progress['bytes'] += len(chunk)
+            os.replace(temp_path, final_path)
+            self._update(job_id, status='completed', rows_done=progress['rows'],
+                         bytes_written=progress['bytes'], finished_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        except Exception as job_error:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self._update(job_id, status='failed', error=str(job_error)[:500],
+                         finished_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def ensure_started(self):
+        """Start the worker pool and the background cleanup thread, again after a fork"""
+        with self._janitor_lock:
+            if self._executor_pid != os.getpid():
+                # A pool inherited through fork has no threads in this process
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='export-job')
+                self._executor_pid = os.getpid()
+            if self._janitor is None or not self._janitor.is_alive():
+                self._janitor = threading.Thread(target=self._sweep_forever, name='export-janitor', daemon=True)
+                self._janitor.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.cleanup_interval)
+            try:
+                conn = self.connect()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    self._expire_stale(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as sweep_error:
+                print(f"[LifeLink] Export cleanup error: {sweep_error}")
+
+    def _orphaned(self, job):
+        """Whether an active job's owner process is gone.
+
+        Owners on this host are checked directly, so jobs that are merely slow or
+        queued behind long exports are never failed. Owners on other hosts cannot
+        be checked: their running jobs are treated as orphaned after
+        STALE_JOB_SECONDS without progress, and their queued jobs are left alone.
+        """
+        host, _, pid = (job['owner'] or '').rpartition(':')
+        if host == self.host and pid.isdigit():
+            return not process_alive(int(pid))
+        return job['status'] == 'running' and bool(job['stale'])
+
+    def _expire_stale(self, conn):
+        """Fail jobs orphaned by a dead worker and delete files past the retention window"""
+        active = conn.execute(f'''
+            SELECT id, status, owner, updated_at < datetime('now', ?) as stale FROM export_jobs
+            WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})
+        ''', (f'-{STALE_JOB_SECONDS} seconds', *ACTIVE_STATUSES)).fetchall()
+        orphaned = [(job['id'], job['status']) for job in active if self._orphaned(job)]
+        if orphaned:
+            conn.executemany('''
+                UPDATE export_jobs SET status = 'failed', error = 'Export worker stopped responding',
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = ?
+            ''', orphaned)
+
+        expired = conn.execute('''
+            SELECT * FROM export_jobs
+            WHERE status = 'completed' AND finished_at < datetime('now', ?)
+        ''', (f'-{JOB_RETENTION_SECONDS} seconds',)).fetchall()
+        for job in expired:
+            path = self.file_path(job)
+            if os.path.exists(path):
+                os.remove(path)
+        if expired:
+            conn.executemany("UPDATE export_jobs SET status = 'expired' WHERE id = ?",
+                             [(job['id'],) for job in expired])
@@ -0,0 +1,359 @@
+import csv
+import io
+import json
+import zipfile
+import zlib
+from datetime import datetime
+from io import StringIO
+
+# Rows pulled from SQLite per fetchmany() call
+EXPORT_BATCH_SIZE = 500
+# Serialized bytes buffered before a chunk is handed to the WSGI server
+EXPORT_FLUSH_BYTES = 64 * 1024
+# Final line written when an export fails after part of it was sent
+EXPORT_FAILED_MARKER = '#EXPORT_FAILED'
+EXPORT_FAILED_MESSAGE = 'Export failed before completion; this file is incomplete'
+
+# Each export is a header plus one or more queries whose columns are already in header order
+EXPORT_SPECS = {
+    'donors': {
+        'filename': 'donors_export',
+        'header': ['Donor ID', 'Name', 'DOB', 'Gender', 'Blood Group',
+                   'Organ Type', 'Location', 'Weight (kg)', 'Height (cm)',
+                   'Status', 'Created At'],
+        'queries': ['''
+            SELECT donor_id, name, dob, gender, blood_group, organ_type,
+                   location, weight_kg, height_cm, status, created_at
+            FROM donors WHERE hospital_id = ?
+        '''],
+    },
+    'patients': {
+        'filename': 'patients_export',
+        'header': ['Patient ID', 'Name', 'DOB', 'Gender', 'Blood Group',
+                   'Organ Needed', 'Location', 'Weight (kg)', 'Height (cm)',
+                   'Urgency Score', 'Status', 'Created At'],
+        'queries': ['''
+            SELECT patient_id, name, dob, gender, blood_group, organ_needed,
+                   location, weight_kg, height_cm, urgency_score, status, created_at
+            FROM patients WHERE hospital_id = ?
+        '''],
+    },
+    'matches': {
+        'filename': 'matches_export',
+        'header': ['Match Score', 'Patient ID', 'Patient Name', 'Organ Needed',
+                   'Donor ID', 'Donor Name', 'Organ Type', 'Donor Location'],
+        'queries': ['''
+            SELECT m.score, p.patient_id, p.name as patient_name, p.organ_needed,
+                   d.donor_id, d.name as donor_name, d.organ_type, d.location as donor_location
+            FROM matches m
+            JOIN patients p ON m.patient_id = p.patient_id
+            JOIN donors d ON m.donor_id = d.donor_id
+            WHERE p.hospital_id = ?
+            ORDER BY m.score DESC
+        '''],
+    },
+    'all': {
+        # Summary CSV; use ?format=zip or ?format=jsonl for a full backup
+        'filename': 'all_data_export',
+        'header': ['Type', 'ID', 'Name', 'Organ', 'Blood Group', 'Location', 'Status', 'Created At'],
+        'queries': ['''
+            SELECT 'DONOR' as type, donor_id as id, name, organ_type as organ,
+                   blood_group, location, status, created_at
+            FROM donors WHERE hospital_id = ?
+        ''', '''
+            SELECT 'PATIENT' as type, patient_id as id, name, organ_needed as organ,
+                   blood_group, location, status, created_at
+            FROM patients WHERE hospital_id = ?
+        '''],
+    },
+}
+
+
+# Full per-hospital backup used by the ZIP and JSONL formats: (name, query, JSON text columns)
+BACKUP_TABLES = [
+    ('donors', 'SELECT * FROM donors WHERE hospital_id = ? ORDER BY id',
+     ('organ_metrics', 'medical_history')),
+    ('patients', 'SELECT * FROM patients WHERE hospital_id = ? ORDER BY id',
+     ('organ_metrics', 'medical_history')),
+    ('matches', '''
+        SELECT m.* FROM matches m
+        JOIN patients p ON m.patient_id = p.patient_id
+        WHERE p.hospital_id = ?
+        ORDER BY m.id
+    ''', ()),
+    ('audit_logs', 'SELECT * FROM audit_logs WHERE hospital_id = ? ORDER BY id',
+     ('changes', 'user_info')),
+]
+
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'zip': ('zip', 'application/zip'),
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+}
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file object whose contents are drained into a stream"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_query_batches(conn, sql, params, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of rows from a query without materializing the full result"""
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def iter_csv_chunks(conn, spec, hospital_id, batch_size=EXPORT_BATCH_SIZE, on_rows=None):
+    """Serialize an export spec to UTF-8 CSV chunks of roughly EXPORT_FLUSH_BYTES"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(spec['header'])
+
+    for sql in spec['queries']:
+        for rows in iter_query_batches(conn, sql, (hospital_id,), batch_size):
+            writer.writerows(rows)
+            if on_rows:
+                on_rows(len(rows))
+            if buffer.tell() >= EXPORT_FLUSH_BYTES:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_zip_chunks(conn, hospital_id, tables=BACKUP_TABLES, batch_size=EXPORT_BATCH_SIZE, on_rows=None):
+    """Stream a ZIP with one CSV per table plus manifest.json.
+
+    zipfile writes data descriptors when the target is unseekable, so each
+    member can be emitted while it is being produced.
+    """
+    sink = ChunkSink()
+    manifest = {
+        'format': 'lifelink-backup',
+        'version': 1,
+        'hospital_id': hospital_id,
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'files': []
+    }
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, sql, json_columns in tables:
+            cursor = conn.execute(sql, (hospital_id,))
+            columns = [column[0] for column in cursor.description]
+            row_count = 0
+            with archive.open(f'{name}.csv', 'w', force_zip64=True) as member:
+                text = io.TextIOWrapper(member, encoding='utf-8', newline='')
+                writer = csv.writer(text)
+                writer.writerow(columns)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    row_count += len(rows)
+                    if on_rows:
+                        on_rows(len(rows))
+                    text.flush()
+                    data = sink.drain()
+                    if data:
+                        yield data
+                text.flush()
+                text.detach()
+            cursor.close()
+            manifest['files'].append({
+                'name': f'{name}.csv',
+                'table': name,
+                'rows': row_count,
+                'columns': columns,
+                'json_columns': list(json_columns)
+            })
+            yield sink.drain()
+
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield sink.drain()
+
+
+def raw_json(value):
+    """Embed stored JSON text as-is; the database only accepts valid JSON in these columns (create_json_checks)"""
+    if isinstance(value, str):
+        # Raw line breaks in valid JSON are whitespace; drop them to keep one record per line
+        return value.strip().replace('\r', ' ').replace('\n', ' ')
+    return json.dumps(value, default=str)
+
+
+def jsonl_line(table, columns, row, json_columns):
+    """One {"table": ..., "row": {...}} line with JSON columns spliced in without a decode/encode pass"""
+    plain = {column: row[column] for column in columns if column not in json_columns}
+    row_json = json.dumps(plain, default=str, ensure_ascii=False)
+    embedded = ''.join(
+        f', {json.dumps(column)}: {raw_json(row[column])}'
+        for column in columns if column in json_columns
+    )
+    if embedded and row_json != '{}':
+        row_json = row_json[:-1] + embedded + '}'
+    elif embedded:
+        row_json = '{' + embedded[2:] + '}'
+    return f'{{"table": {json.dumps(table)}, "row": {row_json}}}'
+
+
+def iter_jsonl_chunks(conn, hospital_id, tables=BACKUP_TABLES, batch_size=EXPORT_BATCH_SIZE, on_rows=None):
+    """Stream every backup table as JSON Lines, ending with a manifest line for completeness checks"""
+    counts = {}
+    for name, sql, json_columns in tables:
+        cursor = conn.execute(sql, (hospital_id,))
+        columns = [column[0] for column in cursor.description]
+        counts[name] = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            counts[name] += len(rows)
+            if on_rows:
+                on_rows(len(rows))
+            lines = [jsonl_line(name, columns, row, json_columns) for row in rows]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+        cursor.close()
+
+    manifest = {
+        'format': 'lifelink-backup',
+        'version': 1,
+        'hospital_id': hospital_id,
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'rows': counts
+    }
+    yield (json.dumps({'table': '_manifest', 'row': manifest}) + '\n').encode('utf-8')
+
+
+def resolve_export(data_type, export_format):
+    """Validate a data type / format pair and return its spec; raises ValueError"""
+    spec = EXPORT_SPECS.get(data_type)
+    if not spec:
+        raise ValueError('Invalid export type')
+    if export_format not in EXPORT_FORMATS or (export_format != 'csv' and data_type != 'all'):
+        raise ValueError('Invalid export format')
+    return spec
+
+
+def export_queries(data_type, export_format):
+    """SQL statements an export reads, used for progress totals"""
+    if export_format in ('zip', 'jsonl'):
+        return [sql for _, sql, _ in BACKUP_TABLES]
+    return list(EXPORT_SPECS[data_type]['queries'])
+
+
+def count_export_rows(conn, data_type, export_format, hospital_id):
+    return sum(
+        conn.execute(f'SELECT COUNT(*) FROM ({sql})', (hospital_id,)).fetchone()[0]
+        for sql in export_queries(data_type, export_format)
+    )
+
+
+def build_export_chunks(conn, data_type, export_format, hospital_id, on_rows=None):
+    """Pick the chunk generator for a validated data type / format pair"""
+    if export_format == 'zip':
+        chunks = iter_zip_chunks(conn, hospital_id, on_rows=on_rows)
+    elif export_format == 'jsonl':
+        chunks = iter_jsonl_chunks(conn, hospital_id, on_rows=on_rows)
+    else:
+        chunks = iter_csv_chunks(conn, EXPORT_SPECS[data_type], hospital_id, on_rows=on_rows)
+    return mark_export_failure(chunks, export_format)
+
+
+def export_failure_marker(export_format):
+    """Last line of a CSV/JSONL export that failed part way, or None for ZIP.
+
+    A ZIP cut short has no central directory, so readers reject it already.
+    """
+    if export_format == 'jsonl':
+        return (json.dumps({'table': '_error', 'row': {'error': EXPORT_FAILED_MESSAGE}}) + '\n').encode('utf-8')
+    if export_format == 'csv':
+        return f'{EXPORT_FAILED_MARKER},{EXPORT_FAILED_MESSAGE}\r\n'.encode('utf-8')
+    return None
+
+
+def mark_export_failure(chunks, export_format):
+    """Pass chunks through; on an error, end with export_failure_marker and re-raise.
+
+    Re-raising makes the WSGI server drop the connection without the final
+    chunk, so HTTP/1.1 clients see a failed download; the marker flags the file
+    for clients and proxies that cannot tell. Chunks always end on a row
+    boundary, so the marker starts a line of its own.
+    """
+    try:
+        yield from chunks
+    except Exception:
+        marker = export_failure_marker(export_format)
+        if marker:
+            yield marker
+        raise
+
+
+def export_download_info(data_type, export_format, compress, stamp):
+    """(filename, mimetype, compress) for an export; ZIP members are already deflated"""
+    extension, mimetype = EXPORT_FORMATS[export_format]
+    compress = compress and export_format != 'zip'
+    filename = f"{EXPORT_SPECS[data_type]['filename']}_{stamp}.{extension}"
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return filename, mimetype, compress
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a byte-chunk stream into a single gzip member on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    except Exception:
+        # Send what is buffered, failure marker included, before the stream is cut
+        yield compressor.flush(zlib.Z_SYNC_FLUSH)
+        raise
+    yield compressor.flush()
+
+
+def stream_export(connect, build_chunks, compress=False):
+    """Generator for a streaming export response.
+
+    ``build_chunks(conn)`` yields the encoded body. The connection is opened
+    lazily inside the generator and a single read transaction is held for the
+    whole export, so every query sees the same WAL snapshot even while other
+    workers keep writing.
+    """
+    conn = connect()
+    try:
+        conn.execute('BEGIN')
+        chunks = build_chunks(conn)
+        if compress:
+            chunks = gzip_chunks(chunks)
+        yield from chunks
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
@@ -0,0 +1,296 @@
+import http.client
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.parse
+
+from metrics import observe_outbound
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+# Keep-alive connections kept per host
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_MAX_RETRIES = 2
+HTTP_BACKOFF_BASE = 0.25
+HTTP_BACKOFF_CAP = 4.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HTTPStatusError(Exception):
+    """Raised by streaming calls whose final response is not 200"""
+
+    def __init__(self, status, body):
+        super().__init__(f'HTTP {status}: {body[:200]}')
+        self.status = status
+        self.body = body
+
+
+class _HostConnectionPool:
+    """LIFO pool of keep-alive http.client connections for one scheme/host/port"""
+
+    def __init__(self, scheme, host, port, size):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def get(self, timeout):
+        """Return (connection, reused)"""
+        try:
+            conn = self._idle.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        except queue.Empty:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return connection_class(self.host, self.port, timeout=timeout), False
+
+    def put(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+class PooledHTTPClient:
+    """Keep-alive HTTP client for outbound integrations.
+
+    Uses one shared requests.Session when available, else a small http.client
+    pool, so repeated calls to the same endpoint skip the TCP/TLS handshake.
+    Retryable statuses (429/5xx) and connection errors are retried with full
+    jitter backoff, honouring Retry-After when the server sends one.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, backoff_base=HTTP_BACKOFF_BASE, backoff_cap=HTTP_BACKOFF_CAP):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'retries': 0, 'errors': 0, 'new_connections': 0}
+        self._pools = {}
+        self._session = None
+        if REQUESTS_AVAILABLE:
+            self._session = requests.Session()
+            self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            self._session.mount('https://', self._adapter)
+            self._session.mount('http://', self._adapter)
+
+    def post_json(self, url, payload, timeout=10, retries=None, headers=None, deadline=None):
+        """POST a JSON payload; returns (status_code, body_text) of the final attempt.
+
+        ``deadline`` (seconds, optional) bounds all attempts and backoff together:
+        each attempt's timeout is cut to the time left, and no retry starts that
+        could not finish before it.
+        """
+        data, request_headers = self._prepare(payload, headers)
+        return self._request(url, lambda limit: self._send(url, data, request_headers, limit),
+                             retries, timeout, deadline)
+
+    def stream_lines(self, url, payload, timeout=10, retries=None, headers=None, deadline=None):
+        """POST a JSON payload and yield decoded response lines as they arrive.
+
+        Retries only cover getting a 200 response started, within ``deadline``
+        when given; ``timeout`` bounds the wait for each line. A non-200 final
+        status raises HTTPStatusError.
+        """
+        data, request_headers = self._prepare(payload, headers)
+        status, result = self._request(url, lambda limit: self._open_stream(url, data, request_headers, limit),
+                                       retries, timeout, deadline)
+        if status != 200:
+            raise HTTPStatusError(status, result)
+        yield from result
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        if self._session is not None:
+            counters['new_connections'] = self._urllib3_connections()
+        counters['reused_connections'] = max(counters['requests'] - counters['new_connections'], 0)
+        counters['pool_size'] = self.pool_size
+        return counters
+
+    def _prepare(self, payload, headers):
+        request_headers = {'Content-Type': 'application/json'}
+        if headers:
+            request_headers.update(headers)
+        return json.dumps(payload).encode('utf-8'), request_headers
+
+    def _request(self, url, send, retries, timeout, deadline=None):
+        """Call send(timeout) with retry/backoff; returns (status, result) of the final attempt"""
+        retries = self.max_retries if retries is None else retries
+        host = urllib.parse.urlsplit(url).hostname or ''
+        deadline_at = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        while True:
+            self._count('requests')
+            started = time.perf_counter()
+            limit = timeout if deadline_at is None else max(min(timeout, deadline_at - time.monotonic()), 0.001)
+            try:
+                status, result, retry_after = send(limit)
+            except (OSError, http.client.HTTPException):
+                observe_outbound(host, 'error', time.perf_counter() - started)
+                delay = self._backoff_delay(attempt, None)
+                if attempt >= retries or not self._fits(deadline_at, delay):
+                    self._count('errors')
+                    raise
+            else:
+                observe_outbound(host, str(status), time.perf_counter() - started)
+                delay = self._backoff_delay(attempt, retry_after)
+                if status not in RETRY_STATUSES or attempt >= retries or not self._fits(deadline_at, delay):
+                    if status >= 400:
+                        self._count('errors')
+                    return status, result
+            time.sleep(delay)
+            attempt += 1
+            self._count('retries')
+
+    @staticmethod
+    def _fits(deadline_at, delay):
+        """Whether a retry after delay still leaves time before the deadline for an attempt"""
+        return deadline_at is None or time.monotonic() + delay < deadline_at
+
+    def _send(self, url, data, headers, timeout):
+        """One attempt; returns (status, body, retry_after_header)"""
+        if self._session is not None:
+            try:
+                resp = self._session.post(url, data=data, headers=headers,
+                                          timeout=(min(self.connect_timeout, timeout), timeout))
+            except requests.RequestException as request_error:
+                raise OSError(str(request_error)) from request_error
+            return resp.status_code, resp.text, resp.headers.get('Retry-After')
+
+        conn, pool, resp = self._http_request(url, data, headers, timeout)
+        try:
+            body = resp.read().decode('utf-8', errors='ignore')
+        except Exception:
+            conn.close()
+            raise
+        self._checkin(conn, pool, resp)
+        return resp.status, body, resp.getheader('Retry-After')
+
+    def _open_stream(self, url, data, headers, timeout):
+        """One attempt; returns (status, line iterator or error body, retry_after_header)"""
+        if self._session is not None:
+            try:
+                resp = self._session.post(url, data=data, headers=headers, stream=True,
+                                          timeout=(min(self.connect_timeout, timeout), timeout))
+            except requests.RequestException as request_error:
+                raise OSError(str(request_error)) from request_error
+            if resp.status_code != 200:
+                with resp:
+                    return resp.status_code, resp.text, resp.headers.get('Retry-After')
+            return 200, self._iter_session_lines(resp), None
+
+        conn, pool, resp = self._http_request(url, data, headers, timeout)
+        if resp.status != 200:
+            body = resp.read().decode('utf-8', errors='ignore')
+            self._checkin(conn, pool, resp)
+            return resp.status, body, resp.getheader('Retry-After')
+        return 200, self._iter_http_lines(conn, pool, resp), None
+
+    def _iter_session_lines(self, resp):
+        try:
+            # chunk_size=None hands data over as it arrives instead of waiting for full blocks
+            for line in resp.iter_lines(chunk_size=None):
+                yield line.decode('utf-8', errors='ignore')
+        except requests.RequestException as request_error:
+            raise OSError(str(request_error)) from request_error
+        finally:
+            resp.close()
+
+    def _iter_http_lines(self, conn, pool, resp):
+        finished = False
+        try:
+            while True:
+                line = resp.readline()
+                if not line:
+                    finished = True
+                    break
+                yield line.decode('utf-8', errors='ignore').rstrip('\r\n')
+        finally:
+            if finished:
+                self._checkin(conn, pool, resp)
+            else:
+                conn.close()
+
+    def _http_request(self, url, data, headers, timeout):
+        """Send a POST on a pooled http.client connection; returns (conn, pool, response)"""
+        parsed = urllib.parse.urlsplit(url)
+        pool = self._host_pool(parsed)
+        conn, reused = pool.get(timeout)
+        if not reused:
+            self._count('new_connections')
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        try:
+            conn.request('POST', path, body=data, headers=headers)
+            return conn, pool, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def _checkin(self, conn, pool, resp):
+        if resp.will_close:
+            conn.close()
+        else:
+            pool.put(conn)
+
+    def _host_pool(self, parsed):
+        scheme = parsed.scheme or 'http'
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parsed.hostname, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _HostConnectionPool(scheme, parsed.hostname, port, self.pool_size)
+        return pool
+
+    def _urllib3_connections(self):
+        pools = self._adapter.poolmanager.pools
+        total = 0
+        for key in list(pools.keys()):
+            try:
+                total += pools[key].num_connections
+            except KeyError:
+                continue
+        return total
+
+    def _backoff_delay(self, attempt, retry_after):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_cap))
+            except ValueError:
+                pass
+        return delay
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._counters[key] += delta
+
+
+http_client = PooledHTTPClient()
+
+
+def post_json(url, payload, timeout=10, deadline=None):
+    """Send JSON POST through the shared keep-alive client."""
+    return http_client.post_json(url, payload, timeout=timeout, deadline=deadline)
+
+
+def stream_post_json(url, payload, timeout=10, deadline=None):
+    """Send JSON POST through the shared client and yield response lines as they arrive."""
+    return http_client.stream_lines(url, payload, timeout=timeout, deadline=deadline)
@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM slot frees up within the queue timeout"""
+
+
+class LLMTimeoutError(Exception):
+    """Raised when an LLM call misses its response deadline"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream the circuit breaker considers unhealthy"""
+
+
+class BoundedCallRunner:
+    """Run outbound LLM calls on a dedicated pool with a global concurrency cap.
+
+    A caller waits at most ``queue_timeout`` for a slot and ``deadline`` for the
+    answer, then gets an exception it can turn into a local fallback. A slot is
+    released only when the upstream call really finishes, so a hung endpoint
+    cannot pile up more than ``max_concurrency`` outstanding requests.
+    """
+
+    def __init__(self, max_concurrency=4, queue_timeout=0.05, deadline=8.0):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm-call')
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'rejected': 0, 'timed_out': 0, 'failed': 0, 'in_flight': 0}
+
+    def run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise LLMBusyError('All LLM slots are busy')
+
+        self._count('submitted')
+        self._count('in_flight')
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            self._count('timed_out')
+            raise LLMTimeoutError(f'LLM call exceeded {self.deadline}s')
+        except Exception:
+            self._count('failed')
+            raise
+
+    @contextmanager
+    def reserve(self):
+        """Hold a slot while the caller drives the call itself, e.g. while relaying a token stream"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise LLMBusyError('All LLM slots are busy')
+
+        self._count('submitted')
+        self._count('in_flight')
+        try:
+            yield
+        except Exception:
+            self._count('failed')
+            raise
+        finally:
+            self._release(None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, max_concurrency=self.max_concurrency)
+
+    def _release(self, _future):
+        self._count('in_flight', -1)
+        self._slots.release()
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._counters[key] += delta
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling window of call outcomes.
+
+    Closed: calls pass and outcomes are recorded. Once the window holds at least
+    ``min_calls`` outcomes and the error rate reaches ``failure_threshold`` the
+    breaker opens and every call fails fast with CircuitOpenError. After
+    ``cooldown`` seconds it goes half-open and lets ``half_open_probes`` calls
+    through; a success closes it, a failure re-opens it. Exceptions listed in
+    ``ignored`` (local back-pressure, not upstream faults) are not recorded.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window=50, min_calls=5, failure_threshold=0.5, cooldown=30.0,
+                 half_open_probes=1, ignored=()):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.ignored = tuple(ignored)
+        self._outcomes = deque(maxlen=window)
+        # Kept apart from outcomes so closing the breaker does not erase latency history
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._counters = {'calls': 0, 'successes': 0, 'failures': 0, 'short_circuited': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def call(self, fn, *args, **kwargs):
+        with self.protect():
+            return fn(*args, **kwargs)
+
+    @contextmanager
+    def protect(self):
+        """Guard a block that talks to the upstream; raises CircuitOpenError when it is unhealthy"""
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            yield
+        except self.ignored:
+            self._release(probe)
+            raise
+        except Exception:
+            self._record(False, time.monotonic() - started, probe)
+            raise
+        except BaseException:
+            # Generator closed early by a disconnected client: no verdict on the upstream
+            self._release(probe)
+            raise
+        self._record(True, time.monotonic() - started, probe)
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            outcomes = list(self._outcomes)
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+            opened_at = self._opened_at
+        failures = outcomes.count(False)
+        counters.update({
+            'state': state,
+            'window_calls': len(outcomes),
+            'error_rate': round(failures / len(outcomes), 3) if outcomes else 0.0,
+            'latency_ms': {
+                'p50': self._percentile(latencies, 50),
+                'p90': self._percentile(latencies, 90),
+                'p99': self._percentile(latencies, 99),
+            },
+            'retry_in_seconds': round(max(self.cooldown - (time.monotonic() - opened_at), 0), 1)
+            if state == self.OPEN else 0,
+        })
+        return counters
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _admit(self):
+        """Return whether the admitted call is a half-open probe; raise when the call must not run"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN or (state == self.HALF_OPEN and self._probes >= self.half_open_probes):
+                self._counters['short_circuited'] += 1
+                raise CircuitOpenError('Upstream circuit is open')
+            self._counters['calls'] += 1
+            if state == self.HALF_OPEN:
+                self._probes += 1
+                return True
+            return False
+
+    def _release(self, probe):
+        if probe:
+            with self._lock:
+                self._probes = max(self._probes - 1, 0)
+
+    def _record(self, ok, latency, probe):
+        with self._lock:
+            self._counters['successes' if ok else 'failures'] += 1
+            self._outcomes.append(ok)
+            self._latencies.append(latency)
+            if probe:
+                self._probes = max(self._probes - 1, 0)
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            if self._state != self.CLOSED or len(self._outcomes) < self.min_calls:
+                return
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._counters['opened'] += 1
+
+    @staticmethod
+    def _percentile(sorted_values, percent):
+        if not sorted_values:
+            return None
+        index = min(int(round(percent / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+        return round(sorted_values[index] * 1000, 1)
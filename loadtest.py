@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from database import get_db
+from synthetic import SyntheticNetwork, seed_network
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOADTEST_PASSWORD = 'loadtest123'
+# Relative weights of each action in the traffic mix
+TRAFFIC_MIX = {
+    'dashboard': 12,
+    'my_patients': 8,
+    'all_donors': 6,
+    'matches': 3,
+    'match_detail': 8,
+    'notifications_poll': 35,
+    'search': 8,
+    'patient_detail': 8,
+    'add_patient': 3,
+    'add_donor': 3,
+    'edit_patient': 3,
+    'chat': 3
+}
+CHAT_QUESTIONS = [
+    'How many kidney patients are waiting?',
+    'Show O+ liver donors in Mumbai',
+    'Critical heart patients above 85 urgency',
+    'Summarize the network situation for our hospital',
+    'What should our transplant team focus on this week?',
+    'Which of our patients need attention first and why?'
+]
+SERVER_START_TIMEOUT = 30
+# Plain columns the add/edit forms post; organ metrics are flattened separately
+FORM_FIELDS = {'name', 'dob', 'gender', 'blood_group', 'contact', 'location', 'weight_kg', 'height_cm',
+               'organ_type', 'organ_needed', 'urgency_score', 'doctor_assigned', 'death_date'}
+
+
+# ====================
+# GEMINI STUB
+# ====================
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    """Answers generateContent / streamGenerateContent like Gemini, after a configurable delay"""
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.3
+    answer = 'Stub REM answer: prioritise critical patients and review high-scoring matches.'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        time.sleep(self.latency)
+        if 'streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for word in self.answer.split(' '):
+                event = json.dumps({'candidates': [{'content': {'parts': [{'text': word + ' '}]}}]})
+                self._chunk(f'data: {event}\r\n\r\n'.encode())
+            self._chunk(b'')
+            return
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': self.answer}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+    def log_message(self, *args):
+        pass
+
+
+def start_gemini_stub(latency):
+    GeminiStubHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GeminiStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+# ====================
+# SEEDING
+# ====================
+
+def seed_database(db_path, hospitals, donors, patients, seed):
+    """Fresh database with generated hospitals, donors and patients; returns what the virtual users need"""
+    result = seed_network(db_path, hospitals, donors, patients, seed, password=LOADTEST_PASSWORD)
+    conn = get_db(db_path)
+    hospital_ids = list(result['hospitals'])
+    placeholders = ', '.join('?' for _ in hospital_ids)
+    world = {
+        # New records posted during the run come from a differently seeded stream
+        'network': SyntheticNetwork(seed + 1),
+        'hospitals': result['hospitals'],
+        'donors': [dict(row) for row in conn.execute(
+            f'SELECT * FROM donors WHERE hospital_id IN ({placeholders})', hospital_ids)],
+        'patients': [dict(row) for row in conn.execute(
+            f'SELECT * FROM patients WHERE hospital_id IN ({placeholders})', hospital_ids)]
+    }
+    conn.close()
+    return world
+
+def entity_form(row):
+    """Flatten a synthetic row into the add/edit form fields the routes read"""
+    form = {key: value for key, value in row.items()
+            if key in FORM_FIELDS and value is not None}
+    for key, value in json.loads(row['organ_metrics']).items():
+        if key == 'hla_typing':
+            for marker, alleles in value.items():
+                form[f'{marker}1'], form[f'{marker}2'] = alleles
+        else:
+            form[key] = value
+    form['medical_history'] = json.loads(row['medical_history'])
+    return form
+
+
+# ====================
+# SERVER
+# ====================
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def start_app(db_path, gemini_base, workers, threads, server):
+    """Launch the app in a subprocess against the seeded database; returns (process, base_url)"""
+    port = free_port()
+    env = dict(os.environ, LIFELINK_DB_PATH=db_path, GEMINI_API_BASE=gemini_base, PORT=str(port))
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    else:
+        command = [sys.executable, 'app.py']
+    # Server output goes to a file next to the database; an undrained pipe could stall the app
+    log_path = os.path.join(os.path.dirname(db_path), 'server.log')
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as log:
+                raise RuntimeError(f'App exited during startup:\n{log.read()}')
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('App did not start in time')
+
+
+# ====================
+# TRAFFIC
+# ====================
+
+class VirtualUser:
+    """One logged-in coordinator issuing the weighted traffic mix until the deadline"""
+
+    def __init__(self, base_url, hospital_id, username, world, seed, think_time):
+        self.base_url = base_url
+        self.hospital_id = hospital_id
+        self.username = username
+        self.world = world
+        self.random = random.Random(seed)
+        self.think_time = think_time
+        self.session = requests.Session()
+        self.notification_etag = None
+        self.own_patients = [row for row in world['patients'] if row['hospital_id'] == hospital_id]
+        self.actions = list(TRAFFIC_MIX)
+        self.weights = list(TRAFFIC_MIX.values())
+
+    def run(self, deadline, results):
+        response = self.session.post(f'{self.base_url}/login', allow_redirects=False, timeout=30,
+                                     data={'username': self.username, 'password': LOADTEST_PASSWORD})
+        if response.status_code != 302:
+            results.append(('login', 0.0, response.status_code))
+            return
+        while time.time() < deadline:
+            action = self.random.choices(self.actions, self.weights)[0]
+            method, path, options = getattr(self, action)()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                                timeout=60, **options)
+                response.content
+                status = response.status_code
+                if action == 'notifications_poll' and status == 200:
+                    self.notification_etag = response.headers.get('ETag')
+            except requests.RequestException:
+                status = 'error'
+            results.append((action, time.perf_counter() - started, status))
+            if self.think_time:
+                time.sleep(self.random.uniform(0, 2 * self.think_time))
+
+    def pick(self, rows):
+        return self.random.choice(rows)
+
+    def dashboard(self):
+        return 'GET', '/dashboard', {}
+
+    def my_patients(self):
+        return 'GET', '/my-patients', {}
+
+    def all_donors(self):
+        return 'GET', '/all-donors', {}
+
+    def matches(self):
+        return 'GET', '/matches', {}
+
+    def match_detail(self):
+        patient, donor = self.pick(self.world['patients']), self.pick(self.world['donors'])
+        return 'GET', f"/match/{patient['patient_id']}/{donor['donor_id']}", {}
+
+    def notifications_poll(self):
+        headers = {'If-None-Match': self.notification_etag} if self.notification_etag else {}
+        return 'GET', '/api/notifications', {'headers': headers}
+
+    def search(self):
+        rows = self.world['patients'] if self.random.random() < 0.5 else self.world['donors']
+        row = self.pick(rows)
+        return 'GET', '/search', {'params': {'q': row.get('patient_id') or row.get('donor_id')}}
+
+    def patient_detail(self):
+        return 'GET', f"/patient/{self.pick(self.world['patients'])['patient_id']}", {}
+
+    def add_patient(self):
+        return 'POST', '/add-patient', {'data': entity_form(self.world['network'].patient(0, self.hospital_id))}
+
+    def add_donor(self):
+        return 'POST', '/add-donor', {'data': entity_form(self.world['network'].donor(0, self.hospital_id))}
+
+    def edit_patient(self):
+        if not self.own_patients:
+            return self.my_patients()
+        row = dict(self.pick(self.own_patients), urgency_score=self.random.randint(1, 100))
+        return 'POST', f"/edit-patient/{row['patient_id']}", {'data': entity_form(row)}
+
+    def chat(self):
+        return 'POST', '/api/chat', {'json': {'message': self.random.choice(CHAT_QUESTIONS)}}
+
+
+def run_load(base_url, world, users, duration, think_time, seed):
+    hospitals = list(world['hospitals'].items())
+    results = []
+    deadline = time.time() + duration
+    workers = []
+    for index in range(users):
+        hospital_id, username = hospitals[index % len(hospitals)]
+        user = VirtualUser(base_url, hospital_id, username, world, seed + index, think_time)
+        worker = threading.Thread(target=user.run, args=(deadline, results), daemon=True)
+        workers.append(worker)
+        worker.start()
+    started = time.time()
+    for worker in workers:
+        worker.join()
+    return results, time.time() - started
+
+
+# ====================
+# REPORT
+# ====================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def summarize(results, elapsed):
+    """{action: {requests, errors, rps, p50_ms, p95_ms, p99_ms, max_ms}} plus an 'all' row"""
+    by_action = {}
+    for action, seconds, status in results:
+        by_action.setdefault(action, []).append((seconds, status))
+    by_action['all'] = [(seconds, status) for _, seconds, status in results]
+    summary = {}
+    for action, samples in by_action.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in samples)
+        errors = sum(1 for _, status in samples if status == 'error' or status >= 400)
+        summary[action] = {
+            'requests': len(samples),
+            'errors': errors,
+            'rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'max_ms': round(latencies[-1], 1) if latencies else 0
+        }
+    return summary
+
+def print_summary(summary, elapsed):
+    print(f'\n{"route":<20} {"reqs":>7} {"errors":>7} {"rps":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+    for action, row in sorted(summary.items(), key=lambda item: (item[0] == 'all', item[0])):
+        print(f'{action:<20} {row["requests"]:>7} {row["errors"]:>7} {row["rps"]:>8} {row["p50_ms"]:>9} '
+              f'{row["p95_ms"]:>9} {row["p99_ms"]:>9} {row["max_ms"]:>9}')
+    print(f'\n{elapsed:.1f}s elapsed')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Seed a temporary LifeLink database, start the app and drive a realistic traffic mix')
+    parser.add_argument('--hospitals', type=int, default=20)
+    parser.add_argument('--donors', type=int, default=300)
+    parser.add_argument('--patients', type=int, default=600)
+    parser.add_argument('--users', type=int, default=16, help='concurrent logged-in coordinators')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of traffic')
+    parser.add_argument('--think-time', type=float, default=0.1, help='mean pause between a user\'s requests')
+    parser.add_argument('--server', choices=('gunicorn', 'flask'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--gemini-latency', type=float, default=0.3, help='seconds the Gemini stub takes to answer')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write the summary JSON here')
+    parser.add_argument('--keep-db', action='store_true', help='leave the temporary database in place')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='lifelink-loadtest-')
+    db_path = os.path.join(workdir, 'lifelink.db')
+    stub, gemini_base = start_gemini_stub(args.gemini_latency)
+    process = None
+    try:
+        print(f'Seeding {args.hospitals} hospitals, {args.donors} donors, {args.patients} patients', file=sys.stderr)
+        world = seed_database(db_path, args.hospitals, args.donors, args.patients, args.seed)
+        process, base_url = start_app(db_path, gemini_base, args.workers, args.threads, args.server)
+        print(f'Driving {args.users} users against {base_url} for {args.duration:.0f}s', file=sys.stderr)
+        results, elapsed = run_load(base_url, world, args.users, args.duration, args.think_time, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        stub.shutdown()
+        if args.keep_db:
+            print(f'Database kept at {db_path}', file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(results, elapsed)
+    print_summary(summary, elapsed)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump({'args': vars(args), 'elapsed_seconds': round(elapsed, 2), 'routes': summary}, handle, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from slowlog import slow_query_log
+
+# Default latency buckets in seconds (Prometheus convention)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+# SQLite calls the progress handler every this many VM instructions
+SQLITE_PROGRESS_OPS = 1000
+# The progress handler calls into Python (and takes a lock) during every query, so VM step
+# counting is for diagnosis only: set LIFELINK_SQLITE_VM_STEPS=1 to enable it
+COUNT_SQLITE_VM_STEPS = os.environ.get('LIFELINK_SQLITE_VM_STEPS') == '1'
+
+
+# ====================
+# METRIC TYPES
+# ====================
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        # Unlabelled counters are exported from the start so rate() has a baseline
+        self._values = {} if self.labels else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect plus a few additions under a lock"""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labels + ('le',), label_values + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total:.9g}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """collect() returns [(name, type, help, [(labels_dict, value), ...]), ...] at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, metric_type, help_text, samples in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(tuple(labels), tuple(labels.values()))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    'lifelink_http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+request_db_queries = registry.histogram(
+    'lifelink_request_db_queries', 'SQL statements run per request', ('route',), buckets=COUNT_BUCKETS)
+request_db_seconds = registry.histogram(
+    'lifelink_request_db_seconds', 'Time spent executing SQL per request', ('route',))
+db_query_seconds = registry.histogram(
+    'lifelink_db_query_duration_seconds', 'SQL execute() latency by statement kind', ('statement',))
+sqlite_vm_steps = registry.counter(
+    'lifelink_sqlite_vm_steps_total',
+    f'SQLite VM instructions, in units of {SQLITE_PROGRESS_OPS} (only with LIFELINK_SQLITE_VM_STEPS=1)')
+template_render_seconds = registry.histogram(
+    'lifelink_template_render_seconds', 'Jinja render time by template', ('template',))
+match_batch_seconds = registry.histogram(
+    'lifelink_match_batch_seconds', 'Time to score one batch of patient/donor pairs', ('batch',))
+match_pairs_scored = registry.counter(
+    'lifelink_match_pairs_scored_total', 'Patient/donor pairs passed to calculate_match_score', ('batch',))
+outbound_request_seconds = registry.histogram(
+    'lifelink_outbound_request_duration_seconds', 'Outbound HTTP attempt latency', ('host', 'status'))
+
+
+# ====================
+# REQUEST SCOPE
+# ====================
+
+class RequestStats:
+    """SQL totals for the request currently being served on this thread/context"""
+
+    __slots__ = ('queries', 'db_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar('lifelink_request_stats', default=None)
+
+def begin_request():
+    return _request_stats.set(RequestStats())
+
+def end_request(token):
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    return stats
+
+
+# ====================
+# SQLITE INSTRUMENTATION
+# ====================
+
+def _trace_statement(_statement):
+    stats = _request_stats.get()
+    if stats is not None and not slow_query_log.explaining:
+        stats.queries += 1
+
+def _progress_tick():
+    sqlite_vm_steps.inc()
+    return 0
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that times execute()/executemany() and counts statements.
+
+    The trace callback sees every statement (including cursor and script
+    execution) for the per-request query count. Timings cover execute(),
+    where SQLite does the searching and sorting for the first row. Statements
+    over SLOW_QUERY_MS go to the slow-query log with their query plan. The
+    opt-in progress handler (COUNT_SQLITE_VM_STEPS) also counts VM work,
+    including rows stepped during fetch.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_trace_statement)
+        if COUNT_SQLITE_VM_STEPS:
+            self.set_progress_handler(_progress_tick, SQLITE_PROGRESS_OPS)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._observe(sql, None, time.perf_counter() - started)
+
+    def _observe(self, sql, parameters, elapsed):
+        db_query_seconds.observe(elapsed, statement_kind(sql))
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_seconds += elapsed
+        slow_query_log.observe(sql, parameters, elapsed, self._explain)
+
+    def _explain(self, sql, parameters):
+        return super().execute(sql, parameters).fetchall()
+
+
+def statement_kind(sql):
+    """First keyword of a statement (SELECT, INSERT, ...) for low-cardinality labels"""
+    stripped = sql.lstrip()
+    end = 0
+    while end < len(stripped) and stripped[end].isalpha():
+        end += 1
+    return stripped[:end].upper() or 'OTHER'
+
+
+# ====================
+# TIMERS
+# ====================
+
+def observe_match_batch(batch, pairs, seconds):
+    match_batch_seconds.observe(seconds, batch)
+    match_pairs_scored.inc(batch, amount=pairs)
+
+def observe_outbound(host, status, seconds):
+    outbound_request_seconds.observe(seconds, host, status)
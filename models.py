@@ -1,11 +1,19 @@
 import sqlite3
 import json
 import os
+import heapq
+import time
 from datetime import datetime
+from functools import lru_cache
 from math import radians, cos, sin, asin, sqrt
 
+from cache import VersionedLRUCache, SingleFlight, MISSING, request_memo
+from metrics import InstrumentedConnection, observe_match_batch
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(os.path.dirname(BASE_DIR), 'lifelink.db')
+DB_PATH = os.environ.get('LIFELINK_DB_PATH', os.path.join(os.path.dirname(BASE_DIR), 'lifelink.db'))
+ENTITY_CACHE_SIZE = int(os.environ.get('ENTITY_CACHE_SIZE', 4096))
+JSON_PARSE_CACHE_SIZE = int(os.environ.get('JSON_PARSE_CACHE_SIZE', 8192))
 
 # Approximate coordinates for major Indian cities (lat, lon)
 CITY_COORDINATES = {
@@ -26,9 +34,9 @@ CITY_COORDINATES = {
 }
 
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=10.0)
-    conn.row_factory = sqlite3.Row
+def get_db(row_factory=sqlite3.Row):
+    conn = sqlite3.connect(DB_PATH, timeout=10.0, factory=InstrumentedConnection)
+    conn.row_factory = row_factory
     conn.execute('PRAGMA journal_mode=WAL')
     conn.execute('PRAGMA foreign_keys=ON')
     return conn
@@ -62,10 +70,110 @@ def calculate_bmi(weight_kg, height_cm):
     except (TypeError, ZeroDivisionError):
         return 0
 
+# ====================
+# DATA VERSIONS
+# ====================
+
+NETWORK_SCOPE = 'network'
+
+def entity_scopes(entity_type, entity_id, hospital_id):
+    """Scopes touched by a write to a single donor/patient"""
+    return (NETWORK_SCOPE, f'hospital:{hospital_id}', f'{entity_type}:{entity_id}')
+
+def bump_data_version(conn, *scopes):
+    """Advance change counters for scopes (runs inside the caller's transaction)"""
+    for scope in scopes:
+        conn.execute('''
+            INSERT INTO data_versions (scope, version, updated_at)
+            VALUES (?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        ''', (scope,))
+    forget_scopes(scopes)
+
+def get_data_versions(scopes, conn=None):
+    """Get {scope: (version, updated_at)} for scopes; unseen scopes are version 0.
+
+    Versions read earlier in the same request are reused from the request memo.
+    """
+    memo = request_memo()
+    versions = {}
+    pending = []
+    for scope in scopes:
+        known = memo.get(('version', scope)) if memo is not None else None
+        if known is None:
+            pending.append(scope)
+        else:
+            versions[scope] = known
+    if not pending:
+        return versions
+    own_conn = conn is None
+    conn = conn or get_db()
+    placeholders = ', '.join('?' for _ in pending)
+    rows = conn.execute(f'''
+        SELECT scope, version, updated_at FROM data_versions WHERE scope IN ({placeholders})
+    ''', pending).fetchall()
+    if own_conn:
+        conn.close()
+    fetched = {scope: (0, None) for scope in pending}
+    for row in rows:
+        fetched[row['scope']] = (row['version'], row['updated_at'])
+    if memo is not None:
+        memo.update((('version', scope), value) for scope, value in fetched.items())
+    versions.update(fetched)
+    return versions
+
+# ====================
+# ENTITY CACHE
+# ====================
+
+# Single donor/patient rows (with their hospital columns), tagged with the entity's version
+entity_cache = VersionedLRUCache(max_entries=ENTITY_CACHE_SIZE)
+
+def get_cached_entity(entity_type, entity_id, query):
+    """Row for one donor/patient via the request memo, then the entity cache, then SQLite.
+
+    The entity's data version is read on the same connection as a miss, or taken
+    from the request memo when the view already fetched it for its ETag.
+    """
+    memo = request_memo()
+    key = (entity_type, entity_id)
+    if memo is not None and key in memo:
+        return memo[key]
+    scope = f'{entity_type}:{entity_id}'
+    conn = None
+    if memo is None or ('version', scope) not in memo:
+        conn = get_db()
+    version = get_data_versions([scope], conn)[scope][0]
+    entity = entity_cache.get(key, version)
+    if entity is MISSING:
+        conn = conn or get_db()
+        entity = conn.execute(query, (entity_id,)).fetchone()
+        entity_cache.set(key, version, entity)
+    if conn is not None:
+        conn.close()
+    if memo is not None:
+        memo[key] = entity
+    return entity
+
+def forget_scopes(scopes):
+    """Drop memoized versions/entities and cached rows for scopes that were just written"""
+    memo = request_memo()
+    for scope in scopes:
+        entity_type, _, entity_id = scope.partition(':')
+        if entity_type in ('donor', 'patient'):
+            entity_cache.invalidate((entity_type, entity_id))
+        if memo is not None:
+            memo.pop(('version', scope), None)
+            memo.pop((entity_type, entity_id), None)
+
 # ====================
 # DONOR FUNCTIONS
 # ====================
 
+# Donors pledged to the kidney paired exchange (paired or altruistic) are allocated
+# by exchange.py only, so /matches and match notifications never offer them
+OPEN_DONOR_FILTER = 'paired_patient_id IS NULL AND altruistic = 0'
+
 def add_donor(data, hospital_id):
     """Add new donor to database"""
     conn = get_db()
@@ -77,15 +185,17 @@ def add_donor(data, hospital_id):
     conn.execute('''
         INSERT INTO donors (donor_id, name, dob, gender, blood_group, contact, location,
                           weight_kg, height_cm, organ_type, organ_metrics, medical_history,
-                          death_date, hospital_id, doctor_assigned)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                          death_date, paired_patient_id, altruistic, hospital_id, doctor_assigned)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (donor_id, data['name'], data['dob'], data['gender'], data['blood_group'],
           data['contact'], data['location'], data['weight_kg'], data['height_cm'],
           data['organ_type'], organ_metrics, medical_history, data.get('death_date'),
-          hospital_id, data['doctor_assigned']))
+          data.get('paired_patient_id'), data.get('altruistic', 0), hospital_id, data['doctor_assigned']))
+    bump_data_version(conn, *entity_scopes('donor', donor_id, hospital_id))
     
     conn.commit()
     conn.close()
+    record_match_notifications('donor', donor_id)
     return donor_id
 
 def get_all_donors():
@@ -116,15 +226,12 @@ def get_donors_by_hospital(hospital_id):
 
 def get_donor_by_id(donor_id):
     """Get single donor details"""
-    conn = get_db()
-    donor = conn.execute('''
+    return get_cached_entity('donor', donor_id, '''
         SELECT d.*, h.hospital_name, h.location_city, h.contact_phone
         FROM donors d
         JOIN hospitals h ON d.hospital_id = h.id
         WHERE d.donor_id = ?
-    ''', (donor_id,)).fetchone()
-    conn.close()
-    return donor
+    ''')
 
 def update_donor(donor_id, data, hospital_id):
     """Update existing donor"""
@@ -136,16 +243,18 @@ def update_donor(donor_id, data, hospital_id):
         UPDATE donors 
         SET name = ?, dob = ?, gender = ?, blood_group = ?, contact = ?, location = ?,
             weight_kg = ?, height_cm = ?, organ_type = ?, organ_metrics = ?, 
-            medical_history = ?, death_date = ?, doctor_assigned = ?
+            medical_history = ?, death_date = ?, paired_patient_id = ?, altruistic = ?, doctor_assigned = ?
         WHERE donor_id = ? AND hospital_id = ?
     ''', (data['name'], data['dob'], data['gender'], data['blood_group'], 
           data['contact'], data['location'], data['weight_kg'], data['height_cm'],
           data['organ_type'], organ_metrics, medical_history, data.get('death_date'),
-          data['doctor_assigned'],
+          data.get('paired_patient_id'), data.get('altruistic', 0), data['doctor_assigned'],
           donor_id, hospital_id))
+    bump_data_version(conn, *entity_scopes('donor', donor_id, hospital_id))
     
     conn.commit()
     conn.close()
+    record_match_notifications('donor', donor_id)
     return donor_id
 
 def delete_donor(donor_id, hospital_id, status='inactive'):
@@ -154,6 +263,7 @@ def delete_donor(donor_id, hospital_id, status='inactive'):
     conn.execute('''
         UPDATE donors SET status = ? WHERE donor_id = ? AND hospital_id = ?
     ''', (status, donor_id, hospital_id))
+    bump_data_version(conn, *entity_scopes('donor', donor_id, hospital_id))
     conn.commit()
     conn.close()
     return True
@@ -179,9 +289,12 @@ def add_patient(data, hospital_id):
           data['contact'], data['location'], data['weight_kg'], data['height_cm'],
           data['organ_needed'], organ_metrics, medical_history, data['urgency_score'],
           hospital_id, data['doctor_assigned']))
+    bump_data_version(conn, *entity_scopes('patient', patient_id, hospital_id))
+    record_critical_notification(conn, patient_id)
     
     conn.commit()
     conn.close()
+    record_match_notifications('patient', patient_id)
     return patient_id
 
 def get_all_patients():
@@ -192,7 +305,7 @@ def get_all_patients():
         FROM patients p
         JOIN hospitals h ON p.hospital_id = h.id
         WHERE p.status = 'active'
-        ORDER BY p.urgency_score DESC, p.created_at DESC
+        ORDER BY p.urgency_score DESC, p.created_at ASC
     ''').fetchall()
     conn.close()
     return patients
@@ -205,22 +318,19 @@ def get_patients_by_hospital(hospital_id):
         FROM patients p
         JOIN hospitals h ON p.hospital_id = h.id
         WHERE p.hospital_id = ? AND p.status = 'active'
-        ORDER BY p.urgency_score DESC, p.created_at DESC
+        ORDER BY p.urgency_score DESC, p.created_at ASC
     ''', (hospital_id,)).fetchall()
     conn.close()
     return patients
 
 def get_patient_by_id(patient_id):
     """Get single patient details"""
-    conn = get_db()
-    patient = conn.execute('''
+    return get_cached_entity('patient', patient_id, '''
         SELECT p.*, h.hospital_name, h.location_city, h.contact_phone
         FROM patients p
         JOIN hospitals h ON p.hospital_id = h.id
         WHERE p.patient_id = ?
-    ''', (patient_id,)).fetchone()
-    conn.close()
-    return patient
+    ''')
 
 def update_patient(patient_id, data, hospital_id):
     """Update existing patient"""
@@ -238,9 +348,12 @@ def update_patient(patient_id, data, hospital_id):
           data['contact'], data['location'], data['weight_kg'], data['height_cm'],
           data['organ_needed'], organ_metrics, medical_history, data['urgency_score'],
           data['doctor_assigned'], patient_id, hospital_id))
+    bump_data_version(conn, *entity_scopes('patient', patient_id, hospital_id))
+    record_critical_notification(conn, patient_id)
     
     conn.commit()
     conn.close()
+    record_match_notifications('patient', patient_id)
     return patient_id
 
 def delete_patient(patient_id, hospital_id, status='inactive'):
@@ -249,6 +362,7 @@ def delete_patient(patient_id, hospital_id, status='inactive'):
     conn.execute('''
         UPDATE patients SET status = ? WHERE patient_id = ? AND hospital_id = ?
     ''', (status, patient_id, hospital_id))
+    bump_data_version(conn, *entity_scopes('patient', patient_id, hospital_id))
     conn.commit()
     conn.close()
     return True
@@ -266,6 +380,281 @@ def log_audit(hospital_id, action_type, entity_type, entity_id, changes=None, us
     conn.commit()
     conn.close()
 
+# ====================
+# WAITLIST
+# ====================
+
+# The waitlist is the partial indexes idx_patients_waitlist (organ, blood group)
+# and idx_patients_hospital_urgency, both ordered by urgency. SQLite keeps them
+# in step with every write, so an urgency change moves one entry in O(log n)
+# and every worker sees it; reading the head of a list is an index walk, not a sort.
+WAITLIST_COLUMNS = 'patient_id, name, organ_needed, blood_group, location, urgency_score, hospital_id, created_at'
+# Most urgent first, then longest waiting; the waitlist indexes use the same order
+WAITLIST_ORDER = 'urgency_score DESC, created_at ASC'
+
+def waitlist_key(row):
+    """Most urgent first, then longest waiting (matches the index order)"""
+    return -(row['urgency_score'] or 0), row['created_at']
+
+def next_recipients(organ, donor_blood, limit=10, conn=None):
+    """Most urgent active patients who could receive this organ from a donor of this blood group"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    # One index walk per compatible group, merged; an IN list would force a sort of every match
+    queues = [conn.execute(f'''
+        SELECT {WAITLIST_COLUMNS} FROM patients
+        WHERE organ_needed = ? AND blood_group = ? AND status = 'active'
+        ORDER BY {WAITLIST_ORDER}
+        LIMIT ?
+    ''', (organ, blood_group, limit)).fetchall() for blood_group in RECIPIENT_BLOOD_GROUPS.get(donor_blood, ())]
+    if own_conn:
+        conn.close()
+    return list(heapq.merge(*queues, key=waitlist_key))[:limit]
+
+def most_urgent_patients(hospital_id, limit=5, min_urgency=0, conn=None):
+    """Head of a hospital's waitlist, most urgent first"""
+    own_conn = conn is None
+    conn = conn or get_db()
+    rows = conn.execute(f'''
+        SELECT {WAITLIST_COLUMNS} FROM patients
+        WHERE hospital_id = ? AND status = 'active' AND urgency_score >= ?
+        ORDER BY {WAITLIST_ORDER}
+        LIMIT ?
+    ''', (hospital_id, min_urgency, limit)).fetchall()
+    if own_conn:
+        conn.close()
+    return rows
+
+# ====================
+# NOTIFICATIONS
+# ====================
+
+HIGH_MATCH_THRESHOLD = 80
+CRITICAL_URGENCY_THRESHOLD = 80
+
+def insert_notification(conn, hospital_id, kind, ref_key, title, link):
+    """Append a notification for one hospital; repeats of the same ref_key are ignored"""
+    cursor = conn.execute('''
+        INSERT OR IGNORE INTO notifications (hospital_id, kind, ref_key, title, link)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (hospital_id, kind, ref_key, title, link))
+    if cursor.rowcount:
+        bump_data_version(conn, f'notifications:{hospital_id}')
+
+def match_notification_candidates(conn, entity_type, entity_id):
+    """(patient, donor) pairs for a donor/patient and the blood-compatible side of the opposite pool.
+
+    Incompatible blood groups always score 0, so only compatible groups are
+    read, each through the (organ, blood group) waitlist/open-donor indexes.
+    """
+    if entity_type == 'patient':
+        patient = conn.execute(
+            "SELECT * FROM patients WHERE patient_id = ? AND status = 'active'", (entity_id,)
+        ).fetchone()
+        if not patient:
+            return []
+        groups = BLOOD_COMPATIBILITY.get(patient['blood_group'], ())
+        donors = conn.execute(f'''
+            SELECT * FROM donors
+            WHERE organ_type = ? AND blood_group IN ({', '.join('?' for _ in groups)})
+              AND status = 'active' AND {OPEN_DONOR_FILTER}
+        ''', (patient['organ_needed'], *groups)).fetchall()
+        return [(patient, donor) for donor in donors]
+    donor = conn.execute(
+        f"SELECT * FROM donors WHERE donor_id = ? AND status = 'active' AND {OPEN_DONOR_FILTER}", (entity_id,)
+    ).fetchone()
+    if not donor:
+        return []
+    groups = RECIPIENT_BLOOD_GROUPS.get(donor['blood_group'], ())
+    patients = conn.execute(f'''
+        SELECT * FROM patients
+        WHERE organ_needed = ? AND blood_group IN ({', '.join('?' for _ in groups)}) AND status = 'active'
+    ''', (donor['organ_type'], *groups)).fetchall()
+    return [(patient, donor) for patient in patients]
+
+def record_match_notifications(entity_type, entity_id):
+    """Notify both hospitals about strong matches for a donor/patient whose write has committed.
+
+    Candidates are read and scored outside any write transaction; only the
+    INSERT OR IGNOREs for strong matches take the write lock, briefly.
+    """
+    conn = get_db()
+    try:
+        pairs = match_notification_candidates(conn, entity_type, entity_id)
+        started = time.perf_counter()
+        scored = [(patient, donor, calculate_match_score(patient, donor)[0]) for patient, donor in pairs]
+        observe_match_batch('notifications', len(pairs), time.perf_counter() - started)
+        strong = [(patient, donor, score) for patient, donor, score in scored if score >= HIGH_MATCH_THRESHOLD]
+        if not strong:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        for patient, donor, score in strong:
+            for hospital_id in {patient['hospital_id'], donor['hospital_id']}:
+                insert_notification(
+                    conn, hospital_id, 'match',
+                    f"match-{patient['patient_id']}-{donor['donor_id']}",
+                    f"High match found: {patient['name']} ← {donor['name']} ({score}%)",
+                    f"/match/{patient['patient_id']}/{donor['donor_id']}"
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+def record_critical_notification(conn, patient_id):
+    """Alert every other hospital in the network when a patient becomes critical"""
+    patient = conn.execute(
+        'SELECT patient_id, name, urgency_score, hospital_id, status FROM patients WHERE patient_id = ?',
+        (patient_id,)
+    ).fetchone()
+    if not patient or patient['status'] != 'active' or patient['urgency_score'] < CRITICAL_URGENCY_THRESHOLD:
+        return
+    
+    hospitals = conn.execute('SELECT id FROM hospitals WHERE id != ?', (patient['hospital_id'],)).fetchall()
+    for hospital in hospitals:
+        insert_notification(
+            conn, hospital['id'], 'critical', f"critical-{patient['patient_id']}",
+            f"Critical patient added: {patient['name']} (Urgency: {patient['urgency_score']}%)",
+            f"/patient/{patient['patient_id']}"
+        )
+
+def get_notifications_since(hospital_id, since=None, limit=50):
+    """Get notifications after a cursor (oldest first), or the latest ones when no cursor is given"""
+    conn = get_db()
+    if since is None:
+        rows = conn.execute('''
+            SELECT * FROM notifications
+            WHERE hospital_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (hospital_id, limit)).fetchall()
+        rows = list(reversed(rows))
+    else:
+        rows = conn.execute('''
+            SELECT * FROM notifications
+            WHERE hospital_id = ? AND id > ?
+            ORDER BY id ASC
+            LIMIT ?
+        ''', (hospital_id, since, limit)).fetchall()
+    unread = conn.execute(
+        'SELECT COUNT(*) as count FROM notifications WHERE hospital_id = ? AND read_at IS NULL',
+        (hospital_id,)
+    ).fetchone()['count']
+    conn.close()
+    return rows, unread
+
+def mark_notifications_read(hospital_id, notification_ids=None):
+    """Mark specific notifications (or all of them) as read; returns rows changed"""
+    conn = get_db()
+    if notification_ids is None:
+        cursor = conn.execute('''
+            UPDATE notifications SET read_at = CURRENT_TIMESTAMP
+            WHERE hospital_id = ? AND read_at IS NULL
+        ''', (hospital_id,))
+    else:
+        ids = list(notification_ids)
+        if not ids:
+            conn.close()
+            return 0
+        placeholders = ', '.join('?' for _ in ids)
+        cursor = conn.execute(f'''
+            UPDATE notifications SET read_at = CURRENT_TIMESTAMP
+            WHERE hospital_id = ? AND read_at IS NULL AND id IN ({placeholders})
+        ''', [hospital_id, *ids])
+    changed = cursor.rowcount
+    if changed:
+        bump_data_version(conn, f'notifications:{hospital_id}')
+    conn.commit()
+    conn.close()
+    return changed
+
+# ====================
+# COMPACT ROWS
+# ====================
+
+class CompactRecord:
+    """Slotted row holding only the columns a caller needs.
+
+    Reads like sqlite3.Row (row['name'], keys(), dict(row)) and like an object
+    (row.name, which is what templates use), without a per-row dict or the
+    columns nobody reads.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*(row[name] for name in cls.__slots__))
+
+    @classmethod
+    def columns(cls):
+        """SELECT list matching the slot order, for use with compact_row_factory"""
+        return ', '.join(cls.__slots__)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise IndexError(f'No item with that key: {key}') from None
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)})'
+
+def compact_row_factory(record_class):
+    """row_factory for bulk queries that select record_class.columns()"""
+    def factory(cursor, row):
+        return record_class(*row)
+    return factory
+
+class MatchPatient(CompactRecord):
+    """Patient fields the match views, dashboard and REM read"""
+    __slots__ = ('patient_id', 'hospital_id', 'name', 'blood_group', 'organ_needed', 'location', 'urgency_score')
+
+class MatchDonor(CompactRecord):
+    """Donor fields the match views, dashboard and REM read"""
+    __slots__ = ('donor_id', 'hospital_id', 'name', 'blood_group', 'organ_type', 'location')
+
+class ScoringPatient(CompactRecord):
+    """Patient columns calculate_match_score reads, plus the view fields"""
+    __slots__ = MatchPatient.__slots__ + ('dob', 'weight_kg', 'height_cm', 'organ_metrics', 'medical_history')
+
+class ScoringDonor(CompactRecord):
+    """Donor columns calculate_match_score reads, plus the view fields"""
+    __slots__ = MatchDonor.__slots__ + ('dob', 'weight_kg', 'height_cm', 'organ_metrics', 'medical_history')
+
+class MatchResult(CompactRecord):
+    """One patient's best donor, as get_matches returns it"""
+    __slots__ = ('patient', 'donor', 'score', 'reasons', 'distance_km')
+
+# ====================
+# JSON FIELDS
+# ====================
+
+@lru_cache(maxsize=JSON_PARSE_CACHE_SIZE)
+def _parse_json_text(text):
+    return json.loads(text)
+
+def parse_json_field(value, default):
+    """Decoded organ_metrics/medical_history text, cached by content; treat the result as read-only"""
+    if isinstance(value, (dict, list)):
+        return value
+    if not value:
+        return default
+    try:
+        parsed = _parse_json_text(value)
+    except (ValueError, TypeError):
+        return default
+    return parsed if isinstance(parsed, type(default)) else default
+
+def clinical_fields(row):
+    """(organ_metrics, medical_history) of a donor/patient row, parsed once"""
+    return parse_json_field(row['organ_metrics'], {}), parse_json_field(row['medical_history'], [])
+
 # ====================
 # ADVANCED MATCHING ALGORITHM
 # ====================
@@ -312,33 +701,42 @@ def calculate_hla_match(patient_hla, donor_hla):
     
     return min(matches, 6)
 
+def hla_allele_set(hla_typing):
+    """HLA typing as a frozenset of (locus, allele); min(len(a & b), 6) equals calculate_hla_match(a, b)"""
+    if not hla_typing:
+        return frozenset()
+    return frozenset((marker, value) for marker in ('hla_a', 'hla_b', 'hla_dr')
+                     for value in hla_typing.get(marker) or () if value)
+
+# Donor blood groups each patient blood group can receive
+BLOOD_COMPATIBILITY = {
+    'A+': ('A+', 'A-', 'O+', 'O-'),
+    'A-': ('A-', 'O-'),
+    'B+': ('B+', 'B-', 'O+', 'O-'),
+    'B-': ('B-', 'O-'),
+    'AB+': ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-'),
+    'AB-': ('A-', 'B-', 'AB-', 'O-'),
+    'O+': ('O+', 'O-'),
+    'O-': ('O-',)
+}
+# Patient blood groups each donor blood group can give to
+RECIPIENT_BLOOD_GROUPS = {
+    donor_blood: tuple(patient_blood for patient_blood, donors in BLOOD_COMPATIBILITY.items() if donor_blood in donors)
+    for donor_blood in BLOOD_COMPATIBILITY
+}
+
 def check_blood_compatibility(patient_blood, donor_blood):
     """Check blood group compatibility"""
-    compatible = {
-        'A+': ['A+', 'A-', 'O+', 'O-'],
-        'A-': ['A-', 'O-'],
-        'B+': ['B+', 'B-', 'O+', 'O-'],
-        'B-': ['B-', 'O-'],
-        'AB+': ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-'],
-        'AB-': ['A-', 'B-', 'AB-', 'O-'],
-        'O+': ['O+', 'O-'],
-        'O-': ['O-']
-    }
-    
-    return donor_blood in compatible.get(patient_blood, [])
-
-def calculate_match_score(patient, donor):
-    """Advanced matching algorithm"""
+    return donor_blood in BLOOD_COMPATIBILITY.get(patient_blood, ())
+
+def calculate_match_score(patient, donor, patient_fields=None, donor_fields=None):
+    """Advanced matching algorithm; *_fields are clinical_fields() results when the caller has them"""
     score = 0
     reasons = []
     
     # Parse metrics
-    try:
-        patient_metrics = json.loads(patient['organ_metrics']) if patient['organ_metrics'] else {}
-        donor_metrics = json.loads(donor['organ_metrics']) if donor['organ_metrics'] else {}
-    except:
-        patient_metrics = {}
-        donor_metrics = {}
+    patient_metrics, _ = patient_fields or clinical_fields(patient)
+    donor_metrics, donor_history = donor_fields or clinical_fields(donor)
     
     # 1. Blood Compatibility (Critical - 30 points)
     if not check_blood_compatibility(patient['blood_group'], donor['blood_group']):
@@ -512,16 +910,6 @@ def calculate_match_score(patient, donor):
         reasons.append("✓ Moderate urgency")
     
     # 6. Medical Contraindications Check
-    patient_history_str = patient['medical_history'] if patient['medical_history'] else '[]'
-    donor_history_str = donor['medical_history'] if donor['medical_history'] else '[]'
-    
-    try:
-        patient_history = json.loads(patient_history_str) if isinstance(patient_history_str, str) else (patient_history_str if isinstance(patient_history_str, list) else [])
-        donor_history = json.loads(donor_history_str) if isinstance(donor_history_str, str) else (donor_history_str if isinstance(donor_history_str, list) else [])
-    except:
-        patient_history = []
-        donor_history = []
-    
     # Check for active cancer in donor
     if 'Active Cancer' in donor_history or 'Malignancy' in donor_history:
         score -= 50
@@ -556,23 +944,49 @@ def calculate_match_score(patient, donor):
 # MATCHING FUNCTIONS
 # ====================
 
+match_flight = SingleFlight('matches')
+
 def get_matches():
-    """Get all potential matches with scores"""
-    conn = get_db()
-    patients = conn.execute('SELECT * FROM patients WHERE status = "active"').fetchall()
-    donors = conn.execute('SELECT * FROM donors WHERE status = "active"').fetchall()
+    """Get all potential matches with scores.
+
+    Concurrent callers at the same network version share one scoring run, so
+    the returned list and its results must not be modified.
+    """
+    version = get_data_versions([NETWORK_SCOPE])[NETWORK_SCOPE][0]
+    return match_flight.do(version, score_matches)
+
+def score_matches():
+    conn = get_db(row_factory=compact_row_factory(ScoringPatient))
+    patients = conn.execute(f'SELECT {ScoringPatient.columns()} FROM patients WHERE status = "active"').fetchall()
+    conn.row_factory = compact_row_factory(ScoringDonor)
+    donors = conn.execute(
+        f'SELECT {ScoringDonor.columns()} FROM donors WHERE status = "active" AND {OPEN_DONOR_FILTER}'
+    ).fetchall()
     conn.close()
-    
+    return best_matches(patients, donors)
+
+def best_matches(patients, donors):
+    """Best-scoring donor for each patient, highest scores first.
+
+    Results hold MatchPatient/MatchDonor views rather than the scoring rows, so
+    the JSON columns can be freed once matching is done.
+    """
     matches = []
+    started = time.perf_counter()
+    # Decode each row's JSON once per batch rather than once per pair
+    donor_fields = [clinical_fields(donor) for donor in donors]
+    # One view per donor however many patients it is best for
+    donor_views = {}
     
     for patient in patients:
         best_donor = None
         best_score = 0
         best_reasons = []
         best_distance = None
+        patient_fields = clinical_fields(patient)
         
-        for donor in donors:
-            score, reasons = calculate_match_score(patient, donor)
+        for donor, fields in zip(donors, donor_fields):
+            score, reasons = calculate_match_score(patient, donor, patient_fields, fields)
             
             if score > best_score:
                 best_score = score
@@ -581,41 +995,30 @@ def get_matches():
                 best_distance = calculate_distance(patient['location'], donor['location'])
         
         if best_donor and best_score > 0:
-            matches.append({
-                'patient': patient,
-                'donor': best_donor,
-                'score': best_score,
-                'reasons': best_reasons,
-                'distance_km': best_distance
-            })
-    
-    matches.sort(key=lambda x: x['score'], reverse=True)
+            donor_id = best_donor['donor_id']
+            donor_view = donor_views.get(donor_id)
+            if donor_view is None:
+                donor_view = donor_views[donor_id] = MatchDonor.from_row(best_donor)
+            matches.append(MatchResult(MatchPatient.from_row(patient), donor_view,
+                                       best_score, best_reasons, best_distance))
+    
+    observe_match_batch('get_matches', len(patients) * len(donors), time.perf_counter() - started)
+    matches.sort(key=lambda x: x.score, reverse=True)
     return matches
 
 def search_by_id(search_id):
     """Search for patient or donor by ID"""
     search_id = search_id.upper()
-    conn = get_db()
+    # One version read covers both lookups; the hit also warms the cache for the detail page
+    get_data_versions([f'patient:{search_id}', f'donor:{search_id}'])
     
     # Try patient first
-    result = conn.execute('''
-        SELECT p.*, h.hospital_name, 'patient' as type
-        FROM patients p
-        JOIN hospitals h ON p.hospital_id = h.id
-        WHERE p.patient_id = ?
-    ''', (search_id,)).fetchone()
-    
+    result = get_patient_by_id(search_id)
     if result:
-        conn.close()
-        return result
+        return dict(zip(result.keys(), result), type='patient')
     
     # Try donor
-    result = conn.execute('''
-        SELECT d.*, h.hospital_name, 'donor' as type
-        FROM donors d
-        JOIN hospitals h ON d.hospital_id = h.id
-        WHERE d.donor_id = ?
-    ''', (search_id,)).fetchone()
-    
-    conn.close()
-    return result
\ No newline at end of file
+    result = get_donor_by_id(search_id)
+    if result:
+        return dict(zip(result.keys(), result), type='donor')
+    return None
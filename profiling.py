@@ -0,0 +1,192 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(os.path.dirname(BASE_DIR), 'lifelink_profiles')
+# Oldest profiles are pruned beyond this many
+PROFILE_KEEP = 200
+TRIGGER_FILE = 'triggers.json'
+# Armed route triggers expire so a forgotten one cannot keep profiling production
+MAX_TRIGGER_MINUTES = 60
+
+
+class ProfileStore:
+    """Profiles saved as <id>.prof (pstats) plus <id>.json metadata in a shared directory.
+
+    Route triggers live in triggers.json next to them, so arming a route from one
+    worker applies to every worker; each process re-reads the file when its
+    mtime changes.
+    """
+
+    def __init__(self, profile_dir=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.profile_dir = profile_dir
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._triggers = []
+        self._triggers_mtime = None
+
+    # ---- saved profiles ----
+
+    def save(self, profile, label, tags):
+        """Write a finished cProfile.Profile with its label and tags; returns the metadata"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile_id = datetime.utcnow().strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        profile.dump_stats(self._path(profile_id, 'prof'))
+        stats = pstats.Stats(profile)
+        meta = dict(tags, id=profile_id, label=label,
+                    created_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                    total_calls=stats.total_calls, top=top_functions(stats, 5))
+        with open(self._path(profile_id, 'json'), 'w') as handle:
+            json.dump(meta, handle, default=str)
+        self._prune()
+        return meta
+
+    def list(self, limit=50):
+        if not os.path.isdir(self.profile_dir):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.profile_dir), reverse=True):
+            if not name.endswith('.json') or name == TRIGGER_FILE:
+                continue
+            try:
+                with open(os.path.join(self.profile_dir, name)) as handle:
+                    profiles.append(json.load(handle))
+            except (OSError, ValueError):
+                continue
+            if len(profiles) >= limit:
+                break
+        return profiles
+
+    def get(self, profile_id):
+        path = self._path(profile_id, 'json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+
+    def stats_path(self, profile_id):
+        path = self._path(profile_id, 'prof')
+        return path if os.path.exists(path) else None
+
+    def report(self, profile_id, sort='cumulative', limit=40):
+        """pstats text report for a saved profile"""
+        path = self.stats_path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def _path(self, profile_id, extension):
+        # ids are generated here; refuse anything that could escape the directory
+        if not profile_id or os.sep in profile_id or profile_id.startswith('.'):
+            profile_id = 'invalid'
+        return os.path.join(self.profile_dir, f'{profile_id}.{extension}')
+
+    def _prune(self):
+        names = sorted(name[:-5] for name in os.listdir(self.profile_dir)
+                       if name.endswith('.json') and name != TRIGGER_FILE)
+        for profile_id in names[:-self.keep] if len(names) > self.keep else []:
+            for extension in ('json', 'prof'):
+                path = self._path(profile_id, extension)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # ---- route triggers ----
+
+    def arm(self, endpoint, minutes, hospital_id=None):
+        """Profile every request to endpoint (optionally for one hospital) for the next minutes"""
+        minutes = max(0, min(minutes, MAX_TRIGGER_MINUTES))
+        with self._lock:
+            triggers = [trigger for trigger in self._read_triggers()
+                        if not (trigger['endpoint'] == endpoint and trigger['hospital_id'] == hospital_id)]
+            if minutes:
+                triggers.append({'endpoint': endpoint, 'hospital_id': hospital_id,
+                                 'until': time.time() + minutes * 60})
+            self._write_triggers(triggers)
+        return self.triggers()
+
+    def triggers(self):
+        now = time.time()
+        with self._lock:
+            return [trigger for trigger in self._read_triggers() if trigger['until'] > now]
+
+    def should_profile(self, endpoint, hospital_id):
+        now = time.time()
+        for trigger in self.triggers():
+            if trigger['endpoint'] == endpoint and trigger['until'] > now and \
+                    trigger['hospital_id'] in (None, hospital_id):
+                return True
+        return False
+
+    def _read_triggers(self):
+        path = os.path.join(self.profile_dir, TRIGGER_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._triggers, self._triggers_mtime = [], None
+            return []
+        if mtime != self._triggers_mtime:
+            try:
+                with open(path) as handle:
+                    self._triggers = json.load(handle)
+            except (OSError, ValueError):
+                self._triggers = []
+            self._triggers_mtime = mtime
+        return list(self._triggers)
+
+    def _write_triggers(self, triggers):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, TRIGGER_FILE)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as handle:
+            json.dump(triggers, handle)
+        os.replace(temp_path, path)
+
+
+def top_functions(stats, limit):
+    """[(function, cumulative_seconds), ...] for the heaviest entries of a pstats.Stats"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [(f'{os.path.basename(filename)}:{line}({name})', round(cumulative, 4))
+            for (filename, line, name), (_, _, _, cumulative, _) in rows]
+
+
+@contextmanager
+def profiled(label, store=None, **tags):
+    """Profile the enclosed block; saves it to the profile store when one is given.
+
+    Yields the cProfile.Profile so callers can print or inspect the stats:
+
+        with profiled('get_matches', store=ProfileStore()) as profile:
+            get_matches()
+    """
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if store is not None:
+            store.save(profile, label, dict(tags, duration_ms=round((time.perf_counter() - started) * 1000, 1)))
+
+
+if __name__ == '__main__':
+    # Offline profile of network-wide matching against the local database
+    from models import get_matches
+
+    store = ProfileStore()
+    with profiled('get_matches', store=store, source='cli') as profile:
+        matches = get_matches()
+    print(f'{len(matches)} matches')
+    pstats.Stats(profile, stream=sys.stdout).strip_dirs().sort_stats('cumulative').print_stats(25)
@@ -0,0 +1,200 @@
+import json
+import queue
+import threading
+from collections import deque
+
+
+def format_sse(event_type, data, event_id=None):
+    """Serialize one Server-Sent Event frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    for line in json.dumps(data, default=str).splitlines() or ['']:
+        lines.append(f'data: {line}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One connected SSE client with a bounded outbound buffer"""
+
+    def __init__(self, hospital_id, buffer_size):
+        self.hospital_id = hospital_id
+        self.events = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def push(self, event):
+        """Queue an event, discarding the oldest pending one if the client is lagging"""
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class StreamLimitError(Exception):
+    """Raised when a worker already holds its maximum number of open streams"""
+
+
+class NotificationBroker:
+    """Per-process fan-out of notification changes to SSE subscribers.
+
+    A single background thread watches the network data version. When it moves,
+    notifications are rebuilt once for every hospital with open streams and only
+    the entries a hospital has not seen yet are pushed. Event ids are the network
+    data version, so a client can resume against any worker with Last-Event-ID.
+    Each open stream holds a request thread, so at most max_subscribers are
+    accepted and the watcher only runs while someone is subscribed.
+    """
+
+    def __init__(self, version_fn, build_fn, poll_interval=2.0, history_size=50, buffer_size=20,
+                 max_subscribers=None):
+        self.version_fn = version_fn
+        self.build_fn = build_fn
+        self.poll_interval = poll_interval
+        self.history_size = history_size
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._pending = 0
+        self._history = {}
+        self._history_base = {}
+        self._snapshots = {}
+        self._thread = None
+        self._wakeup = threading.Event()
+
+    def subscribe(self, hospital_id, last_event_id=None):
+        """Register a client and queue its catch-up events; StreamLimitError when the worker is full"""
+        subscription = Subscription(hospital_id, self.buffer_size)
+        with self._lock:
+            if self.max_subscribers is not None and self._count() + self._pending >= self.max_subscribers:
+                raise StreamLimitError('Too many open notification streams on this worker')
+            # Hold the slot while the catch-up events are built
+            self._pending += 1
+        try:
+            version = self.version_fn()
+            replay = self._replay(hospital_id, last_event_id, version)
+            if replay is None:
+                notifications = self._snapshot(hospital_id, version)
+                subscription.push(('snapshot', {'notifications': notifications}, version))
+            else:
+                for event in replay:
+                    subscription.push(event)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        with self._lock:
+            self._subscribers.setdefault(hospital_id, set()).add(subscription)
+            self._ensure_thread()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.hospital_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.hospital_id]
+            if not self._subscribers:
+                # Let the watcher notice it is idle and exit
+                self._wakeup.set()
+
+    def notify(self):
+        """Wake the watcher early, e.g. right after a write in this process"""
+        self._wakeup.set()
+
+    def subscriber_count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def _replay(self, hospital_id, last_event_id, version):
+        """Events after last_event_id, or None when a full snapshot is needed"""
+        try:
+            last_seen = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        if last_seen == version:
+            return []
+        with self._lock:
+            history = list(self._history.get(hospital_id, ()))
+            base = self._history_base.get(hospital_id)
+        if base is None or base > last_seen or last_seen > version:
+            return None
+        return [event for event in history if event[2] > last_seen]
+
+    def _snapshot(self, hospital_id, version):
+        # Always rebuilt: snapshots carry read/unread state, which does not move the data version
+        notifications = self.build_fn([hospital_id]).get(hospital_id, [])
+        with self._lock:
+            self._snapshots[hospital_id] = (version, notifications)
+        return notifications
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='notification-broker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_version = self.version_fn()
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            with self._lock:
+                if not self._subscribers:
+                    # Versions are not watched while idle, so history would have gaps; resync via snapshot
+                    self._history.clear()
+                    self._history_base.clear()
+                    self._snapshots.clear()
+                    self._thread = None
+                    return
+            try:
+                version = self.version_fn()
+                if version != last_version:
+                    self._publish(version)
+                    last_version = version
+            except Exception as broker_error:
+                print(f"[LifeLink] Notification broker error: {broker_error}")
+
+    def _publish(self, version):
+        with self._lock:
+            hospital_ids = list(self._subscribers)
+            # History is only contiguous while someone is listening; idle hospitals resync via snapshot
+            for idle_id in [key for key in self._history if key not in self._subscribers]:
+                self._history.pop(idle_id, None)
+                self._history_base.pop(idle_id, None)
+                self._snapshots.pop(idle_id, None)
+        if not hospital_ids:
+            return
+
+        rebuilt = self.build_fn(hospital_ids)
+        for hospital_id in hospital_ids:
+            notifications = rebuilt.get(hospital_id, [])
+            with self._lock:
+                previous_version, previous = self._snapshots.get(hospital_id, (None, []))
+                self._snapshots[hospital_id] = (version, notifications)
+            seen_ids = {item['id'] for item in previous}
+            fresh = [item for item in notifications if item['id'] not in seen_ids]
+            # Clients that resume need a contiguous history, so record empty deltas too
+            event = ('notifications', {'notifications': fresh}, version)
+            with self._lock:
+                history = self._history.get(hospital_id)
+                if history is None:
+                    history = self._history[hospital_id] = deque(maxlen=self.history_size)
+                    self._history_base[hospital_id] = previous_version
+                elif len(history) == history.maxlen:
+                    self._history_base[hospital_id] = history[0][2]
+                history.append(event)
+                subscribers = list(self._subscribers.get(hospital_id, ()))
+            if fresh:
+                for subscription in subscribers:
+                    subscription.push(event)
@@ -0,0 +1,553 @@
+import json
+import re
+
+from cache import VersionedLRUCache, SingleFlight
+from models import (get_matches, get_data_versions, most_urgent_patients, NETWORK_SCOPE, CITY_COORDINATES,
+                    WAITLIST_ORDER, OPEN_DONOR_FILTER)
+
+# Rough prompt budget for the database context (about 4 characters per token)
+REM_CONTEXT_TOKEN_BUDGET = 1200
+CHARS_PER_TOKEN = 4
+REM_CONTEXT_CACHE_SIZE = 512
+# Answers to repeat questions are reused until data changes or they age out
+REM_RESPONSE_CACHE_SIZE = 1024
+REM_RESPONSE_TTL = 600
+
+
+# ====================
+# CONTEXT SECTIONS
+# ====================
+
+def build_count_section(conn, hospital_id):
+    row = conn.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM donors WHERE hospital_id = ? AND status = 'active') as my_donors,
+            (SELECT COUNT(*) FROM patients WHERE hospital_id = ? AND status = 'active') as my_patients,
+            (SELECT COUNT(*) FROM patients
+             WHERE hospital_id = ? AND urgency_score >= 80 AND status = 'active') as critical_patients
+    ''', (hospital_id, hospital_id, hospital_id)).fetchone()
+    return dict(row)
+
+def build_urgent_patient_section(conn, hospital_id):
+    rows = most_urgent_patients(hospital_id, 5, conn=conn)
+    return {'urgent_patients_detail': [
+        {key: row[key] for key in ('patient_id', 'name', 'organ_needed', 'blood_group', 'location', 'urgency_score')}
+        for row in rows]}
+
+def build_recent_donor_section(conn, hospital_id):
+    rows = conn.execute('''
+        SELECT donor_id, name, organ_type, blood_group, location
+        FROM donors
+        WHERE hospital_id = ? AND status = "active"
+        ORDER BY created_at DESC
+        LIMIT 5
+    ''', (hospital_id,)).fetchall()
+    return {'recent_donors': [dict(row) for row in rows]}
+
+def build_match_section(conn, hospital_id):
+    hospital_matches = [m for m in get_matches() if m['patient']['hospital_id'] == hospital_id]
+    total = len(hospital_matches)
+    return {
+        'total_matches': total,
+        'avg_match_score': round(sum(match['score'] for match in hospital_matches) / total, 1) if total else 0,
+        'recent_matches': [{
+            'patient_id': match['patient']['patient_id'],
+            'patient_name': match['patient']['name'],
+            'donor_id': match['donor']['donor_id'],
+            'donor_name': match['donor']['name'],
+            'score': match['score'],
+            'organ': match['patient']['organ_needed']
+        } for match in hospital_matches[:5]]
+    }
+
+# Sections in priority order; a section is included when the question hits one of its
+# keywords (or always, for an empty keyword list). Questions that hit none get every section.
+CONTEXT_SECTIONS = [
+    ('counts', (), build_count_section),
+    ('urgent_patients', ('critical', 'urgent', 'patient', 'priority', 'waitlist', 'waiting', 'recipient'),
+     build_urgent_patient_section),
+    ('recent_donors', ('donor', 'available', 'organ', 'kidney', 'liver', 'heart', 'lung', 'pancreas',
+                       'cornea', 'blood'), build_recent_donor_section),
+    ('matches', ('match', 'compatib', 'score', 'pair', 'allocat'), build_match_section),
+]
+
+
+# ====================
+# CONTEXT BUILDER
+# ====================
+
+# Chat turns from one hospital that miss together build each section once
+context_cache = VersionedLRUCache(REM_CONTEXT_CACHE_SIZE, flight=SingleFlight('rem_context'))
+
+def select_context_sections(question):
+    """Section specs relevant to a question, in priority order"""
+    text = (question or '').lower()
+    keyed = [spec for spec in CONTEXT_SECTIONS if spec[1] and any(word in text for word in spec[1])]
+    if not keyed:
+        return list(CONTEXT_SECTIONS)
+    return [spec for spec in CONTEXT_SECTIONS if not spec[1] or spec in keyed]
+
+def fit_section(section, budget_chars):
+    """Trim list values of a section until it serializes within budget_chars; None if it cannot fit"""
+    section = dict(section)
+    while len(json.dumps(section, default=str)) > budget_chars:
+        lists = [key for key, value in section.items() if isinstance(value, list) and value]
+        if not lists:
+            return None
+        longest = max(lists, key=lambda key: len(section[key]))
+        section[longest] = section[longest][:-1]
+    return section
+
+def current_context_version():
+    """Data version every REM context and cached answer is keyed on"""
+    return get_data_versions([NETWORK_SCOPE])[NETWORK_SCOPE][0]
+
+def build_rem_context(conn, hospital_id, question=None, token_budget=REM_CONTEXT_TOKEN_BUDGET, version=None):
+    """JSON database context for REM, limited to sections relevant to the question.
+
+    Sections are cached per hospital and keyed on the network data version, which
+    every donor/patient write bumps, so repeat chat turns skip the queries and
+    the network-wide match scoring until something changes.
+    """
+    if version is None:
+        version = current_context_version()
+    remaining = token_budget * CHARS_PER_TOKEN
+    context = {}
+    for name, _, build in select_context_sections(question):
+        section = context_cache.get_or_build((hospital_id, name), version, lambda: build(conn, hospital_id))
+        fitted = fit_section(section, remaining)
+        if fitted is None:
+            continue
+        context.update(fitted)
+        remaining -= len(json.dumps(fitted, default=str))
+    return json.dumps(context, default=str)
+
+
+# ====================
+# RESPONSE CACHE
+# ====================
+
+response_cache = VersionedLRUCache(REM_RESPONSE_CACHE_SIZE, ttl=REM_RESPONSE_TTL)
+
+# Comparison operators and decimals are kept so 'meld > 30' and 'meld < 30' stay distinct
+QUESTION_TOKEN_RE = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?[+-]?|[<>]=?|=')
+# Articles, politeness and request verbs only: scope words (my, our, all) and
+# relations (to, for, not) change the answer and are kept
+QUESTION_FILLER = {
+    'a', 'an', 'the', 'please', 'kindly', 'me', 'you', 'can', 'could', 'would', 'will',
+    'show', 'list', 'give', 'get', 'tell', 'display', 'find', 'fetch',
+}
+
+def normalize_question(question):
+    """Canonical form of a question: lowercased, filler dropped, plurals folded, word order kept"""
+    words = []
+    for token in QUESTION_TOKEN_RE.findall((question or '').lower()):
+        if token in QUESTION_FILLER:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        words.append(token)
+    return ' '.join(words)
+
+def response_cache_key(hospital_id, question):
+    """Cache key for a REM answer, or None when the question has no meaningful words"""
+    normalized = normalize_question(question)
+    return (hospital_id, normalized) if normalized else None
+
+
+# ====================
+# INTENT ENGINE
+# ====================
+
+REM_ORGANS = ('Kidney', 'Liver', 'Heart', 'Lung', 'Pancreas')
+CRITICAL_URGENCY = 80
+REM_RESULT_LIMIT = 5
+
+ORGAN_RE = re.compile(r'\b(' + '|'.join(organ.lower() for organ in REM_ORGANS) + r')s?\b')
+BLOOD_GROUP_RE = re.compile(
+    r'(?<![a-z0-9])(ab|a|b|o)\s?([+-])(?:ve)?(?![a-z0-9])'
+    r'|\b(?:blood|type|group)\s+(ab|a|b|o)\s+(pos|neg)(?:itive|ative)?\b')
+URGENCY_RE = re.compile(
+    r'urgency(?:\s+score)?\s*(>=|<=|>|<|=|above|over|greater than|at least|below|under|less than|at most)?\s*(\d{1,3})')
+# Typed clinical_markers columns REM can filter on: (column, question pattern, label, default intent)
+CLINICAL_FILTERS = (
+    ('meld_score', r'meld(?:\s+score)?', 'MELD', 'patients'),
+    ('ejection_fraction', r'(?:ejection\s+fraction|ef)', 'ejection fraction', 'donors'),
+    ('fev1_score', r'fev1(?:\s+score)?', 'FEV1', 'donors'),
+    ('c_peptide_level', r'c[- ]?peptide(?:\s+level)?', 'C-peptide', 'donors'),
+)
+CLINICAL_OPERATOR_RE = (r'\s*(?:of\s+|is\s+)?(>=|<=|>|<|=|above|over|greater than|at least|below|under|less than|at most)?'
+                        r'\s*(\d{1,3}(?:\.\d+)?)')
+CLINICAL_RES = [(column, re.compile(r'\b' + pattern + CLINICAL_OPERATOR_RE), label, default)
+                for column, pattern, label, default in CLINICAL_FILTERS]
+CLINICAL_LABELS = {column: label for column, _, label, _ in CLINICAL_FILTERS}
+CONTRAINDICATION_RE = re.compile(
+    r'\b(?:no|without|exclud(?:e|ing)|free of)\s+(?:active\s+)?(?:cancer|malignanc(?:y|ies)|infections?|contraindications?)\b')
+COUNT_RE = re.compile(r'\b(how many|count|number of|total)\b')
+OWN_SCOPE_RE = re.compile(r'\b(my|our|mine)\b')
+# Questions asking for judgement or explanation are left to the LLM
+OPEN_ENDED_RE = re.compile(
+    r'\b(why|explain|recommend|suggest|should|compare|summari[sz]e|analy[sz]e|what if|advice|predict|best)\b')
+QUESTION_WORD_RE = re.compile(r'[a-z]+')
+# Donor/patient IDs (DN-001-2025-004, PT-00012): questions about one record need the LLM
+ENTITY_ID_RE = re.compile(r'\b(?:dn|pt)-[a-z0-9]+(?:-[a-z0-9]+)*\b')
+# Words a structured question may contain besides its filters; any other word
+# ("status", "about", "history") means the question asks for more than a filtered list
+REM_QUERY_WORDS = {
+    'how', 'many', 'which', 'what', 'who', 'show', 'list', 'find', 'count', 'number', 'total', 'of',
+    'are', 'is', 'there', 'do', 'does', 'we', 'i', 'me', 'you', 'my', 'our', 'mine', 'have', 'has',
+    'all', 'any', 'the', 'a', 'an', 'in', 'at', 'from', 'near', 'with', 'without', 'for', 'to', 'and',
+    'or', 'by', 'on', 'please', 'can', 'could', 'give', 'get', 'tell', 'display', 'fetch', 'currently',
+    'current', 'now', 'active', 'available', 'registered', 'donor', 'donors', 'patient', 'patients',
+    'recipient', 'recipients', 'match', 'matches', 'matching', 'compatible', 'statistics', 'stats',
+    'critical', 'urgent', 'urgency', 'score', 'waiting', 'waitlist', 'need', 'needs', 'needing',
+    'organ', 'organs', 'blood', 'type', 'group', 'hospital', 'help', 'than', 'greater', 'less', 'above',
+    'over', 'under', 'below', 'least', 'most',
+}
+# Nouns that name what a question is about
+ENTITY_NOUNS = {
+    'donor': 'donors', 'donors': 'donors', 'patient': 'patients', 'patients': 'patients',
+    'recipient': 'patients', 'recipients': 'patients', 'match': 'matches', 'matches': 'matches',
+}
+# A noun after one of these is an object ("donors *for* critical patients"), not the subject...
+OBJECT_PREPOSITIONS = {'for', 'to', 'with', 'without', 'from', 'against', 'by', 'of'}
+# ...until a word that starts a new clause ("in mumbai, *how* many donors")
+CLAUSE_WORDS = {'how', 'many', 'which', 'what', 'who', 'show', 'list', 'find', 'count', 'are', 'is', 'there', 'do'}
+# Used when the question names no entity noun, checked in this order
+INTENT_FALLBACKS = (
+    ('matches', re.compile(r'\bmatch(es|ing)?\b|\bcompatib')),
+    ('patients', re.compile(r'\b(critical|urgent|waitlist|waiting|urgency)\b')),
+    ('help', re.compile(r'\b(help|what can you do)\b')),
+)
+URGENCY_OPERATORS = {
+    '>=': 'min', 'at least': 'min', None: 'min', '=': 'exact',
+    '>': 'above', 'above': 'above', 'over': 'above', 'greater than': 'above',
+    '<': 'below', 'below': 'below', 'under': 'below', 'less than': 'below',
+    '<=': 'max', 'at most': 'max',
+}
+BOUND_SQL = {'min': '>=', 'above': '>', 'below': '<', 'max': '<=', 'exact': '='}
+BOUND_SYMBOLS = {'min': '≥', 'above': '>', 'below': '<', 'max': '≤', 'exact': '='}
+
+def compile_city_pattern(cities):
+    """Regex for known city names, longest first so 'new delhi' wins over 'delhi'"""
+    names = sorted({city.lower() for city in cities if city}, key=len, reverse=True)
+    return re.compile(r'\b(' + '|'.join(re.escape(name) for name in names) + r')\b') if names else None
+
+_city_patterns = {}
+
+def city_pattern(cities):
+    key = tuple(sorted({city.lower() for city in cities if city}))
+    pattern = _city_patterns.get(key)
+    if pattern is None:
+        pattern = _city_patterns[key] = compile_city_pattern(key)
+    return pattern
+
+def city_aliases(city):
+    """Spellings stored for the same place (e.g. bangalore / bengaluru)"""
+    coords = CITY_COORDINATES.get(city)
+    if coords is None:
+        return [city]
+    return sorted(name for name, other in CITY_COORDINATES.items() if other == coords)
+
+def parse_rem_intent(message, hospitals, hospital_id):
+    """Extract a structured query from a REM question.
+
+    ``hospitals`` is a list of (id, hospital_name, location_city) rows used for
+    city names and hospital scope. Returns a dict with ``intent`` of help,
+    matches, patients, donors or None, plus optional filters, any donor or
+    patient IDs mentioned, and the ``unexplained`` words no filter accounts for.
+    """
+    text = (message or '').lower()
+    # Character ranges explained by a filter, for the leftover-words check at the end
+    spans = []
+    intent = {
+        'intent': None, 'organ': None, 'blood_group': None, 'city': None,
+        'urgency_min': None, 'urgency_max': None, 'hospital_id': None, 'hospital_name': None,
+        'clinical': [], 'exclude_contraindicated': bool(CONTRAINDICATION_RE.search(text)),
+        'count_only': bool(COUNT_RE.search(text)), 'open_ended': bool(OPEN_ENDED_RE.search(text)),
+        'entity_ids': [entity_id.upper() for entity_id in ENTITY_ID_RE.findall(text)], 'unexplained': [],
+    }
+    for pattern in (CONTRAINDICATION_RE, COUNT_RE):
+        spans.extend(found.span() for found in pattern.finditer(text))
+
+    intent['intent'] = subject_entity(text)
+    if intent['intent'] is None:
+        for name, pattern in INTENT_FALLBACKS:
+            if pattern.search(text):
+                intent['intent'] = name
+                break
+
+    organ = ORGAN_RE.search(text)
+    if organ:
+        spans.append(organ.span())
+        intent['organ'] = organ.group(1).capitalize()
+        if intent['intent'] is None:
+            intent['intent'] = 'donors'
+
+    for column, pattern, _, default in CLINICAL_RES:
+        marker = pattern.search(text)
+        if marker:
+            spans.append(marker.span())
+            bound = URGENCY_OPERATORS.get(marker.group(1), 'min')
+            intent['clinical'].append((column, bound, float(marker.group(2))))
+            if intent['intent'] is None:
+                intent['intent'] = default
+
+    blood = BLOOD_GROUP_RE.search(text)
+    if blood:
+        spans.append(blood.span())
+        group, sign = (blood.group(1), blood.group(2)) if blood.group(1) else (blood.group(3), blood.group(4))
+        intent['blood_group'] = group.upper() + ('-' if sign in ('-', 'neg') else '+')
+
+    cities = list(CITY_COORDINATES) + [row['location_city'] for row in hospitals]
+    pattern = city_pattern(cities)
+    city = pattern.search(text) if pattern else None
+    if city:
+        spans.append(city.span())
+        intent['city'] = city.group(1)
+
+    urgency = URGENCY_RE.search(text)
+    if urgency:
+        spans.append(urgency.span())
+        bound = URGENCY_OPERATORS.get(urgency.group(1), 'min')
+        value = min(int(urgency.group(2)), 100)
+        if bound == 'min':
+            intent['urgency_min'] = value
+        elif bound == 'above':
+            intent['urgency_min'] = value + 1
+        elif bound == 'below':
+            intent['urgency_max'] = value - 1
+        elif bound == 'max':
+            intent['urgency_max'] = value
+        else:
+            intent['urgency_min'] = intent['urgency_max'] = value
+    elif re.search(r'\b(critical|urgent)\b', text):
+        intent['urgency_min'] = CRITICAL_URGENCY
+
+    scoped = match_hospital(text, hospitals)
+    named = set()
+    if scoped is not None:
+        intent['hospital_id'], intent['hospital_name'] = scoped['id'], scoped['hospital_name']
+        named = set(QUESTION_WORD_RE.findall(scoped['hospital_name'].lower()))
+    elif OWN_SCOPE_RE.search(text) or intent['intent'] == 'matches':
+        intent['hospital_id'] = hospital_id
+
+    for start, end in spans:
+        text = text[:start] + ' ' * (end - start) + text[end:]
+    intent['unexplained'] = [word for word in QUESTION_WORD_RE.findall(text)
+                             if word not in REM_QUERY_WORDS and word not in named]
+    return intent
+
+def answerable_locally(intent):
+    """Whether the question reduces to the extracted filters, so a SQL answer is the whole answer"""
+    return (intent['intent'] is not None and not intent['open_ended']
+            and not intent['entity_ids'] and not intent['unexplained'])
+
+def subject_entity(text):
+    """donors, patients or matches from the question's subject noun, or None when it names none.
+
+    The first entity noun outside an object phrase wins, so "find donors for
+    critical patients" is about donors; if every noun is an object, the first
+    one is used.
+    """
+    first = None
+    in_object = False
+    for word in QUESTION_WORD_RE.findall(text):
+        entity = ENTITY_NOUNS.get(word)
+        if entity:
+            if not in_object:
+                return entity
+            first = first or entity
+        elif word in OBJECT_PREPOSITIONS:
+            in_object = True
+        elif word in CLAUSE_WORDS:
+            in_object = False
+    return first
+
+# Words that never identify a hospital on their own: generic name parts, REM vocabulary and common English
+HOSPITAL_COMMON_WORDS = {
+    'hospital', 'hospitals', 'medical', 'medicine', 'centre', 'center', 'institute', 'clinic', 'clinics',
+    'health', 'healthcare', 'care', 'general', 'city', 'national', 'research', 'science', 'sciences',
+    'super', 'speciality', 'specialty', 'multi', 'memorial', 'trust', 'foundation', 'college', 'university',
+    'heart', 'kidney', 'liver', 'lung', 'lungs', 'pancreas', 'cornea', 'eye', 'organ', 'organs', 'blood',
+    'transplant', 'donor', 'donors', 'patient', 'patients', 'recipient', 'recipients', 'match', 'matches',
+    'critical', 'urgent', 'urgency', 'waitlist', 'waiting', 'score', 'active', 'new', 'old', 'life',
+    'the', 'and', 'for', 'with', 'from', 'how', 'many', 'what', 'which', 'who', 'show', 'list', 'find',
+    'count', 'total', 'number', 'are', 'there', 'any', 'all', 'our', 'mine', 'near', 'about', 'have',
+    'has', 'not', 'help', 'please', 'need', 'needs', 'can', 'you', 'give', 'get', 'tell', 'good', 'best',
+    'hope', 'grace', 'max', 'min', 'top', 'first', 'last', 'today', 'now', 'here', 'one', 'two', 'three',
+}
+# Shorter tokens (ab, of, in) are too ambiguous to name a hospital
+MIN_HOSPITAL_TOKEN = 3
+
+def match_hospital(text, hospitals):
+    """Hospital named in the text: its full name, or a distinctive name word no other hospital shares.
+
+    Distinctive words are at least MIN_HOSPITAL_TOKEN letters and are neither
+    common words nor city names, so "Show the kidney donors" is not scoped to
+    "The Heart Institute" and "donors in Noida" is not scoped to "Max Hospital Noida".
+    """
+    for row in hospitals:
+        if re.search(r'\b' + re.escape(row['hospital_name'].lower()) + r'\b', text):
+            return row
+    cities = {city.lower() for city in CITY_COORDINATES} | {(row['location_city'] or '').lower() for row in hospitals}
+    owners = {}
+    for row in hospitals:
+        for word in set(QUESTION_WORD_RE.findall(row['hospital_name'].lower())):
+            if len(word) >= MIN_HOSPITAL_TOKEN and word not in HOSPITAL_COMMON_WORDS and word not in cities:
+                owners.setdefault(word, []).append(row)
+    words = set(QUESTION_WORD_RE.findall(text))
+    for word, rows in owners.items():
+        if len(rows) == 1 and word in words:
+            return rows[0]
+    return None
+
+def build_intent_query(intent):
+    """One parametrized statement for an intent: a count, or the top rows with the total alongside"""
+    if intent['intent'] == 'patients':
+        table, organ_column, order = 'patients', 'organ_needed', WAITLIST_ORDER
+        columns = 'patient_id as id, name, organ_needed as organ, blood_group, location, urgency_score'
+        entity_type, id_column = 'patient', 'patient_id'
+    else:
+        table, organ_column, order = 'donors', 'organ_type', 'created_at DESC'
+        columns = 'donor_id as id, name, organ_type as organ, blood_group, location, NULL as urgency_score'
+        entity_type, id_column = 'donor', 'donor_id'
+
+    clauses = ["status = 'active'"]
+    if table == 'donors':
+        # Donors pledged to the paired exchange are not available to anyone else
+        clauses.append(OPEN_DONOR_FILTER)
+    params = []
+    source = table
+    exclude = intent.get('exclude_contraindicated') and table == 'donors'
+    clinical = intent.get('clinical') or []
+    if clinical or exclude:
+        # Typed markers are maintained by triggers, so clinical filters stay inside SQLite
+        source = (f"{table} JOIN clinical_markers m "
+                  f"ON m.entity_type = '{entity_type}' AND m.entity_id = {table}.{id_column}")
+        for column, bound, value in clinical:
+            clauses.append(f'm.{column} {BOUND_SQL[bound]} ?')
+            params.append(value)
+        if exclude:
+            clauses.append('m.has_malignancy = 0 AND m.has_active_infection = 0')
+    if intent['organ']:
+        clauses.append(f'{organ_column} = ?')
+        params.append(intent['organ'])
+    if intent['blood_group']:
+        clauses.append('blood_group = ?')
+        params.append(intent['blood_group'])
+    if intent['city']:
+        aliases = city_aliases(intent['city'])
+        clauses.append('(' + ' OR '.join('location LIKE ?' for _ in aliases) + ')')
+        params.extend(f'%{alias}%' for alias in aliases)
+    if intent['hospital_id'] is not None:
+        clauses.append('hospital_id = ?')
+        params.append(intent['hospital_id'])
+    if table == 'patients' and intent['urgency_min'] is not None:
+        clauses.append('urgency_score >= ?')
+        params.append(intent['urgency_min'])
+    if table == 'patients' and intent['urgency_max'] is not None:
+        clauses.append('urgency_score <= ?')
+        params.append(intent['urgency_max'])
+
+    where = ' AND '.join(clauses)
+    if intent['count_only']:
+        return f'SELECT COUNT(*) as total FROM {source} WHERE {where}', params
+    return f'''
+        SELECT {columns}, COUNT(*) OVER () as total
+        FROM {source}
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT ?
+    ''', params + [REM_RESULT_LIMIT]
+
+def describe_intent(intent):
+    """Human phrase for the filters, e.g. 'critical O+ Kidney patients in Mumbai'"""
+    words = []
+    if intent['intent'] == 'patients':
+        if intent['urgency_min'] == CRITICAL_URGENCY and intent['urgency_max'] is None:
+            words.append('critical')
+    if intent['blood_group']:
+        words.append(intent['blood_group'])
+    if intent['organ']:
+        words.append(intent['organ'])
+    words.append(intent['intent'])
+    phrase = ' '.join(words)
+    if intent['intent'] == 'patients' and intent['urgency_min'] is not None and intent['urgency_min'] == intent['urgency_max']:
+        phrase += f" with urgency {intent['urgency_min']}"
+    elif intent['intent'] == 'patients':
+        if intent['urgency_min'] is not None and intent['urgency_min'] != CRITICAL_URGENCY:
+            phrase += f" with urgency ≥ {intent['urgency_min']}"
+        if intent['urgency_max'] is not None:
+            phrase += f"{' and' if intent['urgency_min'] is not None else ' with urgency'} ≤ {intent['urgency_max']}"
+    for column, bound, value in intent.get('clinical') or []:
+        phrase += f" with {CLINICAL_LABELS[column]} {BOUND_SYMBOLS[bound]} {value:g}"
+    if intent.get('exclude_contraindicated') and intent['intent'] == 'donors':
+        phrase += ' without cancer or active infection'
+    if intent['city']:
+        phrase += f" in {intent['city'].title()}"
+    if intent['hospital_name']:
+        phrase += f" at {intent['hospital_name']}"
+    elif intent['hospital_id'] is not None:
+        phrase += ' at your hospital'
+    return phrase
+
+def answer_rem_intent(conn, intent):
+    """Answer a parsed patients/donors intent from the database"""
+    sql, params = build_intent_query(intent)
+    rows = conn.execute(sql, params).fetchall()
+    phrase = describe_intent(intent)
+    total = rows[0]['total'] if rows else 0
+
+    if intent['count_only']:
+        return f"There are {total} active {phrase}."
+    if not rows:
+        return f"No active {phrase} found currently."
+
+    response = f"Found {total} active {phrase}" + (f" (top {len(rows)}):\n" if total > len(rows) else ":\n")
+    for row in rows:
+        line = f"• {row['name']} ({row['id']}) - {row['blood_group']} {row['organ']} - {row['location']}"
+        if row['urgency_score'] is not None:
+            line += f" - Urgency: {row['urgency_score']}%"
+        response += line + '\n'
+    return response
+
+def answer_entity_lookup(conn, entity_ids):
+    """Fallback answer for questions about specific donors/patients: their basic record"""
+    lines = []
+    for entity_id in entity_ids[:REM_RESULT_LIMIT]:
+        row = conn.execute('''
+            SELECT patient_id as id, 'Patient' as kind, name, organ_needed as organ, blood_group, location,
+                   urgency_score, status
+            FROM patients WHERE patient_id = ?
+            UNION ALL
+            SELECT donor_id, 'Donor', name, organ_type, blood_group, location, NULL, status
+            FROM donors WHERE donor_id = ?
+        ''', (entity_id, entity_id)).fetchone()
+        if not row:
+            lines.append(f"• {entity_id}: no donor or patient with this ID")
+            continue
+        line = (f"• {row['kind']} {row['name']} ({row['id']}) - {row['blood_group']} {row['organ']} - "
+                f"{row['location']} - Status: {row['status']}")
+        if row['urgency_score'] is not None:
+            line += f" - Urgency: {row['urgency_score']}%"
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def load_rem_hospitals(conn):
+    return conn.execute('SELECT id, hospital_name, location_city FROM hospitals').fetchall()
+
+def answer_match_stats(conn, hospital_id, version=None):
+    """Match summary from the cached context section (scores come from live matching, not the matches table)"""
+    if version is None:
+        version = current_context_version()
+    section = context_cache.get_or_build(
+        (hospital_id, 'matches'), version, lambda: build_match_section(conn, hospital_id))
+    if not section['total_matches']:
+        return "No matches found yet. Add patients and donors to generate matches."
+    response = (f"Your hospital has {section['total_matches']} matches with an average score of "
+                f"{section['avg_match_score']:.1f}%.\n")
+    for match in section['recent_matches']:
+        response += (f"• {match['patient_name']} ({match['patient_id']}) ↔ {match['donor_name']} "
+                     f"({match['donor_id']}) - {match['organ']} - Score: {match['score']}%\n")
+    return response
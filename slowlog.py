@@ -0,0 +1,173 @@
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Statements whose execute() takes at least this long are recorded
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_BUFFER = 200
+SLOW_QUERY_LOG_FILE = os.environ.get(
+    'SLOW_QUERY_LOG_FILE', os.path.join(os.path.dirname(BASE_DIR), 'lifelink_logs', 'slow_queries.log'))
+SLOW_QUERY_LOG_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+# Statement kinds EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+PLAN_CACHE_SIZE = 256
+# Frames from these files are plumbing, not the call site worth reporting
+SKIP_FILES = ('metrics.py', 'slowlog.py')
+
+
+def parameter_shape(value):
+    """Type (and size) of a bound parameter without its value, which may be patient data"""
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return f'str[{len(value)}]'
+    if isinstance(value, (bytes, bytearray)):
+        return f'bytes[{len(value)}]'
+    return type(value).__name__
+
+def parameters_shape(parameters):
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: parameter_shape(value) for key, value in parameters.items()}
+    return [parameter_shape(value) for value in parameters]
+
+def call_site(depth=3):
+    """'file:line function' for the nearest repo frames outside the DB plumbing, innermost first"""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BASE_DIR) and os.path.basename(filename) not in SKIP_FILES:
+            frames.append(f'{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}')
+        frame = frame.f_back
+    return ' <- '.join(frames) or 'unknown'
+
+
+class SlowQueryLog:
+    """Records slow statements with their plan to a ring buffer and rotating JSON-lines files.
+
+    The ring buffer is per process. Each worker writes its own file
+    (slow_queries.<pid>.log), because rotation is not safe across processes;
+    the admin view reads all of them by default. Plans are cached per statement
+    text so a query that stays slow is only EXPLAINed once per process.
+    """
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, buffer_size=SLOW_QUERY_BUFFER, log_file=SLOW_QUERY_LOG_FILE):
+        self.threshold = threshold_ms / 1000.0
+        self.log_file = log_file
+        self._entries = deque(maxlen=buffer_size)
+        self._plans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._logger = None
+        self._logger_pid = None
+
+    @property
+    def explaining(self):
+        """True while this thread runs an EXPLAIN, so instrumentation can ignore it"""
+        return getattr(self._local, 'explaining', False)
+
+    def observe(self, sql, parameters, elapsed, explain_with):
+        """Called after each timed statement; ``explain_with(sql, params)`` runs a statement uninstrumented"""
+        if elapsed < self.threshold or self.explaining:
+            return
+        statement = ' '.join(sql.split())
+        entry = {
+            'at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement,
+            'parameters': parameters_shape(parameters),
+            'call_site': call_site(),
+            'pid': os.getpid(),
+            'plan': self._plan(statement, sql, parameters, explain_with),
+        }
+        with self._lock:
+            self._entries.append(entry)
+        self._write(entry)
+
+    def recent(self, limit=50):
+        with self._lock:
+            return list(self._entries)[-limit:][::-1]
+
+    def process_log_file(self, pid=None):
+        """This process's log file: slow_queries.log becomes slow_queries.<pid>.log"""
+        root, ext = os.path.splitext(self.log_file)
+        return f'{root}.{pid or os.getpid()}{ext}'
+
+    def read_file(self, limit=50):
+        """Newest entries across every worker's log file (current segments only)"""
+        if not self.log_file:
+            return []
+        root, ext = os.path.splitext(self.log_file)
+        entries = []
+        for path in glob.glob(f'{glob.escape(root)}.*{ext}'):
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    lines = deque(handle, maxlen=limit)
+            except OSError:
+                continue
+            # Newest first, so the stable sort keeps entries from the same second in order
+            for line in reversed(lines):
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        entries.sort(key=lambda entry: entry.get('at', ''), reverse=True)
+        return entries[:limit]
+
+    def _plan(self, statement, sql, parameters, explain_with):
+        if statement.split(' ', 1)[0].upper() not in EXPLAINABLE:
+            return None
+        with self._lock:
+            cached = self._plans.get(statement)
+        if cached is not None:
+            return cached
+        self._local.explaining = True
+        try:
+            # executemany passes no single parameter set; NULLs keep the plan shape
+            params = parameters if parameters is not None else [None] * sql.count('?')
+            rows = explain_with(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[3] for row in rows]
+        except Exception as explain_error:
+            plan = [f'EXPLAIN failed: {explain_error}']
+        finally:
+            self._local.explaining = False
+        with self._lock:
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.pop(next(iter(self._plans)))
+            self._plans[statement] = plan
+        return plan
+
+    def _write(self, entry):
+        if not self.log_file:
+            return
+        try:
+            # Re-opened after a fork so every worker rotates only its own file
+            if self._logger_pid != os.getpid():
+                os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+                logger = logging.getLogger(f'lifelink.slow_queries.{os.getpid()}')
+                logger.propagate = False
+                if not logger.handlers:
+                    handler = RotatingFileHandler(self.process_log_file(), maxBytes=SLOW_QUERY_LOG_BYTES,
+                                                  backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+                self._logger = logger
+                self._logger_pid = os.getpid()
+            self._logger.info(json.dumps(entry, default=str))
+        except OSError:
+            # Logging must never break the query that triggered it
+            self.log_file = None
+
+
+slow_query_log = SlowQueryLog()
@@ -429,11 +429,22 @@ function sendRemMessage() {
     // Add user message
     addRemMessage(userMessage, 'user');
     
-    // Show typing indicator
+    // Show typing indicator; streamed text replaces it as it arrives
     const typingId = addRemMessage('Thinking...', 'bot');
     
-    // Send to backend
-    fetch('/api/chat', {
+    const request = window.ReadableStream && window.TextDecoder
+        ? streamRemReply(userMessage, typingId)
+        : fetchRemReply(userMessage, typingId);
+    
+    request.catch(() => {
+        const typingMsg = document.getElementById(typingId);
+        if (typingMsg) typingMsg.remove();
+        addRemMessage('Sorry, I\'m having trouble connecting. Please check your API keys in Settings.', 'bot');
+    });
+}
+
+function fetchRemReply(userMessage, typingId) {
+    return fetch('/api/chat', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -442,25 +453,77 @@ function sendRemMessage() {
     })
     .then(response => response.json())
     .then(data => {
-        // Remove typing indicator
         const typingMsg = document.getElementById(typingId);
-        if (typingMsg) typingMsg.remove();
-        
-        // Add bot response
-        addRemMessage(data.response || 'I apologize, but I encountered an error. Please try again.', 'bot');
+        if (typingMsg) typingMsg.textContent = data.response || 'I apologize, but I encountered an error. Please try again.';
+    });
+}
+
+function streamRemReply(userMessage, typingId) {
+    // EventSource cannot POST, so the SSE frames are parsed from the fetch body
+    return fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ message: userMessage })
     })
-    .catch(error => {
-        const typingMsg = document.getElementById(typingId);
-        if (typingMsg) typingMsg.remove();
-        addRemMessage('Sorry, I\'m having trouble connecting. Please check your API keys in Settings.', 'bot');
+    .then(response => {
+        if (!response.ok || !response.body) {
+            return fetchRemReply(userMessage, typingId);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const messages = document.getElementById('rem-messages');
+        let buffer = '';
+        let text = '';
+        
+        const handleFrame = (frame) => {
+            let eventType = 'message';
+            const dataLines = [];
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            });
+            if (!dataLines.length) return;
+            const data = JSON.parse(dataLines.join('\n'));
+            const bubble = document.getElementById(typingId);
+            if (!bubble) return;
+            
+            if (eventType === 'delta') {
+                text += data.text;
+                bubble.textContent = text;
+            } else if (eventType === 'error') {
+                bubble.textContent = text ? `${text}\n\n${data.message}` : data.message;
+            } else {
+                return;
+            }
+            if (messages) messages.scrollTop = messages.scrollHeight;
+        };
+        
+        const pump = () => reader.read().then(({ done, value }) => {
+            if (done) {
+                if (buffer.trim()) handleFrame(buffer);
+                return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            frames.forEach(handleFrame);
+            return pump();
+        });
+        return pump();
     });
 }
 
+let remMessageCount = 0;
+
 function addRemMessage(text, type) {
     const messages = document.getElementById('rem-messages');
     if (!messages) return;
     
-    const messageId = 'rem-msg-' + Date.now();
+    // Counter keeps ids unique when the user message and its reply bubble share a millisecond
+    const messageId = 'rem-msg-' + Date.now() + '-' + (++remMessageCount);
     const messageDiv = document.createElement('div');
     messageDiv.id = messageId;
     messageDiv.className = `rem-message ${type}`;
@@ -489,7 +552,6 @@ onReady(() => {
 function setupNotifications() {
     const btn = document.getElementById('notifications-btn');
     const dropdown = document.getElementById('notifications-dropdown');
-    const countEl = document.getElementById('notification-count');
     
     if (!btn || !dropdown) return;
     
@@ -497,6 +559,11 @@ function setupNotifications() {
         e.stopPropagation();
         dropdown.style.display = dropdown.style.display === 'none' ? 'block' : 'none';
         if (dropdown.style.display === 'block') {
+            // Relative times move on even when the data does not
+            renderNotifications(window.currentNotifications || []);
+        }
+        // The stream keeps the list current; only refetch when running on the polling fallback
+        if (dropdown.style.display === 'block' && !window.notificationStreamActive) {
             loadNotifications();
         }
     });
@@ -508,85 +575,192 @@ function setupNotifications() {
         }
     });
     
-    // Mark all read
+    // Mark all read (stored server-side so it follows the hospital across devices)
     const markAllRead = document.getElementById('mark-all-read');
     if (markAllRead) {
         markAllRead.addEventListener('click', () => {
-            persistSeenNotifications(window.latestNotificationIds || []);
-            const list = document.getElementById('notifications-list');
-            if (list) {
-                list.innerHTML = '<div style="padding: 32px; text-align: center; color: var(--text-muted);">No new notifications</div>';
-            }
-            if (countEl) {
-                countEl.style.display = 'none';
-            }
+            markNotificationsRead({ all: true });
+            (window.currentNotifications || []).forEach(n => { n.read = true; });
+            renderNotifications(window.currentNotifications || []);
         });
     }
     
-    // Load notifications only once per page load
+    // Load notifications only once per page load; the stream sends its own snapshot
     if (!window.notificationsLoaded) {
-        loadNotifications();
         window.notificationsLoaded = true;
+        if (window.EventSource) {
+            connectNotificationStream();
+        } else {
+            loadNotifications();
+            startNotificationPolling();
+        }
     }
 }
 
-function getSeenNotifications() {
+const NOTIFICATION_POLL_INTERVAL_MS = 60000;
+
+// Push channel: the server sends a snapshot on connect and deltas when data changes.
+// EventSource reconnects with Last-Event-ID on its own; polling is only the fallback.
+function connectNotificationStream() {
+    const source = new EventSource('/api/notifications/stream');
+    window.notificationStreamActive = true;
+
+    source.addEventListener('snapshot', (event) => {
+        const data = JSON.parse(event.data);
+        window.currentNotifications = [];
+        mergeNotifications(data.notifications || []);
+    });
+
+    source.addEventListener('notifications', (event) => {
+        const data = JSON.parse(event.data);
+        mergeNotifications(data.notifications || []);
+    });
+
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+            window.notificationStreamActive = false;
+            loadNotifications();
+            startNotificationPolling();
+        }
+    };
+}
+
+function startNotificationPolling() {
+    if (window.notificationPollTimer) return;
+    window.notificationPollTimer = setInterval(loadNotifications, NOTIFICATION_POLL_INTERVAL_MS);
+}
+
+function markNotificationsRead(payload) {
+    return fetch('/api/notifications/read', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload),
+        keepalive: true
+    }).catch(() => {});
+}
+
+// Newest first; the cursor is the highest notification id seen so far
+function mergeNotifications(incoming) {
+    const known = new Set((window.currentNotifications || []).map(n => n.id));
+    const fresh = incoming.filter(n => !known.has(n.id));
+    window.currentNotifications = fresh.concat(window.currentNotifications || [])
+        .sort((a, b) => b.id - a.id);
+    if (window.currentNotifications.length) {
+        window.notificationCursor = Math.max(window.notificationCursor || 0, window.currentNotifications[0].id);
+    }
+    renderNotifications(window.currentNotifications);
+}
+
+function getCachedNotifications() {
     try {
-        return new Set(JSON.parse(localStorage.getItem('lifelinkSeenNotifications') || '[]'));
+        return JSON.parse(sessionStorage.getItem('lifelinkNotificationsCache') || 'null');
     } catch {
-        return new Set();
+        return null;
     }
 }
 
-function persistSeenNotifications(ids) {
-    if (!ids || !ids.length) return;
-    const seen = getSeenNotifications();
-    ids.forEach(id => seen.add(id));
-    localStorage.setItem('lifelinkSeenNotifications', JSON.stringify(Array.from(seen)));
+// Revalidate with If-None-Match so unchanged data comes back as an empty 304
+async function fetchNotifications() {
+    const cached = getCachedNotifications();
+    const headers = {};
+    if (cached && cached.etag) {
+        headers['If-None-Match'] = cached.etag;
+    }
+
+    const response = await fetch('/api/notifications', { headers });
+    if (response.status === 304 && cached) {
+        return cached.notifications || [];
+    }
+    if (!response.ok) {
+        throw new Error(`Notifications request failed: ${response.status}`);
+    }
+
+    const data = await response.json();
+    const notifications = data.notifications || [];
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        sessionStorage.setItem('lifelinkNotificationsCache', JSON.stringify({ etag, notifications }));
+    }
+    return notifications;
 }
 
+// First load pulls the latest page; later polls only ask for deltas after the cursor
 async function loadNotifications() {
     const list = document.getElementById('notifications-list');
-    const countEl = document.getElementById('notification-count');
-    
     if (!list) return;
     
     try {
-        const response = await fetch('/api/notifications');
-        const data = await response.json();
-        const notifications = data.notifications || [];
-        window.latestNotificationIds = notifications.map(n => n.id);
+        if (window.notificationCursor === undefined) {
+            window.currentNotifications = [];
+            window.notificationCursor = 0;
+            mergeNotifications(await fetchNotifications());
+            return;
+        }
 
-        const seen = getSeenNotifications();
-        const freshNotifications = notifications.filter(n => !seen.has(n.id));
-        
-        if (freshNotifications.length > 0) {
-            list.innerHTML = freshNotifications.map(n => `
-                <div style="padding: 12px 16px; border-bottom: 1px solid var(--border); cursor: pointer; transition: background 0.15s;" 
-                     onmouseover="this.style.background='var(--bg-secondary)'" 
-                     onmouseout="this.style.background=''" 
-                     onclick="handleNotificationClick('${n.id}', '${n.link}')">
-                    <div style="font-size: 14px; font-weight: 500; margin-bottom: 4px; color: var(--text-primary);">${n.title}</div>
-                    <div style="font-size: 12px; color: var(--text-muted);">${n.time}</div>
-                </div>
-            `).join('');
-            
-            if (countEl) {
-                countEl.textContent = freshNotifications.length;
-                countEl.style.display = 'block';
-            }
-        } else {
-            list.innerHTML = '<div style="padding: 32px; text-align: center; color: var(--text-muted);">You\'re all caught up</div>';
-            if (countEl) {
-                countEl.style.display = 'none';
+        let hasMore = true;
+        while (hasMore) {
+            const response = await fetch(`/api/notifications?since=${window.notificationCursor}`);
+            if (response.status === 304) break;
+            const data = await response.json();
+            mergeNotifications(data.notifications || []);
+            if (data.cursor) {
+                window.notificationCursor = Math.max(window.notificationCursor, data.cursor);
             }
+            hasMore = Boolean(data.has_more);
         }
     } catch (error) {
         list.innerHTML = '<div style="padding: 32px; text-align: center; color: var(--text-muted);">Error loading notifications</div>';
     }
 }
 
+// Same wording as the server's humanize_timestamp; created_at is a UTC 'YYYY-MM-DD HH:MM:SS'
+function formatNotificationTime(createdAt) {
+    if (!createdAt) return 'Just now';
+    const eventTime = new Date(String(createdAt).replace(' ', 'T') + 'Z');
+    if (isNaN(eventTime)) return String(createdAt);
+    const seconds = Math.max(Math.floor((Date.now() - eventTime.getTime()) / 1000), 0);
+    if (seconds < 60) return 'Just now';
+    if (seconds < 3600) return `${Math.floor(seconds / 60)} min ago`;
+    if (seconds < 86400) return `${Math.floor(seconds / 3600)} hr ago`;
+    if (seconds < 604800) {
+        const days = Math.floor(seconds / 86400);
+        return `${days} day${days > 1 ? 's' : ''} ago`;
+    }
+    return eventTime.toLocaleDateString('en-GB', { day: '2-digit', month: 'short', year: 'numeric', timeZone: 'UTC' });
+}
+
+function renderNotifications(notifications) {
+    const list = document.getElementById('notifications-list');
+    const countEl = document.getElementById('notification-count');
+    
+    if (!list) return;
+    
+    const freshNotifications = notifications.filter(n => !n.read);
+    
+    if (freshNotifications.length > 0) {
+        list.innerHTML = freshNotifications.map(n => `
+            <div style="padding: 12px 16px; border-bottom: 1px solid var(--border); cursor: pointer; transition: background 0.15s;" 
+                 onmouseover="this.style.background='var(--bg-secondary)'" 
+                 onmouseout="this.style.background=''" 
+                 onclick="handleNotificationClick(${n.id}, '${n.link}')">
+                <div style="font-size: 14px; font-weight: 500; margin-bottom: 4px; color: var(--text-primary);">${n.title}</div>
+                <div style="font-size: 12px; color: var(--text-muted);">${formatNotificationTime(n.created_at)}</div>
+            </div>
+        `).join('');
+        
+        if (countEl) {
+            countEl.textContent = freshNotifications.length;
+            countEl.style.display = 'block';
+        }
+    } else {
+        list.innerHTML = '<div style="padding: 32px; text-align: center; color: var(--text-muted);">You\'re all caught up</div>';
+        if (countEl) {
+            countEl.style.display = 'none';
+        }
+    }
+}
+
 function handleNotificationClick(id, link) {
-    persistSeenNotifications([id]);
+    markNotificationsRead({ ids: [id] });
     window.location.href = link;
 }
\ No newline at end of file
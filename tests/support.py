@@ -0,0 +1,46 @@
+import atexit
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every test module shares one throwaway database: app, models and database read
+# these paths once, at import time
+workdir = tempfile.TemporaryDirectory()
+atexit.register(workdir.cleanup)
+os.environ['LIFELINK_DB_PATH'] = os.path.join(workdir.name, 'lifelink.db')
+os.environ['SLOW_QUERY_LOG_FILE'] = os.path.join(workdir.name, 'slow_queries.log')
+# Nothing listens on the discard port, so LLM calls fail fast unless a test points them at a stub
+os.environ.setdefault('GEMINI_API_BASE', 'http://127.0.0.1:9')
+
+import app as app_module
+
+app_module.app.config['TESTING'] = True
+
+DONOR_FORM = {
+    'name': 'Test Donor', 'dob': '1980-01-01', 'gender': 'Male', 'blood_group': 'O+', 'contact': '9000000000',
+    'location': 'Mumbai', 'weight_kg': '70', 'height_cm': '175', 'organ_type': 'Kidney',
+    'doctor_assigned': 'Dr. Test', 'hla_a1': 'A*01', 'hla_a2': 'A*02', 'hla_b1': 'B*07', 'hla_b2': 'B*08',
+    'hla_dr1': 'DR*01', 'hla_dr2': 'DR*03', 'serum_creatinine': '1.0', 'kidney_function': '90',
+}
+PATIENT_FORM = {
+    'name': 'Test Patient', 'dob': '1985-01-01', 'gender': 'Female', 'blood_group': 'O+', 'contact': '9000000001',
+    'location': 'Mumbai', 'weight_kg': '60', 'height_cm': '165', 'organ_needed': 'Kidney', 'urgency_score': '70',
+    'doctor_assigned': 'Dr. Test', 'hla_a1': 'A*01', 'hla_a2': 'A*03', 'hla_b1': 'B*07', 'hla_b2': 'B*09',
+    'hla_dr1': 'DR*01', 'hla_dr2': 'DR*07', 'dialysis_status': 'yes', 'dialysis_duration_months': '24',
+}
+
+
+def logged_in_client(username='apollo_mumbai', password='apollo123'):
+    client = app_module.app.test_client()
+    client.post('/login', data={'username': username, 'password': password})
+    return client
+
+
+def latest_id(table, column, name):
+    """ID of the newest row with this name, for records created through the forms"""
+    conn = app_module.get_db()
+    row = conn.execute(f'SELECT {column} FROM {table} WHERE name = ? ORDER BY id DESC LIMIT 1', (name,)).fetchone()
+    conn.close()
+    return row[0] if row else None
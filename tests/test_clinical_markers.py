@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+
+import support
+
+import database
+import models
+
+HOSPITAL_ID = 2
+
+HLA = {'hla_a': ['A*01', 'A*02'], 'hla_b': ['B*07', 'B*08'], 'hla_dr': ['DR*01', 'DR*03']}
+DONOR = {
+    'name': 'Marker Donor', 'dob': '1980-01-01', 'gender': 'Male', 'blood_group': 'A+', 'contact': '9000000004',
+    'location': 'Kolkata', 'weight_kg': 70.0, 'height_cm': 175.0, 'organ_type': 'Kidney',
+    'organ_metrics': {'hla_typing': HLA}, 'medical_history': [], 'doctor_assigned': 'Dr. Marker',
+}
+PATIENT = {
+    'name': 'Marker Patient', 'dob': '1975-06-01', 'gender': 'Female', 'blood_group': 'A+', 'contact': '9000000005',
+    'location': 'Kolkata', 'weight_kg': 58.0, 'height_cm': 160.0, 'organ_needed': 'Liver',
+    'organ_metrics': {'meld_score': 22}, 'medical_history': ['Diabetes'], 'urgency_score': 40,
+    'doctor_assigned': 'Dr. Marker',
+}
+
+
+def markers(entity_type, entity_id, db_path=None):
+    conn = database.get_db(db_path)
+    row = conn.execute('SELECT * FROM clinical_markers WHERE entity_type = ? AND entity_id = ?',
+                       (entity_type, entity_id)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+class ClinicalMarkerTriggerTest(unittest.TestCase):
+
+    def test_donor_insert_update_delete(self):
+        donor_id = models.add_donor(dict(DONOR), HOSPITAL_ID)
+        row = markers('donor', donor_id)
+        self.assertEqual((row['hla_a1'], row['hla_dr2']), ('A*01', 'DR*03'))
+        self.assertEqual(row['has_malignancy'], 0)
+
+        models.update_donor(donor_id, dict(DONOR, organ_metrics={'hla_typing': dict(HLA, hla_a=['A*11', 'A*24'])},
+                                           medical_history=['Malignancy']), HOSPITAL_ID)
+        row = markers('donor', donor_id)
+        self.assertEqual((row['hla_a1'], row['hla_a2']), ('A*11', 'A*24'))
+        self.assertEqual(row['has_malignancy'], 1)
+
+        conn = models.get_db()
+        conn.execute('DELETE FROM donors WHERE donor_id = ?', (donor_id,))
+        conn.commit()
+        conn.close()
+        self.assertIsNone(markers('donor', donor_id))
+
+    def test_patient_insert_update_delete(self):
+        patient_id = models.add_patient(dict(PATIENT), HOSPITAL_ID)
+        row = markers('patient', patient_id)
+        self.assertEqual(row['meld_score'], 22)
+        self.assertEqual((row['has_malignancy'], row['has_active_infection']), (0, 0))
+
+        models.update_patient(patient_id, dict(PATIENT, organ_metrics={'meld_score': 31},
+                                               medical_history=['Active Infection']), HOSPITAL_ID)
+        row = markers('patient', patient_id)
+        self.assertEqual(row['meld_score'], 31)
+        self.assertEqual(row['has_active_infection'], 1)
+
+        conn = models.get_db()
+        conn.execute('DELETE FROM patients WHERE patient_id = ?', (patient_id,))
+        conn.commit()
+        conn.close()
+        self.assertIsNone(markers('patient', patient_id))
+
+
+class ClinicalMarkerBackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, 'markers.db')
+        database.init_db(self.db_path)
+
+    def execute(self, *statements):
+        conn = database.get_db(self.db_path)
+        for sql, params in statements:
+            conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def insert_patient(self, patient_id, organ_metrics):
+        self.execute(('''INSERT INTO patients (patient_id, name, dob, gender, blood_group, contact, location, weight_kg,
+                                               height_cm, organ_needed, urgency_score, hospital_id, doctor_assigned,
+                                               organ_metrics, medical_history)
+                         VALUES (?, 'Old Patient', '1970-01-01', 'Male', 'O+', '9000000006', 'Pune', 70, 170,
+                                 'Liver', 50, 1, 'Dr. Old', ?, ?)''',
+                      (patient_id, json.dumps(organ_metrics), json.dumps(['Active Cancer']))))
+
+    def counts(self):
+        conn = database.get_db(self.db_path)
+        count = conn.execute('SELECT COUNT(*) FROM clinical_markers').fetchone()[0]
+        patients = conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+        conn.close()
+        return count, patients
+
+    def test_rows_written_before_the_table_are_backfilled_once(self):
+        # A database from before clinical_markers existed
+        self.execute(*[(f'DROP TRIGGER trg_{table}_markers_{event}', ())
+                       for table in ('donors', 'patients') for event in ('insert', 'update', 'delete')],
+                     ('DROP TABLE clinical_markers', ()))
+        self.insert_patient('PT-OLD-1', {'meld_score': 35})
+
+        database.init_db(self.db_path)
+        row = markers('patient', 'PT-OLD-1', self.db_path)
+        self.assertEqual(row['meld_score'], 35)
+        self.assertEqual(row['has_malignancy'], 1)
+        self.assertEqual(self.counts(), (1, 1))
+
+        database.init_db(self.db_path)
+        self.assertEqual(markers('patient', 'PT-OLD-1', self.db_path), row)
+        self.assertEqual(self.counts(), (1, 1))
+
+        # The recreated triggers still fire exactly once per row
+        self.insert_patient('PT-OLD-2', {'meld_score': 12})
+        self.assertEqual(markers('patient', 'PT-OLD-2', self.db_path)['meld_score'], 12)
+        self.assertEqual(self.counts(), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
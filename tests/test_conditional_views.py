@@ -0,0 +1,103 @@
+import unittest
+
+from support import logged_in_client, latest_id, DONOR_FORM, PATIENT_FORM
+
+import models
+
+
+def fresh_client():
+    """Logged-in client with no pending flash messages, which would bypass revalidation"""
+    client = logged_in_client()
+    client.get('/dashboard')
+    return client
+
+
+class ConditionalViewTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        client = logged_in_client()
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Conditional Donor'))
+        client.post('/add-patient', data=dict(PATIENT_FORM, name='Conditional Patient'))
+        cls.donor_id = latest_id('donors', 'donor_id', 'Conditional Donor')
+        cls.patient_id = latest_id('patients', 'patient_id', 'Conditional Patient')
+
+    def test_sends_validators(self):
+        response = fresh_client().get(f'/donor/{self.donor_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertIn('Cookie', response.headers['Vary'])
+
+    def test_matching_etag_is_not_modified(self):
+        client = fresh_client()
+        etag = client.get(f'/donor/{self.donor_id}').headers['ETag']
+        response = client.get(f'/donor/{self.donor_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_if_modified_since_is_not_modified(self):
+        client = fresh_client()
+        last_modified = client.get(f'/donor/{self.donor_id}').headers['Last-Modified']
+        response = client.get(f'/donor/{self.donor_id}', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_the_etag(self):
+        client = fresh_client()
+        etag = client.get(f'/donor/{self.donor_id}').headers['ETag']
+        client.post(f'/edit-donor/{self.donor_id}', data=dict(DONOR_FORM, name='Conditional Donor', contact='9000000099'))
+        client.get('/dashboard')
+        response = client.get(f'/donor/{self.donor_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn(b'9000000099', response.data)
+
+    def test_patient_page_changes_with_the_network(self):
+        client = fresh_client()
+        etag = client.get(f'/patient/{self.patient_id}').headers['ETag']
+        # A new donor elsewhere can change the patient's suggested matches
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Network Donor'))
+        client.get('/dashboard')
+        response = client.get(f'/patient/{self.patient_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_hospital_gets_its_own_etag(self):
+        etag = fresh_client().get(f'/donor/{self.donor_id}').headers['ETag']
+        other = logged_in_client('fortis_delhi', 'fortis123')
+        other.get('/dashboard')
+        response = other.get(f'/donor/{self.donor_id}', headers={'If-None-Match': etag})
+        self.assertNotEqual(response.status_code, 304)
+
+
+class ConditionalNotificationsTest(unittest.TestCase):
+
+    def test_payload_has_no_relative_time(self):
+        conn = models.get_db()
+        models.insert_notification(conn, 1, 'match', 'conditional-a', 'Conditional A', '/matches')
+        conn.commit()
+        conn.close()
+        body = fresh_client().get('/api/notifications').get_json()
+        self.assertTrue(body['notifications'])
+        for item in body['notifications']:
+            # A 304 replays this body, so nothing in it may depend on the clock
+            self.assertNotIn('time', item)
+            self.assertIn('created_at', item)
+
+    def test_new_notification_ends_the_304s(self):
+        client = fresh_client()
+        etag = client.get('/api/notifications').headers['ETag']
+        self.assertEqual(client.get('/api/notifications', headers={'If-None-Match': etag}).status_code, 304)
+        conn = models.get_db()
+        models.insert_notification(conn, 1, 'match', 'conditional-b', 'Conditional B', '/matches')
+        conn.commit()
+        conn.close()
+        response = client.get('/api/notifications', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Conditional B', [item['title'] for item in response.get_json()['notifications']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import unittest
+
+from support import app_module, logged_in_client, latest_id, DONOR_FORM
+
+import models
+
+# No other test writes donors or patients for this hospital, so generated IDs are predictable
+HOSPITAL_ID = 3
+
+DONOR = {
+    'name': 'Cached Donor', 'dob': '1980-01-01', 'gender': 'Male', 'blood_group': 'B+', 'contact': '9000000002',
+    'location': 'New Delhi', 'weight_kg': 72.0, 'height_cm': 178.0, 'organ_type': 'Liver',
+    'organ_metrics': {'alt': 30, 'ast': 28}, 'medical_history': [], 'doctor_assigned': 'Dr. Cache',
+}
+PATIENT = {
+    'name': 'Cached Patient', 'dob': '1975-06-01', 'gender': 'Female', 'blood_group': 'B+', 'contact': '9000000003',
+    'location': 'New Delhi', 'weight_kg': 58.0, 'height_cm': 160.0, 'organ_needed': 'Liver',
+    'organ_metrics': {'meld_score': 22}, 'medical_history': [], 'urgency_score': 40, 'doctor_assigned': 'Dr. Cache',
+}
+
+
+class EntityCacheInvalidationTest(unittest.TestCase):
+    """Every write path must make the next read see the new row, never the cached one"""
+
+    def test_add_donor_replaces_a_cached_miss(self):
+        donor_id = models.generate_unique_id('DN', HOSPITAL_ID)
+        self.assertIsNone(models.get_donor_by_id(donor_id))
+        self.assertEqual(models.add_donor(dict(DONOR), HOSPITAL_ID), donor_id)
+        self.assertEqual(models.get_donor_by_id(donor_id)['name'], 'Cached Donor')
+
+    def test_add_patient_replaces_a_cached_miss(self):
+        patient_id = models.generate_unique_id('PT', HOSPITAL_ID)
+        self.assertIsNone(models.get_patient_by_id(patient_id))
+        self.assertEqual(models.add_patient(dict(PATIENT), HOSPITAL_ID), patient_id)
+        self.assertEqual(models.get_patient_by_id(patient_id)['name'], 'Cached Patient')
+
+    def test_update_donor(self):
+        donor_id = models.add_donor(dict(DONOR), HOSPITAL_ID)
+        self.assertEqual(models.get_donor_by_id(donor_id)['blood_group'], 'B+')
+        models.update_donor(donor_id, dict(DONOR, blood_group='O-', organ_metrics={'alt': 55}), HOSPITAL_ID)
+        donor = models.get_donor_by_id(donor_id)
+        self.assertEqual(donor['blood_group'], 'O-')
+        self.assertEqual(json.loads(donor['organ_metrics']), {'alt': 55})
+
+    def test_update_patient(self):
+        patient_id = models.add_patient(dict(PATIENT), HOSPITAL_ID)
+        self.assertEqual(models.get_patient_by_id(patient_id)['urgency_score'], 40)
+        models.update_patient(patient_id, dict(PATIENT, urgency_score=85), HOSPITAL_ID)
+        self.assertEqual(models.get_patient_by_id(patient_id)['urgency_score'], 85)
+
+    def test_delete_donor(self):
+        donor_id = models.add_donor(dict(DONOR), HOSPITAL_ID)
+        self.assertEqual(models.get_donor_by_id(donor_id)['status'], 'active')
+        models.delete_donor(donor_id, HOSPITAL_ID)
+        self.assertEqual(models.get_donor_by_id(donor_id)['status'], 'inactive')
+
+    def test_delete_patient(self):
+        patient_id = models.add_patient(dict(PATIENT), HOSPITAL_ID)
+        self.assertEqual(models.get_patient_by_id(patient_id)['status'], 'active')
+        models.delete_patient(patient_id, HOSPITAL_ID)
+        self.assertEqual(models.get_patient_by_id(patient_id)['status'], 'inactive')
+
+    def test_write_from_another_worker_is_seen_through_the_version(self):
+        donor_id = models.add_donor(dict(DONOR), HOSPITAL_ID)
+        models.get_donor_by_id(donor_id)
+        # Another process commits a change; this process's cache is not told directly
+        conn = models.get_db()
+        conn.execute("UPDATE donors SET name = 'Renamed Elsewhere' WHERE donor_id = ?", (donor_id,))
+        conn.execute('UPDATE data_versions SET version = version + 1 WHERE scope = ?', (f'donor:{donor_id}',))
+        conn.commit()
+        conn.close()
+        self.assertEqual(models.get_donor_by_id(donor_id)['name'], 'Renamed Elsewhere')
+
+    def test_edit_through_the_app_refreshes_the_detail_page(self):
+        client = logged_in_client()
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Page Donor'))
+        donor_id = latest_id('donors', 'donor_id', 'Page Donor')
+        self.assertIn(b'Page Donor', client.get(f'/donor/{donor_id}').data)
+        client.post(f'/edit-donor/{donor_id}', data=dict(DONOR_FORM, name='Page Donor Renamed'))
+        self.assertIn(b'Page Donor Renamed', client.get(f'/donor/{donor_id}').data)
+        client.post(f'/delete-donor/{donor_id}')
+        self.assertEqual(models.get_donor_by_id(donor_id)['status'], 'inactive')
+
+
+if __name__ == '__main__':
+    unittest.main()
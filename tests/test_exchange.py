@@ -0,0 +1,125 @@
+import itertools
+import json
+import random
+import unittest
+
+from support import app_module, logged_in_client, latest_id, DONOR_FORM, PATIENT_FORM
+
+import exchange
+
+HLA = json.dumps({'hla_typing': {'hla_a': ['A*01', 'A*02'], 'hla_b': ['B*07', 'B*08'], 'hla_dr': ['DR*01', 'DR*03']}})
+
+
+def edge(weight):
+    return (weight, 0, 6)
+
+
+def patient_row(patient_id, blood_group, urgency=50):
+    return {'patient_id': patient_id, 'name': patient_id, 'blood_group': blood_group, 'organ_metrics': HLA,
+            'location': 'Mumbai', 'urgency_score': urgency, 'hospital_id': 1}
+
+
+def donor_row(donor_id, blood_group, paired_patient_id=None, altruistic=0):
+    return {'donor_id': donor_id, 'name': donor_id, 'blood_group': blood_group, 'organ_metrics': HLA,
+            'location': 'Mumbai', 'hospital_id': 1, 'paired_patient_id': paired_patient_id, 'altruistic': altruistic}
+
+
+def best_by_enumeration(candidates):
+    best = 0
+    for size in range(len(candidates) + 1):
+        for subset in itertools.combinations(candidates, size):
+            used = [vertex for _, vertices in subset for vertex in vertices]
+            if len(used) == len(set(used)):
+                best = max(best, sum(weight for weight, _ in subset))
+    return best
+
+
+class ExchangeSearchTest(unittest.TestCase):
+
+    def test_cycles_are_listed_once(self):
+        # 0 <-> 1, and 0 -> 1 -> 2 -> 0
+        out = [{1: edge(10)}, {0: edge(20), 2: edge(30)}, {0: edge(40)}]
+        cycles = exchange.find_cycles(out, 3)
+        self.assertEqual(sorted(cycles), [(30, (0, 1)), (80, (0, 1, 2))])
+        self.assertEqual(exchange.find_cycles(out, 3, max_length=2), [(30, (0, 1))])
+
+    def test_chains_start_at_altruists_and_never_revisit(self):
+        # Pairs 0-2, altruist 3; 2 -> 0 would revisit
+        out = [{1: edge(10)}, {2: edge(20)}, {0: edge(5)}, {0: edge(1)}]
+        chains = exchange.find_chains(out, 3)
+        self.assertEqual(sorted(chains), [(1, (3, 0)), (11, (3, 0, 1)), (31, (3, 0, 1, 2))])
+        self.assertEqual(max(len(path) for _, path in exchange.find_chains(out, 3, max_length=2)), 3)
+
+    def test_selection_beats_taking_the_heaviest_first(self):
+        candidates = [(10, (0, 1, 2)), (7, (0, 3)), (7, (1, 4)), (3, (5, 6))]
+        selected, exact = exchange.select_exchanges(candidates)
+        self.assertTrue(exact)
+        self.assertEqual(sorted(selected), [1, 2, 3])
+
+    def test_small_groups_are_solved_exactly(self):
+        generator = random.Random(7)
+        for _ in range(100):
+            candidates = [(generator.randint(1, 100), tuple(generator.sample(range(8), generator.randint(2, 4))))
+                          for _ in range(generator.randint(1, 10))]
+            selected, exact = exchange.select_exchanges(candidates)
+            used = [vertex for index in selected for vertex in candidates[index][1]]
+            self.assertEqual(len(used), len(set(used)))
+            self.assertTrue(exact)
+            self.assertEqual(sum(candidates[index][0] for index in selected), best_by_enumeration(candidates))
+
+    def test_no_donor_or_patient_is_planned_twice(self):
+        patients = [patient_row('PT-A1', 'A+'), patient_row('PT-B1', 'B+'), patient_row('PT-A2', 'A+'),
+                    patient_row('PT-B2', 'B+', urgency=90)]
+        donors = [donor_row('DN-B1', 'B+', 'PT-A1'), donor_row('DN-A1', 'A+', 'PT-B1'),
+                  donor_row('DN-B2', 'B+', 'PT-A2'), donor_row('DN-AB2', 'AB+', 'PT-A2'),
+                  donor_row('DN-A2', 'A+', 'PT-B2'), donor_row('DN-O1', 'O+', altruistic=1),
+                  donor_row('DN-O2', 'O+', altruistic=1)]
+        plan = exchange.plan_exchanges(*exchange.build_exchange_pool(patients, donors))
+        transplants = [step for item in plan['cycles'] + plan['chains'] for step in item['transplants']]
+        self.assertEqual(plan['stats']['transplants'], 4)
+        self.assertTrue(plan['stats']['exact'])
+        donor_ids = [step['donor']['donor_id'] for step in transplants]
+        self.assertEqual(len(donor_ids), len(set(donor_ids)))
+        patient_ids = [step['patient']['patient_id'] for step in transplants]
+        self.assertEqual(len(patient_ids), len(set(patient_ids)))
+        # A pair gives at most one of its donors
+        givers = [step['donor_patient_id'] for step in transplants if step['donor_patient_id']]
+        self.assertEqual(len(givers), len(set(givers)))
+
+
+class PairedPatientValidationTest(unittest.TestCase):
+
+    def add_donor(self, client, name, paired_patient_id):
+        client.post('/add-donor', data=dict(DONOR_FORM, name=name, paired_patient_id=paired_patient_id))
+        return latest_id('donors', 'donor_id', name)
+
+    def test_own_kidney_patient(self):
+        client = logged_in_client()
+        client.post('/add-patient', data=dict(PATIENT_FORM, name='Paired Patient'))
+        patient_id = latest_id('patients', 'patient_id', 'Paired Patient')
+        donor_id = self.add_donor(client, 'Paired Donor', patient_id.lower())
+        self.assertEqual(app_module.get_donor_by_id(donor_id)['paired_patient_id'], patient_id)
+
+    def test_unknown_patient_is_rejected(self):
+        client = logged_in_client()
+        self.assertIsNone(self.add_donor(client, 'Unknown Pair Donor', 'PT-999-0000-999'))
+
+    def test_other_hospitals_patient_is_rejected(self):
+        other = logged_in_client('fortis_delhi', 'fortis123')
+        other.post('/add-patient', data=dict(PATIENT_FORM, name='Fortis Pair Patient'))
+        patient_id = latest_id('patients', 'patient_id', 'Fortis Pair Patient')
+        self.assertIsNone(self.add_donor(logged_in_client(), 'Cross Pair Donor', patient_id))
+
+    def test_edit_cannot_pair_with_another_hospital(self):
+        other = logged_in_client('fortis_delhi', 'fortis123')
+        other.post('/add-patient', data=dict(PATIENT_FORM, name='Fortis Edit Patient'))
+        patient_id = latest_id('patients', 'patient_id', 'Fortis Edit Patient')
+        client = logged_in_client()
+        donor_id = self.add_donor(client, 'Edit Pair Donor', '')
+        client.post(f'/edit-donor/{donor_id}',
+                    data=dict(DONOR_FORM, name='Edit Pair Donor', paired_patient_id=patient_id))
+        self.assertIsNone(app_module.get_donor_by_id(donor_id)['paired_patient_id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+
+from support import app_module, logged_in_client
+
+import export_jobs
+from export_jobs import ExportJobQueue, ExportLimitError
+
+HOSPITAL_ID = 4
+OTHER_HOSPITAL_ID = 5
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def wait_for_job(queue, job_id, hospital_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.get(job_id, hospital_id)
+        if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+class ExportJobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.export_dir = directory.name
+        self.queue = ExportJobQueue(app_module.get_db, export_dir=self.export_dir, per_hospital_limit=1)
+        self.addCleanup(self.clear_active_jobs)
+
+    def clear_active_jobs(self):
+        conn = app_module.get_db()
+        conn.execute("UPDATE export_jobs SET status = 'failed' WHERE status IN ('queued', 'running')")
+        conn.commit()
+        conn.close()
+
+    def insert_job(self, hospital_id, status, owner, age_seconds=0):
+        job_id = uuid.uuid4().hex
+        conn = app_module.get_db()
+        conn.execute('''
+            INSERT INTO export_jobs (id, hospital_id, data_type, export_format, status, owner, updated_at)
+            VALUES (?, ?, 'donors', 'csv', ?, ?, datetime('now', ?))
+        ''', (job_id, hospital_id, status, owner, f'-{age_seconds} seconds'))
+        conn.commit()
+        conn.close()
+        return job_id
+
+    def status(self, job_id, hospital_id=HOSPITAL_ID):
+        return self.queue.get(job_id, hospital_id)['status']
+
+    def test_threads_start_on_first_use(self):
+        self.assertIsNone(self.queue.executor)
+        self.assertIsNone(self.queue._janitor)
+        self.queue.list(HOSPITAL_ID)
+        self.assertIsNotNone(self.queue.executor)
+        self.assertTrue(self.queue._janitor.is_alive())
+
+    def test_cap_is_per_hospital(self):
+        self.insert_job(HOSPITAL_ID, 'running', self.queue.owner)
+        self.assertRaises(ExportLimitError, self.queue.submit, HOSPITAL_ID, 'donors', 'csv')
+        job = self.queue.submit(OTHER_HOSPITAL_ID, 'donors', 'csv')
+        self.assertEqual(wait_for_job(self.queue, job['id'], OTHER_HOSPITAL_ID)['status'], 'completed')
+
+    def test_finished_jobs_free_the_slot(self):
+        job = self.queue.submit(HOSPITAL_ID, 'donors', 'csv')
+        self.assertEqual(wait_for_job(self.queue, job['id'], HOSPITAL_ID)['status'], 'completed')
+        job = self.queue.submit(HOSPITAL_ID, 'patients', 'csv')
+        self.assertEqual(wait_for_job(self.queue, job['id'], HOSPITAL_ID)['status'], 'completed')
+
+    def test_file_appears_only_when_complete(self):
+        release = threading.Event()
+        real_stream = export_jobs.stream_export
+
+        def paused_stream(connect, build_chunks, compress=False):
+            yield b'partial,'
+            release.wait(5)
+            yield from real_stream(connect, build_chunks, compress)
+
+        export_jobs.stream_export = paused_stream
+        self.addCleanup(setattr, export_jobs, 'stream_export', real_stream)
+        job = self.queue.submit(HOSPITAL_ID, 'donors', 'csv')
+        deadline = time.monotonic() + 5
+        while not os.listdir(self.export_dir) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Mid-export only the .part file exists, so nothing can serve half a file
+        self.assertEqual([name.endswith('.part') for name in os.listdir(self.export_dir)], [True])
+        release.set()
+        job = wait_for_job(self.queue, job['id'], HOSPITAL_ID)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(os.listdir(self.export_dir), [os.path.basename(self.queue.file_path(job))])
+        with open(self.queue.file_path(job), 'rb') as handle:
+            self.assertTrue(handle.read().startswith(b'partial,'))
+
+    def test_failed_export_leaves_no_file(self):
+        real_stream = export_jobs.stream_export
+
+        def failing_stream(connect, build_chunks, compress=False):
+            yield b'partial,'
+            raise RuntimeError('disk full')
+
+        export_jobs.stream_export = failing_stream
+        self.addCleanup(setattr, export_jobs, 'stream_export', real_stream)
+        job = wait_for_job(self.queue, self.queue.submit(HOSPITAL_ID, 'donors', 'csv')['id'], HOSPITAL_ID)
+        self.assertEqual((job['status'], job['error']), ('failed', 'disk full'))
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+    def test_orphaned_jobs_are_failed(self):
+        dead_local = self.insert_job(HOSPITAL_ID, 'running', f'{self.queue.host}:{dead_pid()}')
+        live_local = self.insert_job(HOSPITAL_ID, 'queued', self.queue.owner, age_seconds=3600)
+        stale_remote = self.insert_job(HOSPITAL_ID, 'running', 'elsewhere:1',
+                                       age_seconds=export_jobs.STALE_JOB_SECONDS + 60)
+        fresh_remote = self.insert_job(HOSPITAL_ID, 'running', 'elsewhere:2')
+        queued_remote = self.insert_job(HOSPITAL_ID, 'queued', 'elsewhere:3', age_seconds=3600)
+
+        conn = app_module.get_db()
+        conn.execute('BEGIN IMMEDIATE')
+        self.queue._expire_stale(conn)
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.status(dead_local), 'failed')
+        self.assertEqual(self.queue.get(dead_local, HOSPITAL_ID)['error'], 'Export worker stopped responding')
+        self.assertEqual(self.status(stale_remote), 'failed')
+        for job_id in (live_local, fresh_remote, queued_remote):
+            self.assertIn(self.status(job_id), ('queued', 'running'))
+
+    def test_orphaned_job_does_not_hold_the_cap(self):
+        self.insert_job(HOSPITAL_ID, 'running', f'{self.queue.host}:{dead_pid()}')
+        job = self.queue.submit(HOSPITAL_ID, 'donors', 'csv')
+        self.assertEqual(wait_for_job(self.queue, job['id'], HOSPITAL_ID)['status'], 'completed')
+
+
+class ExportDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(setattr, app_module.export_jobs, 'export_dir', app_module.export_jobs.export_dir)
+        app_module.export_jobs.export_dir = directory.name
+
+    def test_range_requests_resume_the_download(self):
+        client = logged_in_client()
+        response = client.post('/api/exports', json={'data_type': 'all', 'format': 'jsonl'})
+        self.assertEqual(response.status_code, 202)
+        job = wait_for_job(app_module.export_jobs, response.get_json()['id'], 1)
+        self.assertEqual(job['status'], 'completed')
+        url = f"/api/exports/{job['id']}/download"
+
+        whole = client.get(url)
+        self.assertEqual(whole.status_code, 200)
+        self.assertEqual(whole.headers['Accept-Ranges'], 'bytes')
+        body = whole.data
+        self.assertGreater(len(body), 20)
+
+        first = client.get(url, headers={'Range': 'bytes=0-9'})
+        self.assertEqual(first.status_code, 206)
+        self.assertEqual(first.headers['Content-Range'], f'bytes 0-9/{len(body)}')
+        rest = client.get(url, headers={'Range': 'bytes=10-', 'If-Range': whole.headers['ETag']})
+        self.assertEqual(rest.status_code, 206)
+        self.assertEqual(first.data + rest.data, body)
+
+        # A stale validator gets the whole file rather than a mismatched tail
+        stale = client.get(url, headers={'Range': 'bytes=10-', 'If-Range': '"stale"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.data, body)
+
+    def test_other_hospital_cannot_download(self):
+        response = logged_in_client().post('/api/exports', json={'data_type': 'donors', 'format': 'csv'})
+        job_id = response.get_json()['id']
+        wait_for_job(app_module.export_jobs, job_id, 1)
+        other = logged_in_client('fortis_delhi', 'fortis123')
+        self.assertEqual(other.get(f'/api/exports/{job_id}/download').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import zlib
+
+import support
+
+import database
+import exports
+
+HOSPITAL_ID = 1
+
+
+class ExportTestCase(unittest.TestCase):
+    """Each test gets its own database so invalid legacy rows stay out of the shared one"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, 'exports.db')
+        database.init_db(self.db_path)
+
+    def connect(self):
+        return database.get_db(self.db_path)
+
+    def insert_patient(self, patient_id, organ_metrics, medical_history='[]'):
+        conn = self.connect()
+        try:
+            conn.execute('''INSERT INTO patients (patient_id, name, dob, gender, blood_group, contact, location,
+                                                  weight_kg, height_cm, organ_needed, urgency_score, hospital_id,
+                                                  doctor_assigned, organ_metrics, medical_history)
+                            VALUES (?, 'Export Patient', '1970-01-01', 'Male', 'O+', '9000000007', 'Pune', 70, 170,
+                                    'Liver', 50, ?, 'Dr. Export', ?, ?)''',
+                         (patient_id, HOSPITAL_ID, organ_metrics, medical_history))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def export(self, export_format, data_type='all', compress=False):
+        build_chunks = lambda conn: exports.build_export_chunks(conn, data_type, export_format, HOSPITAL_ID)
+        return b''.join(exports.stream_export(self.connect, build_chunks, compress))
+
+    def jsonl_rows(self, table):
+        lines = self.export('jsonl').decode('utf-8').splitlines()
+        return [record['row'] for record in map(json.loads, lines) if record['table'] == table]
+
+
+class JsonColumnTest(ExportTestCase):
+
+    def test_invalid_json_is_rejected(self):
+        self.assertRaises(sqlite3.IntegrityError, self.insert_patient, 'PT-BAD-1', '{not json')
+        self.insert_patient('PT-OK-1', json.dumps({'meld_score': 20}))
+        conn = self.connect()
+        try:
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute("UPDATE patients SET medical_history = 'Diabetes' WHERE patient_id = 'PT-OK-1'")
+        finally:
+            conn.close()
+
+    def test_jsonl_embeds_columns_without_reparsing(self):
+        # Pretty-printed JSON is valid but spans lines; the export must still be one record per line
+        self.insert_patient('PT-PRETTY-1', json.dumps({'meld_score': 27}, indent=2), json.dumps(['Diabetes']))
+        row, = [row for row in self.jsonl_rows('patients') if row['patient_id'] == 'PT-PRETTY-1']
+        self.assertEqual(row['organ_metrics'], {'meld_score': 27})
+        self.assertEqual(row['medical_history'], ['Diabetes'])
+
+    def test_legacy_invalid_values_are_repaired_once(self):
+        # A database from before the checks existed
+        conn = self.connect()
+        for table in database.JSON_TEXT_COLUMNS:
+            for event in ('insert', 'update'):
+                conn.execute(f'DROP TRIGGER trg_{table}_json_{event}')
+        conn.commit()
+        conn.close()
+        self.insert_patient('PT-OLD-1', '{not json', json.dumps(['Diabetes']))
+
+        database.init_db(self.db_path)
+        row, = self.jsonl_rows('patients')
+        # Kept as a JSON string so nothing is lost
+        self.assertEqual(row['organ_metrics'], '{not json')
+        self.assertEqual(row['medical_history'], ['Diabetes'])
+
+        database.init_db(self.db_path)
+        self.assertEqual(self.jsonl_rows('patients'), [row])
+        self.assertRaises(sqlite3.IntegrityError, self.insert_patient, 'PT-BAD-2', '{not json')
+
+
+class ExportFailureTest(ExportTestCase):
+    """A failure after the headers went out must not leave a file that looks complete"""
+
+    def setUp(self):
+        super().setUp()
+        self.insert_patient('PT-FAIL-1', json.dumps({'meld_score': 20}))
+
+    def fail_after_first_chunk(self, name):
+        real_chunks = getattr(exports, name)
+
+        def failing_chunks(*args, **kwargs):
+            yield next(real_chunks(*args, **kwargs))
+            raise sqlite3.OperationalError('disk I/O error')
+
+        setattr(exports, name, failing_chunks)
+        self.addCleanup(setattr, exports, name, real_chunks)
+
+    def collect(self, export_format, data_type='all', compress=False):
+        """Chunks sent before the error, and the error that cut the stream"""
+        build_chunks = lambda conn: exports.build_export_chunks(conn, data_type, export_format, HOSPITAL_ID)
+        chunks = []
+        with self.assertRaises(sqlite3.OperationalError):
+            for chunk in exports.stream_export(self.connect, build_chunks, compress):
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def test_jsonl_ends_with_an_error_record(self):
+        self.fail_after_first_chunk('iter_jsonl_chunks')
+        lines = self.collect('jsonl').decode('utf-8').splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records[-1], {'table': '_error', 'row': {'error': exports.EXPORT_FAILED_MESSAGE}})
+        self.assertNotIn('_manifest', [record['table'] for record in records])
+
+    def test_csv_ends_with_an_error_row(self):
+        self.fail_after_first_chunk('iter_csv_chunks')
+        rows = list(csv.reader(io.StringIO(self.collect('csv', 'patients').decode('utf-8'))))
+        self.assertEqual(rows[-1], [exports.EXPORT_FAILED_MARKER, exports.EXPORT_FAILED_MESSAGE])
+        # Internal error text stays in the server log
+        self.assertNotIn('disk I/O error', rows[-1][1])
+
+    def test_gzip_flushes_the_marker_before_the_cut(self):
+        self.fail_after_first_chunk('iter_csv_chunks')
+        body = zlib.decompressobj(31).decompress(self.collect('csv', 'patients', compress=True))
+        self.assertTrue(body.decode('utf-8').endswith(
+            f'{exports.EXPORT_FAILED_MARKER},{exports.EXPORT_FAILED_MESSAGE}\r\n'))
+
+    def test_complete_exports_have_no_marker(self):
+        self.assertNotIn(exports.EXPORT_FAILED_MARKER.encode('utf-8'), self.export('csv', 'patients'))
+        lines = self.export('jsonl').decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[-1])['table'], '_manifest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from support import app_module, logged_in_client
+
+QUESTION = 'summarize the network status'
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """Stands in for generateContent: answers after ``delay`` seconds with ``status``"""
+
+    delay = 0.0
+    status = 200
+    retry_after = None
+    calls = 0
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        StubGemini.calls += 1
+        time.sleep(StubGemini.delay)
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': 'Overview:\n- stub answer'}]}}]})
+        body = body.encode() if StubGemini.status == 200 else b'{}'
+        self.send_response(StubGemini.status)
+        if StubGemini.retry_after is not None:
+            self.send_header('Retry-After', str(StubGemini.retry_after))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def setUpModule():
+    global server, original_url
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original_url = app_module.GEMINI_API_URL
+    app_module.GEMINI_API_URL = (f'http://127.0.0.1:{server.server_address[1]}/v1beta/'
+                                 f'{app_module.GEMINI_MODEL}:generateContent')
+
+
+def tearDownModule():
+    app_module.GEMINI_API_URL = original_url
+    server.shutdown()
+
+
+class GeminiFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        from llm import BoundedCallRunner, CircuitBreaker, LLMBusyError
+        StubGemini.delay, StubGemini.status, StubGemini.retry_after, StubGemini.calls = 0.0, 200, None, 0
+        # One slot and a fresh breaker per test, so earlier timeouts cannot open the circuit
+        app_module.gemini_calls = BoundedCallRunner(max_concurrency=1, queue_timeout=0.05, deadline=1.0)
+        app_module.gemini_breaker = CircuitBreaker(min_calls=100, ignored=(LLMBusyError,))
+        app_module.response_cache.clear()
+
+    def ask(self):
+        started = time.monotonic()
+        body = logged_in_client().post('/api/chat', json={'message': QUESTION}).get_json()
+        return body, time.monotonic() - started
+
+    def occupy_slot(self):
+        """Start a chat that holds the only LLM slot until the stub answers"""
+        thread = threading.Thread(target=self.ask)
+        thread.start()
+        deadline = time.monotonic() + 2
+        while app_module.gemini_calls.stats()['in_flight'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(app_module.gemini_calls.stats()['in_flight'], 1)
+        return thread
+
+    def test_answers_from_gemini_when_a_slot_is_free(self):
+        body, _ = self.ask()
+        self.assertEqual(body['source'], 'gemini')
+
+    def test_busy_slots_fall_back_immediately(self):
+        StubGemini.delay = 0.8
+        holder = self.occupy_slot()
+        body, elapsed = self.ask()
+        holder.join()
+        self.assertEqual(body['source'], 'local')
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(app_module.gemini_calls.stats()['rejected'], 1)
+
+    def test_queue_timeout_falls_back(self):
+        from llm import BoundedCallRunner
+        app_module.gemini_calls = BoundedCallRunner(max_concurrency=1, queue_timeout=0.3, deadline=2.0)
+        StubGemini.delay = 1.2
+        holder = self.occupy_slot()
+        body, elapsed = self.ask()
+        holder.join()
+        self.assertEqual(body['source'], 'local')
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(app_module.gemini_calls.stats()['rejected'], 1)
+
+    def test_deadline_falls_back_and_frees_the_slot(self):
+        StubGemini.delay = 3.0
+        body, elapsed = self.ask()
+        self.assertEqual(body['source'], 'local')
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(app_module.gemini_calls.stats()['timed_out'], 1)
+
+    def test_retries_stop_at_the_deadline(self):
+        StubGemini.status, StubGemini.retry_after = 503, 3
+        started = time.monotonic()
+        body, _ = self.ask()
+        self.assertEqual(body['source'], 'local')
+        # Without the deadline, Retry-After backoff would hold the slot for several seconds
+        while app_module.gemini_calls.stats()['in_flight'] and time.monotonic() - started < 5:
+            time.sleep(0.02)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(StubGemini.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
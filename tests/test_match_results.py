@@ -0,0 +1,50 @@
+import unittest
+
+from flask import jsonify, render_template_string
+
+from support import app_module, logged_in_client, latest_id, DONOR_FORM, PATIENT_FORM
+
+import models
+
+
+class MatchResultAccessTest(unittest.TestCase):
+    """get_matches returns slotted records; callers written for the old dicts must keep working"""
+
+    @classmethod
+    def setUpClass(cls):
+        client = logged_in_client()
+        client.post('/add-patient', data=dict(PATIENT_FORM, name='Result Patient', organ_needed='Lung',
+                                              blood_group='AB+', urgency_score='99'))
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Result Donor', organ_type='Lung', blood_group='AB+'))
+        patient_id = latest_id('patients', 'patient_id', 'Result Patient')
+        cls.match = next(match for match in models.get_matches() if match.patient.patient_id == patient_id)
+
+    def test_item_access(self):
+        self.assertEqual(self.match['patient']['name'], 'Result Patient')
+        self.assertEqual(self.match['donor']['name'], 'Result Donor')
+        self.assertEqual(self.match['score'], self.match.score)
+        self.assertIsInstance(self.match['reasons'], list)
+        self.assertEqual(set(self.match['patient'].keys()), set(models.MatchPatient.__slots__))
+        self.assertRaises(IndexError, lambda: self.match['patient']['organ_metrics'])
+
+    def test_template_access(self):
+        with app_module.app.test_request_context():
+            html = render_template_string("{{ m.patient.name }}|{{ m['donor']['name'] }}|{{ m.score }}", m=self.match)
+        self.assertEqual(html, f'Result Patient|Result Donor|{self.match.score}')
+
+    def test_jsonify(self):
+        with app_module.app.test_request_context():
+            body = jsonify(self.match).get_json()
+        self.assertEqual(body['patient']['name'], 'Result Patient')
+        self.assertEqual(body['donor']['donor_id'], self.match.donor.donor_id)
+        self.assertEqual(body['score'], self.match.score)
+        self.assertEqual(body['distance_km'], self.match.distance_km)
+
+    def test_matches_page_renders(self):
+        response = logged_in_client().get('/matches')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Result Patient', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import queue
+import threading
+import unittest
+
+from support import logged_in_client
+
+import models
+from realtime import NotificationBroker
+
+HOSPITAL_ID = 5
+OTHER_HOSPITAL_ID = 4
+
+
+def add_notifications(hospital_id, *ref_keys):
+    conn = models.get_db()
+    for ref_key in ref_keys:
+        models.insert_notification(conn, hospital_id, 'match', ref_key, f'Notification {ref_key}', '/matches')
+    conn.commit()
+    conn.close()
+
+
+def latest_id():
+    conn = models.get_db()
+    value = conn.execute('SELECT COALESCE(MAX(id), 0) FROM notifications').fetchone()[0]
+    conn.close()
+    return value
+
+
+class NotificationCursorTest(unittest.TestCase):
+
+    def test_pages_forward_from_a_cursor(self):
+        cursor = latest_id()
+        add_notifications(HOSPITAL_ID, *(f'page-{n}' for n in range(5)))
+        seen = []
+        while True:
+            rows, _ = models.get_notifications_since(HOSPITAL_ID, cursor, limit=2)
+            if not rows:
+                break
+            self.assertLessEqual(len(rows), 2)
+            seen.extend(row['ref_key'] for row in rows)
+            cursor = rows[-1]['id']
+        self.assertEqual(seen, [f'page-{n}' for n in range(5)])
+
+    def test_without_a_cursor_returns_the_latest_oldest_first(self):
+        add_notifications(HOSPITAL_ID, 'latest-a', 'latest-b', 'latest-c')
+        rows, _ = models.get_notifications_since(HOSPITAL_ID, None, limit=2)
+        self.assertEqual([row['ref_key'] for row in rows], ['latest-b', 'latest-c'])
+
+    def test_cursor_is_scoped_to_the_hospital(self):
+        cursor = latest_id()
+        add_notifications(OTHER_HOSPITAL_ID, 'elsewhere')
+        add_notifications(HOSPITAL_ID, 'here')
+        rows, _ = models.get_notifications_since(HOSPITAL_ID, cursor)
+        self.assertEqual([row['ref_key'] for row in rows], ['here'])
+
+    def test_repeated_ref_key_is_stored_once_per_hospital(self):
+        cursor = latest_id()
+        scope = f'notifications:{HOSPITAL_ID}'
+        add_notifications(HOSPITAL_ID, 'dedup')
+        version = models.get_data_versions([scope])[scope]
+        add_notifications(HOSPITAL_ID, 'dedup')
+        # Ignored duplicates must not wake pollers either
+        self.assertEqual(models.get_data_versions([scope])[scope], version)
+        add_notifications(OTHER_HOSPITAL_ID, 'dedup')
+        rows, _ = models.get_notifications_since(HOSPITAL_ID, cursor)
+        self.assertEqual([row['ref_key'] for row in rows], ['dedup'])
+        rows, _ = models.get_notifications_since(OTHER_HOSPITAL_ID, cursor)
+        self.assertEqual([row['ref_key'] for row in rows], ['dedup'])
+
+    def test_mark_read(self):
+        cursor = latest_id()
+        add_notifications(HOSPITAL_ID, 'read-a', 'read-b', 'read-c')
+        rows, unread = models.get_notifications_since(HOSPITAL_ID, cursor)
+        ids = [row['id'] for row in rows]
+
+        self.assertEqual(models.mark_notifications_read(HOSPITAL_ID, ids[:1]), 1)
+        self.assertEqual(models.mark_notifications_read(HOSPITAL_ID, ids[:1]), 0)
+        # Another hospital cannot mark these as read
+        self.assertEqual(models.mark_notifications_read(OTHER_HOSPITAL_ID, ids[1:]), 0)
+        self.assertEqual(models.mark_notifications_read(HOSPITAL_ID, []), 0)
+        rows, remaining = models.get_notifications_since(HOSPITAL_ID, cursor)
+        self.assertEqual(remaining, unread - 1)
+        self.assertEqual([row['read_at'] is not None for row in rows], [True, False, False])
+
+        models.mark_notifications_read(HOSPITAL_ID)
+        _, remaining = models.get_notifications_since(HOSPITAL_ID, cursor)
+        self.assertEqual(remaining, 0)
+
+    def test_api_pages_with_since(self):
+        client = logged_in_client()
+        cursor = latest_id()
+        add_notifications(1, 'api-a', 'api-b', 'api-c')
+        # Each page is newest first
+        body = client.get(f'/api/notifications?since={cursor}&limit=2').get_json()
+        self.assertEqual([item['title'] for item in body['notifications']], ['Notification api-b', 'Notification api-a'])
+        self.assertTrue(body['has_more'])
+        body = client.get(f"/api/notifications?since={body['cursor']}&limit=2").get_json()
+        self.assertEqual([item['title'] for item in body['notifications']], ['Notification api-c'])
+        self.assertFalse(body['has_more'])
+
+
+class FakeNetwork:
+    """Version counter and per-hospital notification lists standing in for the database"""
+
+    def __init__(self):
+        self.version = 1
+        self.notifications = {}
+        self.lock = threading.Lock()
+
+    def add(self, hospital_id, notification_id):
+        with self.lock:
+            self.notifications.setdefault(hospital_id, []).insert(0, {'id': notification_id})
+            self.version += 1
+            return self.version
+
+    def current_version(self):
+        with self.lock:
+            return self.version
+
+    def build(self, hospital_ids):
+        with self.lock:
+            return {hospital_id: list(self.notifications.get(hospital_id, [])) for hospital_id in hospital_ids}
+
+
+def next_event(subscription, timeout=2):
+    return subscription.events.get(timeout=timeout)
+
+
+class NotificationReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.network = FakeNetwork()
+        self.broker = NotificationBroker(self.network.current_version, self.network.build, poll_interval=0.05)
+
+    def tearDown(self):
+        for subscribers in list(self.broker._subscribers.values()):
+            for subscription in list(subscribers):
+                self.broker.unsubscribe(subscription)
+
+    def publish(self, hospital_id, notification_id, listener):
+        """Add a notification and wait until the broker has pushed it to listener"""
+        version = self.network.add(hospital_id, notification_id)
+        self.broker.notify()
+        event = next_event(listener)
+        self.assertEqual(event, ('notifications', {'notifications': [{'id': notification_id}]}, version))
+        return version
+
+    def test_first_connection_gets_a_snapshot(self):
+        self.network.add(1, 10)
+        subscription = self.broker.subscribe(1)
+        self.assertEqual(next_event(subscription), ('snapshot', {'notifications': [{'id': 10}]}, 2))
+
+    def test_resume_replays_only_missed_events(self):
+        listener = self.broker.subscribe(1)
+        _, _, seen_version = next_event(listener)
+        first = self.publish(1, 11, listener)
+        second = self.publish(1, 12, listener)
+
+        resumed = self.broker.subscribe(1, last_event_id=str(seen_version))
+        self.assertEqual([next_event(resumed)[2], next_event(resumed)[2]], [first, second])
+        self.assertTrue(resumed.events.empty())
+
+        resumed = self.broker.subscribe(1, last_event_id=str(first))
+        self.assertEqual(next_event(resumed), ('notifications', {'notifications': [{'id': 12}]}, second))
+        self.assertTrue(resumed.events.empty())
+
+    def test_resume_at_the_current_version_sends_nothing(self):
+        listener = self.broker.subscribe(1)
+        next_event(listener)
+        version = self.publish(1, 13, listener)
+        resumed = self.broker.subscribe(1, last_event_id=str(version))
+        self.assertRaises(queue.Empty, resumed.events.get, timeout=0.2)
+
+    def test_resume_outside_the_history_falls_back_to_a_snapshot(self):
+        listener = self.broker.subscribe(1)
+        next_event(listener)
+        version = self.publish(1, 14, listener)
+        for last_event_id in ('not-a-number', '0', str(version + 5)):
+            with self.subTest(last_event_id=last_event_id):
+                resumed = self.broker.subscribe(1, last_event_id=last_event_id)
+                self.assertEqual(next_event(resumed)[0], 'snapshot')
+
+    def test_history_is_per_hospital(self):
+        # Hospital 2 subscribes first, so its history is recorded before hospital 1's event is pushed
+        other = self.broker.subscribe(2)
+        listener = self.broker.subscribe(1)
+        _, _, seen_version = next_event(listener)
+        next_event(other)
+        self.publish(1, 15, listener)
+        # Hospital 2 saw no new notifications, but its history still covers the version
+        resumed = self.broker.subscribe(2, last_event_id=str(seen_version))
+        self.assertEqual(next_event(resumed), ('notifications', {'notifications': []}, self.network.current_version()))
+        self.assertTrue(other.events.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
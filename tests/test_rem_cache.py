@@ -0,0 +1,109 @@
+import json
+import unittest
+
+from support import app_module, logged_in_client, DONOR_FORM
+
+import models
+import rem
+
+HOSPITAL_ID = 4
+QUESTION = 'summarize the network status'
+
+
+def my_donor_count(conn):
+    return json.loads(rem.build_rem_context(conn, HOSPITAL_ID, 'donor counts'))['my_donors']
+
+
+class ContextCacheTest(unittest.TestCase):
+
+    def test_network_bump_rebuilds_the_context(self):
+        conn = app_module.get_db()
+        self.addCleanup(conn.close)
+        before = my_donor_count(conn)
+        hits = rem.context_cache.stats()['hits']
+        self.assertEqual(my_donor_count(conn), before)
+        self.assertGreater(rem.context_cache.stats()['hits'], hits)
+
+        # A write that skips the version bump is not seen: the cached section is served
+        conn.execute('''INSERT INTO donors (donor_id, name, dob, gender, blood_group, contact, location, weight_kg,
+                                            height_cm, organ_type, hospital_id, doctor_assigned, organ_metrics,
+                                            medical_history)
+                        VALUES ('DN-CACHE-1', 'Cache Donor', '1980-01-01', 'Male', 'O+', '9000000008', 'Bangalore',
+                                70, 175, 'Kidney', ?, 'Dr. Cache', '{}', '[]')''', (HOSPITAL_ID,))
+        conn.commit()
+        self.addCleanup(self.delete_donor, 'DN-CACHE-1')
+        self.assertEqual(my_donor_count(conn), before)
+
+        models.bump_data_version(conn, models.NETWORK_SCOPE)
+        conn.commit()
+        self.assertEqual(my_donor_count(conn), before + 1)
+
+    def delete_donor(self, donor_id):
+        conn = app_module.get_db()
+        conn.execute('DELETE FROM donors WHERE donor_id = ?', (donor_id,))
+        models.bump_data_version(conn, models.NETWORK_SCOPE)
+        conn.commit()
+        conn.close()
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        app_module.response_cache.clear()
+        self.addCleanup(app_module.response_cache.clear)
+
+    def test_answer_is_replayed_until_the_data_changes(self):
+        client = logged_in_client('manipal_blr', 'manipal123')
+        key = rem.response_cache_key(HOSPITAL_ID, QUESTION)
+        app_module.response_cache.set(key, rem.current_context_version(), 'remembered answer')
+
+        # Rephrasings that only differ in filler share the entry
+        body = client.post('/api/chat', json={'message': 'Please summarize the network status'}).get_json()
+        self.assertEqual((body['response'], body['cached']), ('remembered answer', True))
+
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Response Cache Donor', location='Bangalore'))
+        body = client.post('/api/chat', json={'message': QUESTION}).get_json()
+        self.assertFalse(body['cached'])
+        self.assertNotEqual(body['response'], 'remembered answer')
+
+    def test_entries_are_per_hospital(self):
+        app_module.response_cache.set(rem.response_cache_key(1, QUESTION), rem.current_context_version(),
+                                      'apollo answer')
+        body = logged_in_client('manipal_blr', 'manipal123').post('/api/chat', json={'message': QUESTION}).get_json()
+        self.assertFalse(body['cached'])
+        self.assertNotEqual(body['response'], 'apollo answer')
+
+
+class QuestionKeyTest(unittest.TestCase):
+
+    def test_rephrasings_share_a_key(self):
+        for first, second in (('Show me the kidney donors', 'kidney donor'),
+                              ('Please list all patients!', 'all patients'),
+                              ('  MELD > 30 ', 'meld>30'),
+                              ('Can you tell me about heart patients?', 'about heart patient')):
+            with self.subTest(first=first):
+                self.assertEqual(rem.response_cache_key(1, first), rem.response_cache_key(1, second))
+
+    def test_different_answers_get_different_keys(self):
+        for first, second in (('patients with meld > 30', 'patients with meld < 30'),
+                              ('meld >= 30', 'meld > 30'),
+                              ('A+ donors', 'A- donors'),
+                              ('urgency above 1.5', 'urgency above 15'),
+                              ('my donors', 'all donors'),
+                              ('donors in mumbai', 'donors not in mumbai'),
+                              ('match donor to patient', 'match patient to donor'),
+                              ('kidney patients', 'kidney donors')):
+            with self.subTest(first=first):
+                self.assertNotEqual(rem.normalize_question(first), rem.normalize_question(second))
+
+    def test_keys_are_scoped_to_the_hospital(self):
+        self.assertNotEqual(rem.response_cache_key(1, QUESTION), rem.response_cache_key(2, QUESTION))
+
+    def test_filler_only_questions_are_not_cached(self):
+        for question in ('', '   ', 'please show me', '?!'):
+            with self.subTest(question=question):
+                self.assertIsNone(rem.response_cache_key(1, question))
+
+
+if __name__ == '__main__':
+    unittest.main()
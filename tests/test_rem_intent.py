@@ -0,0 +1,83 @@
+import unittest
+
+from support import app_module, logged_in_client, latest_id, DONOR_FORM, PATIENT_FORM
+
+import rem
+
+
+class RemIntentTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        conn = app_module.get_db()
+        cls.hospitals = rem.load_rem_hospitals(conn)
+        conn.close()
+
+    def parse(self, question):
+        return rem.parse_rem_intent(question, self.hospitals, 1)
+
+    def test_filter_only_questions_are_answered_locally(self):
+        for question in ('kidney donors in Mumbai with O+', 'show critical patients in mumbai',
+                         'how many patients with urgency above 50', 'liver patients with meld > 30',
+                         'donors at AIIMS', 'my donors', 'match statistics', 'help'):
+            with self.subTest(question=question):
+                self.assertTrue(rem.answerable_locally(self.parse(question)))
+
+    def test_questions_about_a_record_go_to_the_llm(self):
+        intent = self.parse('tell me about donor DN-1234')
+        self.assertEqual(intent['entity_ids'], ['DN-1234'])
+        self.assertFalse(rem.answerable_locally(intent))
+        intent = self.parse('what is the status of patient PT-00012?')
+        self.assertEqual(intent['entity_ids'], ['PT-00012'])
+        self.assertIn('status', intent['unexplained'])
+        self.assertFalse(rem.answerable_locally(intent))
+
+    def test_words_outside_the_filters_go_to_the_llm(self):
+        for question in ('donors older than 50', 'why is the kidney waitlist so long?', 'what is the weather'):
+            with self.subTest(question=question):
+                self.assertFalse(rem.answerable_locally(self.parse(question)))
+
+    def test_fallback_for_a_record_question_describes_the_record(self):
+        client = logged_in_client()
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Lookup Donor'))
+        donor_id = latest_id('donors', 'donor_id', 'Lookup Donor')
+        # GEMINI_API_BASE points at a dead port, so this is the local fallback
+        body = client.post('/api/chat', json={'message': f'tell me about donor {donor_id}'}).get_json()
+        self.assertEqual(body['source'], 'local')
+        self.assertIn(donor_id, body['response'])
+        self.assertIn('Lookup Donor', body['response'])
+        self.assertNotIn('Found', body['response'])
+
+
+class RemIntentQueryTest(unittest.TestCase):
+
+    def test_patients_follow_the_waitlist_order(self):
+        client = logged_in_client()
+        for name in ('Tie First', 'Tie Second'):
+            client.post('/add-patient', data=dict(PATIENT_FORM, name=name, organ_needed='Pancreas',
+                                                  urgency_score='97'))
+        conn = app_module.get_db()
+        # Backdated, so the second registration has waited longest and must come first
+        conn.execute("UPDATE patients SET created_at = '2020-01-01 00:00:00' WHERE name = 'Tie Second'")
+        conn.commit()
+        intent = rem.parse_rem_intent('pancreas patients with urgency = 97', rem.load_rem_hospitals(conn), 1)
+        sql, params = rem.build_intent_query(intent)
+        names = [row['name'] for row in conn.execute(sql, params)]
+        conn.close()
+        self.assertEqual(names[:2], ['Tie Second', 'Tie First'])
+
+    def test_exchange_donors_are_not_listed(self):
+        client = logged_in_client()
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Pledged Donor', blood_group='AB-', altruistic='1'))
+        client.post('/add-donor', data=dict(DONOR_FORM, name='Open Donor', blood_group='AB-'))
+        conn = app_module.get_db()
+        intent = rem.parse_rem_intent('kidney donors with ab-', rem.load_rem_hospitals(conn), 1)
+        sql, params = rem.build_intent_query(intent)
+        names = {row['name'] for row in conn.execute(sql, params)}
+        conn.close()
+        self.assertIn('Open Donor', names)
+        self.assertNotIn('Pledged Donor', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+import unittest
+
+from support import app_module
+
+from cache import SingleFlight
+
+WAITERS = 4
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.005)
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight('test')
+        self.release = threading.Event()
+        self.calls = 0
+
+    def blocking(self, result):
+        def compute():
+            self.calls += 1
+            self.release.wait(2)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return compute
+
+    def run_callers(self, key, compute, count):
+        """Start count callers of key; the first leads, the rest join once it is in flight"""
+        outcomes = [None] * count
+
+        def call(position):
+            try:
+                outcomes[position] = ('value', self.flight.do(key, compute))
+            except Exception as error:
+                outcomes[position] = ('error', error)
+
+        threads = [threading.Thread(target=call, args=(0,))]
+        threads[0].start()
+        wait_for(lambda: self.flight.stats()['in_flight'] == 1)
+        for position in range(1, count):
+            threads.append(threading.Thread(target=call, args=(position,)))
+            threads[-1].start()
+        wait_for(lambda: self.flight.stats()['coalesced'] == count - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(2)
+        return outcomes
+
+    def test_concurrent_callers_share_one_computation(self):
+        result = {'rows': []}
+        outcomes = self.run_callers('version-1', self.blocking(result), WAITERS + 1)
+        self.assertEqual(self.calls, 1)
+        for kind, value in outcomes:
+            self.assertEqual(kind, 'value')
+            self.assertIs(value, result)
+        self.assertEqual(self.flight.stats(), {'leaders': 1, 'coalesced': WAITERS, 'errors': 0, 'in_flight': 0})
+
+    def test_error_reaches_every_waiter(self):
+        error = ValueError('scoring failed')
+        outcomes = self.run_callers('version-1', self.blocking(error), WAITERS + 1)
+        self.assertEqual(self.calls, 1)
+        for kind, value in outcomes:
+            self.assertEqual(kind, 'error')
+            self.assertIs(value, error)
+        self.assertEqual(self.flight.stats()['errors'], 1)
+        # Failures are not remembered: the next caller computes again
+        self.assertEqual(self.flight.do('version-1', lambda: 'retried'), 'retried')
+        self.assertEqual(self.flight.stats()['leaders'], 2)
+
+    def test_nothing_is_kept_after_the_call(self):
+        self.assertEqual(self.flight.do('version-1', lambda: 1), 1)
+        self.assertEqual(self.flight.do('version-1', lambda: 2), 2)
+        self.assertEqual(self.flight.stats(), {'leaders': 2, 'coalesced': 0, 'errors': 0, 'in_flight': 0})
+
+    def test_different_keys_run_separately(self):
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            self.release.wait(2)
+            return 'slow'
+
+        thread = threading.Thread(target=self.flight.do, args=('version-1', slow))
+        thread.start()
+        started.wait(2)
+        self.assertEqual(self.flight.do('version-2', lambda: 'fast'), 'fast')
+        self.release.set()
+        thread.join(2)
+        self.assertEqual(self.flight.stats()['coalesced'], 0)
+
+
+class DashboardFlightTest(unittest.TestCase):
+
+    def test_stats_use_their_own_connection(self):
+        opened = []
+
+        def connect():
+            opened.append(app_module.get_db())
+            return opened[-1]
+
+        stats = app_module.build_dashboard_stats(connect, 1)
+        self.assertIn('my_donors', stats)
+        self.assertEqual(len(opened), 1)
+        # Closed before returning, so no caller depends on the leader's request
+        self.assertRaises(sqlite3.ProgrammingError, opened[0].execute, 'SELECT 1')
+
+
+if __name__ == '__main__':
+    unittest.main()